@@ -11,6 +11,10 @@ SLM 智能报价系统 - 程序入口
 
 import sys
 import os
+import time
+
+# 启动计时起点 (尽可能早)
+_START_TIME = time.perf_counter()
 
 # 确保src目录在路径中
 if getattr(sys, 'frozen', False):
@@ -23,26 +27,67 @@ else:
 sys.path.insert(0, BASE_DIR)
 
 
+class StartupTimer:
+    """
+    启动耗时记录
+    记录各启动里程碑距进程启动的时间, 启动完成后输出报告
+    """
+    
+    def __init__(self, start=_START_TIME):
+        self.start = start
+        self.milestones = []
+    
+    def mark(self, name):
+        """记录一个里程碑"""
+        self.milestones.append((name, (time.perf_counter() - self.start) * 1000))
+    
+    def report(self, budget_ms=None):
+        """输出启动耗时报告"""
+        print("[STARTUP] Startup timing:")
+        previous = 0.0
+        for name, elapsed in self.milestones:
+            print(f"  {name:<18} {elapsed:8.1f} ms  (+{elapsed - previous:.1f} ms)")
+            previous = elapsed
+        if budget_ms is not None and previous > budget_ms:
+            print(f"[WARN] Startup took {previous:.0f} ms, budget is {budget_ms} ms")
+
+
 def main():
     """程序主入口"""
+    timer = StartupTimer()
     try:
-        # 导入数据库模块并初始化
-        from src.database import init_db, close_db
-        
         print("[SLM] SLM Smart Quoter v2.1")
         print("=" * 40)
-        print("[DB] Initializing database...")
         
-        # 初始化数据库
+        # 先只导入界面框架 (数据库和各页面模块推迟到窗口显示之后)
+        print("[UI] Starting interface...")
+        from src.config import STARTUP_BUDGET_MS, DEBUG_QUERY_OVERLAY
+        from src.ui.app_window import AppWindow
+        timer.mark("import")
+        
+        # 创建主窗口并立即绘制, 页面在数据库就绪后再创建
+        app = AppWindow(
+            initial_page=None,
+            show_query_overlay=DEBUG_QUERY_OVERLAY or "--debug-queries" in sys.argv
+        )
+        app.update()
+        timer.mark("first-window")
+        
+        # 导入数据库模块并初始化
+        print("[DB] Initializing database...")
+        from src.database import init_db, close_db
         init_db()
+        timer.mark("db-init")
         print("[OK] Database ready")
         
-        # 导入并启动UI
-        print("[UI] Starting interface...")
-        from src.ui.app_window import AppWindow
+        # 显示默认页面, 主循环处理完首个空闲事件即视为可交互
+        app.show_page("config")
+        
+        def on_interactive():
+            timer.mark("first-interactive")
+            timer.report(STARTUP_BUDGET_MS)
         
-        # 创建主窗口
-        app = AppWindow()
+        app.after_idle(on_interactive)
         
         print("[OK] Application started!")
         print("-" * 40)
@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 性能基准
+==========================
+合成工单数据生成器 + 基准测试套件, 结果保存为 JSON 便于跨版本对比
+
+用法:
+    python -m src.benchmark suite [--rows 1e3 1e4 1e5] [-o 结果.json]
+    python -m src.benchmark profiles [--rows 20000] [--queries 2000]
+    python -m src.benchmark generate --rows 1e6 -o 工单.csv
+    python -m src.benchmark compare 旧结果.json 新结果.json
+"""
+
+import csv
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from . import database
+from .config import APP_VERSION, DEFAULT_MATERIALS
+from .database import (
+    CONNECTION_PROFILES, init_db, close_db, set_connection_profile,
+    add_work_order, add_work_orders, delete_work_order, get_material_stats,
+    get_all_material_stats, get_work_orders_page, get_recent_work_orders
+)
+
+
+# ============================================================
+# 合成工单数据
+# ============================================================
+
+# 各材料在合成数据中的占比 (未列出的材料不生成)
+MATERIAL_MIX = {
+    "316L不锈钢": 0.6,
+    "TC4钛合金": 0.4,
+}
+
+# 单件效率的对数标准差 (实际效率围绕材料预设效率呈对数正态分布)
+EFFICIENCY_SIGMA = 0.15
+
+# 晶格件的效率约为实体件的比例
+LATTICE_EFFICIENCY_FACTOR = 0.6
+
+# 重量分布: 对数正态, 中位数 (g) 与对数标准差, 以及上下限
+WEIGHT_MEDIAN = 80.0
+WEIGHT_SIGMA = 0.9
+WEIGHT_RANGE = (1.0, 5000.0)
+
+# 备注样本 (空字符串表示未填写)
+SAMPLE_NOTES = (
+    "", "", "", "支架", "壳体", "法兰盘", "航空接头", "医疗植入件",
+    "结构件", "小型零件", "叶轮", "随形水路模具镶件", "返修件",
+)
+
+
+def generate_work_orders(count, seed=0, lattice_fraction=0.15,
+                         days=3 * 365, end=None):
+    """
+    生成固定种子的合成工单 (生成器, 内存占用与数量无关)
+    
+    - 材料按 MATERIAL_MIX 比例抽取
+    - 单件效率 = 预设效率 × 对数正态扰动, 晶格件再乘以 LATTICE_EFFICIENCY_FACTOR
+    - 重量为对数正态分布, 时长 = 重量 / 效率
+    - 录入时间在 end 之前的 days 天内均匀分布
+    
+    Args:
+        count: 工单数
+        seed: 随机种子 (相同种子生成相同数据)
+        lattice_fraction: 晶格件比例
+        days: 录入时间跨度 (天)
+        end: 最晚录入时间, 默认固定的 2025-01-01 以保证可重复
+    
+    Yields:
+        dict: add_work_orders 可接受的工单字典
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2025, 1, 1)
+    span_seconds = days * 86400
+    
+    names = list(MATERIAL_MIX)
+    cum_weights = []
+    total = 0.0
+    for name in names:
+        total += MATERIAL_MIX[name]
+        cum_weights.append(total)
+    base_efficiency = [DEFAULT_MATERIALS[name]['default_efficiency'] for name in names]
+    log_median = math.log(WEIGHT_MEDIAN)
+    
+    for _ in range(count):
+        index = rng.choices(range(len(names)), cum_weights=cum_weights)[0]
+        is_lattice = rng.random() < lattice_fraction
+        
+        efficiency = base_efficiency[index] * rng.lognormvariate(0, EFFICIENCY_SIGMA)
+        if is_lattice:
+            efficiency *= LATTICE_EFFICIENCY_FACTOR
+        
+        weight = min(max(rng.lognormvariate(log_median, WEIGHT_SIGMA),
+                         WEIGHT_RANGE[0]), WEIGHT_RANGE[1])
+        weight = round(weight, 1)
+        
+        yield {
+            'material_name': names[index],
+            'weight_g': weight,
+            'time_min': round(weight / efficiency, 1),
+            'is_lattice': is_lattice,
+            'note': rng.choice(SAMPLE_NOTES),
+            'created_at': end - timedelta(seconds=rng.random() * span_seconds),
+        }
+
+
+def _chunked(iterable, size):
+    """将迭代器按固定大小切块"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed_database(count, seed=0, chunk_size=50000):
+    """
+    向当前数据库写入合成工单 (在 bulk-import 连接配置下分块写入)
+    
+    Returns:
+        float: 耗时 (秒)
+    """
+    previous = set_connection_profile('bulk-import')
+    try:
+        start = time.perf_counter()
+        for chunk in _chunked(generate_work_orders(count, seed), chunk_size):
+            add_work_orders(chunk)
+        return time.perf_counter() - start
+    finally:
+        set_connection_profile(previous)
+
+
+def write_work_orders_csv(path, count, seed=0):
+    """将合成工单写为 CSV (表头可被 python -m src.importer 识别)"""
+    fields = ('material_name', 'weight_g', 'time_min', 'is_lattice', 'note', 'created_at')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for order in generate_work_orders(count, seed):
+            order['is_lattice'] = int(order['is_lattice'])
+            order['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+            writer.writerow([order[name] for name in fields])
+
+
+# ============================================================
+# 计时
+# ============================================================
+
+def _rate(count, seconds):
+    """次数 / 秒"""
+    return count / seconds if seconds > 0 else float('inf')
+
+
+def _timed(func, repeat):
+    """重复执行 func, 返回每秒次数"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return _rate(repeat, time.perf_counter() - start)
+
+
+def measure(func, repeat, setup=None):
+    """
+    逐次计时执行 func
+    
+    Args:
+        func: 被测函数
+        repeat: 执行次数
+        setup: 每次执行前调用且不计时的准备函数, 可选
+    
+    Returns:
+        dict: {ops, total_s, mean_us, p50_us, p99_us, ops_per_s}
+    """
+    samples = []
+    perf_counter = time.perf_counter
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = perf_counter()
+        func()
+        samples.append(perf_counter() - start)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'ops': repeat,
+        'total_s': total,
+        'mean_us': total / repeat * 1e6,
+        'p50_us': samples[repeat // 2] * 1e6,
+        'p99_us': samples[min(repeat - 1, int(repeat * 0.99))] * 1e6,
+        'ops_per_s': _rate(repeat, total),
+    }
+
+
+# ============================================================
+# 基准套件
+# ============================================================
+
+def bench_dataset(rows, seed=0, repeat=200, write_repeat=200):
+    """
+    在含 rows 条合成工单的临时数据库上运行全部基准
+    
+    Args:
+        rows: 合成工单数
+        seed: 随机种子
+        repeat: 读取类基准的执行次数
+        write_repeat: 写入 / 删除基准的执行次数
+    
+    Returns:
+        dict: {rows, seed_s, db_bytes, metrics: {名称: measure 结果}}
+    """
+    from .services import (
+        EfficiencyService, PricingCache, QuoteService, StatisticsService
+    )
+    
+    material = next(iter(MATERIAL_MIX))
+    metrics = {}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_db(path=path)
+        try:
+            seed_s = seed_database(rows, seed)
+            
+            # 启动: 重新打开已有数据库并构建首个报价快照
+            def reopen():
+                close_db()
+                init_db(path=path)
+                PricingCache.get_snapshot()
+            metrics['startup'] = measure(reopen, max(1, repeat // 20))
+            
+            metrics['calculate_quote'] = measure(
+                lambda: QuoteService.calculate_quote(material, 123.4, 2, 0.5, 1), repeat)
+            # 数据写入后的首次报价 (需要重建报价快照)
+            metrics['calculate_quote_cold'] = measure(
+                lambda: QuoteService.calculate_quote(material, 123.4, 2, 0.5, 1),
+                repeat, setup=PricingCache.invalidate)
+            metrics['get_material_efficiency'] = measure(
+                lambda: EfficiencyService.get_material_efficiency(material), repeat)
+            metrics['get_all_materials_efficiency'] = measure(
+                EfficiencyService.get_all_materials_efficiency, repeat)
+            metrics['get_overview_stats'] = measure(
+                StatisticsService.get_overview_stats, repeat)
+            metrics['get_recent_work_orders'] = measure(
+                lambda: list(get_recent_work_orders()), repeat)
+            
+            # 写入 / 删除: 每条一个事务, 使用默认连接配置
+            orders = generate_work_orders(write_repeat, seed + 1)
+            created = []
+            
+            def insert():
+                order = next(orders)
+                del order['created_at']
+                created.append(add_work_order(**order).id)
+            metrics['insert_work_order'] = measure(insert, write_repeat)
+            
+            pending = iter(created)
+            metrics['delete_work_order'] = measure(
+                lambda: delete_work_order(next(pending)), write_repeat)
+        finally:
+            close_db()
+        db_bytes = os.path.getsize(path)
+    
+    return {'rows': rows, 'seed_s': seed_s, 'db_bytes': db_bytes, 'metrics': metrics}
+
+
+def run_suite(sizes=(1000, 10000, 100000), seed=0, repeat=200, progress=None):
+    """
+    对多个数据规模运行基准套件
+    
+    Args:
+        sizes: 合成工单数列表
+        seed: 随机种子
+        repeat: 每项基准的执行次数
+        progress: 可选回调, 每完成一个数据规模调用 progress(结果)
+    
+    Returns:
+        dict: 可直接保存为 JSON 的完整结果 (含运行环境信息)
+    """
+    results = []
+    for rows in sizes:
+        result = bench_dataset(rows, seed=seed, repeat=repeat)
+        results.append(result)
+        if progress:
+            progress(result)
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'app_version': APP_VERSION,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'datasets': results,
+    }
+
+
+def compare_results(old, new):
+    """
+    对比两次套件结果 (按数据规模和指标名匹配)
+    
+    Returns:
+        list: [(数据规模, 指标, 旧均值us, 新均值us, 新/旧)]
+    """
+    old_sets = {d['rows']: d['metrics'] for d in old['datasets']}
+    rows = []
+    for dataset in new['datasets']:
+        previous = old_sets.get(dataset['rows'])
+        if previous is None:
+            continue
+        for name, metric in dataset['metrics'].items():
+            if name in previous:
+                before = previous[name]['mean_us']
+                after = metric['mean_us']
+                rows.append((dataset['rows'], name, before, after,
+                             after / before if before else float('inf')))
+    return rows
+
+
+def print_dataset(result):
+    """输出单个数据规模的结果"""
+    print(f"[BENCH] {result['rows']:,} 条工单 (生成 {result['seed_s']:.2f}s, "
+          f"数据库 {result['db_bytes'] / 1e6:.1f}MB)")
+    for name, metric in result['metrics'].items():
+        print(f"  {name:<30} mean {metric['mean_us']:>10.1f}us  "
+              f"p99 {metric['p99_us']:>10.1f}us  {metric['ops_per_s']:>10,.0f}/s")
+
+
+# ============================================================
+# 连接配置对比
+# ============================================================
+
+def bench_profile(name, rows=20000, queries=2000, seed=0):
+    """
+    在新建的临时数据库上测量一个连接配置
+    
+    写入测量对只读配置没有意义: 'read-only-report' 先用 'bulk-import'
+    写入同样的数据, 再切换为只读配置测量查询。
+    
+    Args:
+        name: 连接配置名称
+        rows: 批量写入的工单数
+        queries: 每种查询的执行次数
+        seed: 合成数据随机种子
+    
+    Returns:
+        dict: 各项吞吐量 (次/秒), 未测量的项为 None
+    """
+    read_only = bool(CONNECTION_PROFILES[name].get('query_only'))
+    single_rows = max(1, rows // 20)
+    orders = list(generate_work_orders(rows + single_rows, seed))
+    result = {'profile': name, 'rows': rows}
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        init_db(profile='bulk-import' if read_only else name,
+                path=os.path.join(tmp, "bench.db"))
+        try:
+            # 批量写入 (一个事务)
+            start = time.perf_counter()
+            add_work_orders(orders[:rows])
+            batch = _rate(rows, time.perf_counter() - start)
+            
+            # 逐条写入 (每条一个事务, 受 synchronous / journal_mode 影响最大)
+            start = time.perf_counter()
+            for order in orders[rows:]:
+                del order['created_at']
+                add_work_order(**order)
+            single = _rate(single_rows, time.perf_counter() - start)
+            
+            if read_only:
+                set_connection_profile(name)
+                batch = single = None
+            result['insert_batch_rows_per_s'] = batch
+            result['insert_single_rows_per_s'] = single
+            
+            material = next(iter(MATERIAL_MIX))
+            result['material_stats_per_s'] = _timed(
+                lambda: get_material_stats(material), queries)
+            result['work_orders_page_per_s'] = _timed(
+                lambda: get_work_orders_page(limit=50), queries)
+            result['all_material_stats_per_s'] = _timed(
+                get_all_material_stats, queries)
+            # 全表聚合 (报表类查询)
+            result['stats_full_scan_per_s'] = _timed(
+                lambda: list(database._stats_group_query().tuples()),
+                max(1, queries // 100))
+        finally:
+            close_db()
+    
+    return result
+
+
+def bench_profiles(rows=20000, queries=2000, profiles=None, seed=0):
+    """依次测量多个连接配置 (默认全部)"""
+    return [
+        bench_profile(name, rows=rows, queries=queries, seed=seed)
+        for name in (profiles or CONNECTION_PROFILES)
+    ]
+
+
+def _format_rate(value):
+    return "-" if value is None else f"{value:,.0f}"
+
+
+def print_profile_results(results):
+    """以表格输出连接配置基准结果"""
+    columns = [
+        ('insert_batch_rows_per_s', "批量写入"),
+        ('insert_single_rows_per_s', "逐条写入"),
+        ('material_stats_per_s', "单材料统计"),
+        ('work_orders_page_per_s', "工单分页"),
+        ('all_material_stats_per_s', "全材料统计"),
+        ('stats_full_scan_per_s', "全表聚合"),
+    ]
+    print(f"{'配置':<18}" + "".join(f"{title:>12}" for _, title in columns))
+    for result in results:
+        print(f"{result['profile']:<18}" + "".join(
+            f"{_format_rate(result[key]):>14}" for key, _ in columns
+        ))
+    print("(单位: 次/秒, 写入为 行/秒)")
+
+
+# ============================================================
+# 命令行
+# ============================================================
+
+def _count(value):
+    """解析行数参数 (支持 1e6 写法)"""
+    return int(float(value))
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="SLM 智能报价系统性能基准")
+    sub = parser.add_subparsers(dest='command', required=True)
+    
+    p_suite = sub.add_parser('suite', help="运行基准套件并保存 JSON 结果")
+    p_suite.add_argument('--rows', type=_count, nargs='+',
+                         default=[1000, 10000, 100000],
+                         help="合成工单数, 可多个 (默认 1e3 1e4 1e5, 最大建议 1e7)")
+    p_suite.add_argument('--repeat', type=int, default=200,
+                         help="每项基准的执行次数 (默认 200)")
+    p_suite.add_argument('--seed', type=int, default=0, help="随机种子")
+    p_suite.add_argument('-o', '--output',
+                         help="结果文件, 默认 benchmark-<时间>.json")
+    
+    p_profiles = sub.add_parser('profiles', help="比较各数据库连接配置")
+    p_profiles.add_argument('--rows', type=_count, default=20000,
+                            help="批量写入的工单数 (默认 20000)")
+    p_profiles.add_argument('--queries', type=int, default=2000,
+                            help="每种查询的执行次数 (默认 2000)")
+    p_profiles.add_argument('--profile', action='append',
+                            choices=list(CONNECTION_PROFILES),
+                            help="只测量指定配置 (可重复)")
+    
+    p_generate = sub.add_parser('generate', help="生成合成工单 CSV")
+    p_generate.add_argument('--rows', type=_count, required=True, help="工单数")
+    p_generate.add_argument('--seed', type=int, default=0, help="随机种子")
+    p_generate.add_argument('-o', '--output', required=True, help="CSV 文件路径")
+    
+    p_compare = sub.add_parser('compare', help="对比两次套件结果")
+    p_compare.add_argument('old', help="旧结果 JSON")
+    p_compare.add_argument('new', help="新结果 JSON")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == 'suite':
+        results = run_suite(args.rows, seed=args.seed, repeat=args.repeat,
+                            progress=print_dataset)
+        output = args.output or f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[OK] 结果已保存: {output}")
+    elif args.command == 'profiles':
+        results = bench_profiles(rows=args.rows, queries=args.queries,
+                                 profiles=args.profile)
+        print_profile_results(results)
+    elif args.command == 'generate':
+        write_work_orders_csv(args.output, args.rows, seed=args.seed)
+        print(f"[OK] 已生成 {args.rows:,} 条工单: {args.output}")
+    elif args.command == 'compare':
+        with open(args.old, encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        for rows, name, before, after, ratio in compare_results(old, new):
+            print(f"{rows:>10,}  {name:<30} {before:>10.1f}us -> "
+                  f"{after:>10.1f}us  x{ratio:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,8 +9,9 @@ SLM智能报价系统 - 全局配置常量
 # 设备配置 (Machine Configuration)
 # ============================================================
 
-# 设备型号与对应价格 (单位: 元)
-MACHINES = {
+# 预设设备型号与对应价格 (单位: 元)
+# 冷启动时注入设备表, 之后以数据库中的设备表为准 (见 database.Machine)
+DEFAULT_MACHINES = {
     "DW-HP120": 1_500_000,  # 150万
     "DW-HP200": 3_000_000,  # 300万
 }
@@ -32,18 +33,69 @@ HOURS_PER_DAY = 8
 # 材料配置 (Material Configuration)
 # ============================================================
 
-# 材料预设效率 (g/min) - 冷启动时使用
+# 材料预设效率 (g/min) 和密度 (g/cm³) - 冷启动时使用
+# 密度用于由 STL 模型体积换算零件重量
 DEFAULT_MATERIALS = {
     "316L不锈钢": {
         "default_efficiency": 0.053,  # g/min
+        "density": 7.98,  # g/cm³
         "description": "奥氏体不锈钢，耐腐蚀性优异"
     },
     "TC4钛合金": {
         "default_efficiency": 0.047,  # g/min
+        "density": 4.43,  # g/cm³
         "description": "Ti-6Al-4V，航空航天常用材料"
     }
 }
 
+# STL 坐标单位 (毫米); 按英寸导出的模型改为 25.4
+STL_UNIT_MM = 1.0
+
+# ============================================================
+# 效率估计配置 (Efficiency Estimation)
+# ============================================================
+
+# 材料效率的估计方式:
+#   "all_time" - 全部历史工单的 总重量 / 总时长
+#   "recent"   - 按工单时间衰减加权, 设备调校或更换激光器后更快反映新的效率
+EFFICIENCY_ESTIMATOR = "all_time"
+
+# 近期加权的半衰期 (天): 工单每早这么多天, 权重减半
+# 修改后需执行 database.rebuild_stats() 重算聚合表
+EFFICIENCY_HALF_LIFE_DAYS = 180
+
+# 效率置信区间的置信水平, 报价结果中的报价区间由此计算
+EFFICIENCY_CONFIDENCE = 0.95
+
+# 向材料预设效率收缩的强度 (相当于多少条预设效率的虚拟工单), 0 表示不收缩
+# 工单较少时效率偏向预设值, 工单数远大于该值时几乎只取决于历史数据
+EFFICIENCY_PRIOR_STRENGTH = 0
+
+# 自动剔除异常工单 (如把小时误填进分钟栏): 效率在对数尺度上偏离该材料
+# 中位数超过 EFFICIENCY_OUTLIER_THRESHOLD 倍 (标准化) MAD 的工单不计入效率。
+# 工单不足10条时不剔除
+EFFICIENCY_OUTLIER_FILTER = True
+EFFICIENCY_OUTLIER_THRESHOLD = 3.5
+
+# 设备-材料效率: 某设备上该材料的非晶格工单不少于此值时, 在该设备上报价
+# 使用该设备的效率 (向材料整体效率收缩, 见 EFFICIENCY_PRIOR_STRENGTH),
+# 否则使用材料整体效率
+MACHINE_EFFICIENCY_MIN_ORDERS = 5
+
+# 报价使用的效率模型:
+#   "ratio"  - 材料整体效率 (见 EFFICIENCY_ESTIMATOR)
+#   "bucket" - 按零件重量分段的效率, 小件和大件的打印速度可以不同
+#   "linear" - 时长 = 固定时长 + 单位重量时长 × 重量, 计入每次打印的
+#              预热、铺粉等固定耗时, 小件不再报低
+QUOTE_EFFICIENCY_MODEL = "ratio"
+
+# 重量分段: 每个2倍重量区间 (如 64g~128g) 划分的段数, 分段在对数坐标上等距
+# 修改后需执行 database.rebuild_stats() 重算分段表
+WEIGHT_BUCKETS_PER_OCTAVE = 2
+
+# 分段内工单数不少于此值时才采用该段的效率, 否则由相邻分段插值
+EFFICIENCY_BUCKET_MIN_ORDERS = 5
+
 # ============================================================
 # 难度系数配置 (Difficulty Coefficient)
 # ============================================================
@@ -92,6 +144,12 @@ COLORS = {
     "border": "#2a2a4a",         # 边框色
 }
 
+# 报价页输入防抖延迟 (毫秒), 停止输入后才在后台重新计算
+QUOTE_DEBOUNCE_MS = 150
+
+# 数据进化页工单列表每页加载的条数 (滚动到末尾时按键集分页继续加载)
+ORDER_LIST_PAGE_SIZE = 200
+
 # 字体配置
 FONTS = {
     "title": ("Microsoft YaHei UI", 24, "bold"),
@@ -112,3 +170,25 @@ APP_AUTHOR = "DW Tech"
 
 # 数据库文件名
 DATABASE_FILE = "slm_data.db"
+
+# 默认数据库连接配置 (见 database.CONNECTION_PROFILES)
+# 默认使用回滚日志, 数据库可以放在网络共享盘或同步盘上;
+# 仅在数据库位于本机磁盘时可改为 "desktop-wal" (WAL 模式不支持网络文件系统)
+DATABASE_PROFILE = "desktop"
+
+# 启动耗时预算 (毫秒), 启动报告中超出预算时给出警告
+STARTUP_BUDGET_MS = 2000
+
+# 在窗口右下角显示各操作的SQL查询统计 (也可用 python main.py --debug-queries 开启)
+DEBUG_QUERY_OVERLAY = False
+
+# ============================================================
+# 报价HTTP服务 (Quote Server)
+# ============================================================
+
+# 默认只监听本机, 供ERP/CRM等本地系统调用
+QUOTE_SERVER_HOST = "127.0.0.1"
+QUOTE_SERVER_PORT = 8765
+
+# 后台检查数据变化并刷新报价快照的间隔 (秒)
+QUOTE_SERVER_REFRESH_SECONDS = 2.0
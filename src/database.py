@@ -3,16 +3,28 @@
 SLM智能报价系统 - 数据库模型
 =============================
 使用Peewee ORM管理SQLite数据库
-包含材料表、工单表、设备配置表
+包含材料表、设备表、工单表、设备配置表
 """
 
 import os
-from datetime import datetime
+import json
+import math
+import base64
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 from peewee import (
     SqliteDatabase, Model, CharField, FloatField, 
-    BooleanField, DateTimeField, ForeignKeyField, IntegerField
+    BooleanField, DateTimeField, ForeignKeyField, IntegerField,
+    CompositeKey, Case, JOIN, EXCLUDED, Tuple, fn
+)
+from .query_stats import record_query, timed_query
+from .config import (
+    DATABASE_FILE, DATABASE_PROFILE, DEFAULT_MATERIALS, DEFAULT_MACHINES,
+    DEPRECIATION_YEARS_OPTIONS, EFFICIENCY_HALF_LIFE_DAYS, WEIGHT_BUCKETS_PER_OCTAVE
 )
-from .config import DATABASE_FILE, DEFAULT_MATERIALS, MACHINES, DEPRECIATION_YEARS_OPTIONS
 
 # ============================================================
 # 数据库连接
@@ -28,8 +40,100 @@ def get_db_path():
         base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_path, DATABASE_FILE)
 
+class InstrumentedSqliteDatabase(SqliteDatabase):
+    """记录每条SQL执行耗时的 SqliteDatabase (统计见 query_stats)"""
+    
+    def execute_sql(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super().execute_sql(sql, params)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+
 # 创建数据库连接
-db = SqliteDatabase(None)  # 延迟初始化
+db = InstrumentedSqliteDatabase(None)  # 延迟初始化
+
+# 连接配置: 名称 -> PRAGMA 设置
+# 每个配置设置相同的一组 PRAGMA, 切换配置时会完整覆盖上一个配置
+CONNECTION_PROFILES = {
+    # 桌面交互 (默认): 回滚日志, 数据库可以放在网络共享盘或同步盘上
+    # (WAL 的 -wal / -shm 文件在这些位置无法正确共享和同步)
+    'desktop': {
+        'journal_mode': 'delete',
+        'synchronous': 2,            # FULL
+        'cache_size': -16000,        # 约16MB (负数单位为KB)
+        'mmap_size': 0,
+        'temp_store': 2,             # MEMORY
+        'busy_timeout': 5000,
+        'query_only': 0,
+    },
+    # 桌面交互 (WAL, 需显式选择): 读写互不阻塞, 提交时不逐条 fsync 到主库;
+    # 仅适用于本机磁盘, WAL 模式会记录在数据库文件中
+    'desktop-wal': {
+        'journal_mode': 'wal',
+        'synchronous': 1,            # NORMAL
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 2,
+        'busy_timeout': 5000,
+        'query_only': 0,
+    },
+    # 批量导入: 不等待 fsync, 大缓存; 断电可能丢失最近的导入, 可重新导入
+    'bulk-import': {
+        'journal_mode': 'delete',
+        'synchronous': 0,            # OFF
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 2,
+        'busy_timeout': 30000,
+        'query_only': 0,
+    },
+    # 只读报表: 大缓存和内存映射加速全表聚合, 禁止写入
+    'read-only-report': {
+        'journal_mode': 'delete',
+        'synchronous': 1,
+        'cache_size': -64000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 2,
+        'busy_timeout': 10000,
+        'query_only': 1,
+    },
+    # 网络共享盘: 回滚日志模式, 不使用内存映射, 等待锁的时间更长
+    'network-share': {
+        'journal_mode': 'delete',
+        'synchronous': 2,            # FULL
+        'cache_size': -16000,
+        'mmap_size': 0,
+        'temp_store': 2,
+        'busy_timeout': 10000,
+        'query_only': 0,
+    },
+}
+
+_active_profile = None
+
+# 数据版本号 - 工单或设备配置每次变化时单调递增, 供进程内缓存判断是否失效
+_data_version = 0
+_data_version_lock = threading.Lock()
+
+
+def get_data_version():
+    """获取当前数据版本号"""
+    return _data_version
+
+
+def bump_data_version():
+    """
+    递增数据版本号 (数据写入后调用)
+    
+    Returns:
+        int: 递增后的版本号
+    """
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
 
 
 # ============================================================
@@ -49,10 +153,29 @@ class Material(BaseModel):
     字段:
         name: 材料名称 (唯一)
         default_efficiency: 出厂预设效率 (g/min)
+        density: 密度 (g/cm³), 由 STL 模型体积换算重量时使用; 未设置时为空
         description: 材料描述
     """
     name = CharField(unique=True, max_length=50)
     default_efficiency = FloatField(default=0.05)
+    density = FloatField(null=True)
+    description = CharField(max_length=200, default="")
+    
+    def __str__(self):
+        return self.name
+
+
+class Machine(BaseModel):
+    """
+    设备表 - 存储可选的设备型号及价格 (冷启动时由 DEFAULT_MACHINES 注入)
+    
+    字段:
+        name: 设备型号 (唯一)
+        total_price: 设备总价 (元)
+        description: 设备描述
+    """
+    name = CharField(unique=True, max_length=50)
+    total_price = IntegerField()
     description = CharField(max_length=200, default="")
     
     def __str__(self):
@@ -65,6 +188,7 @@ class WorkOrder(BaseModel):
     
     字段:
         material: 关联的材料
+        machine: 打印设备 (未记录时为None, 只计入材料整体统计)
         weight_g: 实际打印重量 (克)
         time_min: 实际打印时长 (分钟)
         is_lattice: 是否为晶格/点阵结构 (True则不参与效率计算)
@@ -72,11 +196,21 @@ class WorkOrder(BaseModel):
         created_at: 创建时间
     """
     material = ForeignKeyField(Material, backref='work_orders', on_delete='CASCADE')
+    machine = ForeignKeyField(Machine, backref='work_orders', null=True,
+                              on_delete='SET NULL')
     weight_g = FloatField()
     time_min = FloatField()
     is_lattice = BooleanField(default=False)
     note = CharField(max_length=200, default="")
-    created_at = DateTimeField(default=datetime.now)
+    created_at = DateTimeField(default=datetime.now, index=True)
+    
+    class Meta:
+        indexes = (
+            # 覆盖索引: 按 (材料, 晶格标记) 过滤并汇总重量/时长时无需回表
+            (('material', 'is_lattice', 'weight_g', 'time_min'), False),
+            # 按材料筛选的分页: 直接按 created_at 顺序读取, 无需排序
+            (('material', 'created_at'), False),
+        )
     
     def __str__(self):
         return f"{self.material.name} - {self.weight_g}g / {self.time_min}min"
@@ -109,94 +243,412 @@ class MachineConfig(BaseModel):
         return f"{self.machine_name} - {self.depreciation_years}年折旧"
 
 
+class EfficiencyAggregate(BaseModel):
+    """
+    效率统计列 (效率聚合表和效率草图共用, 本身不建表)
+    
+    字段:
+        order_count: 工单数
+        total_weight: 总重量 (克)
+        total_time: 总时长 (分钟)
+        decayed_count / decayed_weight / decayed_time:
+            按工单时间衰减加权的工单数、重量、时长 (见 decay_factor)
+        m2_weight / m2_time / c_weight_time:
+            重量、时长的离差平方和及离差积和 (Welford 方法增量维护),
+            用于计算效率的方差和置信区间
+    """
+    order_count = IntegerField(default=0)
+    total_weight = FloatField(default=0)
+    total_time = FloatField(default=0)
+    decayed_count = FloatField(default=0)
+    decayed_weight = FloatField(default=0)
+    decayed_time = FloatField(default=0)
+    m2_weight = FloatField(default=0)
+    m2_time = FloatField(default=0)
+    c_weight_time = FloatField(default=0)
+    
+    def __str__(self):
+        return f"{self.material_id} - {self.order_count}条"
+
+
+class MaterialEfficiencyStats(EfficiencyAggregate):
+    """
+    材料效率聚合表 - 按材料和晶格标记增量维护的工单统计
+    
+    与工单表在同一事务中更新, 效率查询只需读取一行,
+    无需每次扫描全部工单。可通过 rebuild_stats() 全量重建。
+    
+    字段:
+        material: 关联的材料
+        is_lattice: 是否为晶格结构的统计行
+        其余统计列见 EfficiencyAggregate
+    """
+    material = ForeignKeyField(Material, backref='efficiency_stats', on_delete='CASCADE')
+    is_lattice = BooleanField(default=False)
+    
+    class Meta:
+        primary_key = CompositeKey('material', 'is_lattice')
+
+
+class MachineMaterialStats(EfficiencyAggregate):
+    """
+    设备-材料效率聚合表 - 按 (设备, 材料, 效率分箱) 增量维护的非晶格工单统计
+    
+    只统计记录了设备的工单; 效率分箱同效率草图 (见 efficiency_key()),
+    读取时按材料的正常效率范围只合并范围内的分箱, 与材料整体效率
+    剔除相同的异常工单。与材料效率聚合表在同一事务中更新,
+    可通过 rebuild_stats() 全量重建。
+    
+    字段:
+        machine: 关联的设备
+        material: 关联的材料
+        key: 效率分箱编号
+        其余统计列见 EfficiencyAggregate
+    """
+    machine = ForeignKeyField(Machine, backref='efficiency_stats', on_delete='CASCADE')
+    material = ForeignKeyField(Material, backref='machine_stats', on_delete='CASCADE')
+    key = IntegerField()
+    
+    class Meta:
+        primary_key = CompositeKey('machine', 'material', 'key')
+
+
+class MaterialEfficiencySketch(EfficiencyAggregate):
+    """
+    材料效率分布草图 - 按工单效率的对数分箱增量维护的非晶格工单统计
+    
+    分箱编号见 efficiency_key(), 箱宽使同一箱内效率的相对误差不超过
+    SKETCH_RELATIVE_ACCURACY。分箱数只取决于效率的分布范围, 与工单数无关;
+    各箱的统计列可以任意合并, 用于估计效率的中位数和 MAD,
+    并只汇总正常范围内的分箱得到剔除异常工单后的效率。
+    
+    字段:
+        material: 关联的材料
+        key: 效率分箱编号
+        其余统计列见 EfficiencyAggregate
+    """
+    material = ForeignKeyField(Material, backref='efficiency_sketch', on_delete='CASCADE')
+    key = IntegerField()
+    
+    class Meta:
+        primary_key = CompositeKey('material', 'key')
+
+
+class MaterialWeightBucket(BaseModel):
+    """
+    材料重量分段效率表 - 按对数等距的重量分段增量维护的非晶格工单统计
+    
+    分段编号见 weight_bucket(); 每个分段再按效率分箱 (同效率草图,
+    见 efficiency_key()) 细分, 构建效率曲线时只汇总正常效率范围内的分箱,
+    与整体效率一样剔除异常工单。与效率聚合表在同一事务中更新,
+    可通过 rebuild_stats() 全量重建。
+    
+    字段:
+        material: 关联的材料
+        bucket: 重量分段编号
+        key: 效率分箱编号
+        order_count: 工单数
+        total_weight: 总重量 (克)
+        total_time: 总时长 (分钟)
+    """
+    material = ForeignKeyField(Material, backref='weight_buckets', on_delete='CASCADE')
+    bucket = IntegerField()
+    key = IntegerField()
+    order_count = IntegerField(default=0)
+    total_weight = FloatField(default=0)
+    total_time = FloatField(default=0)
+    
+    class Meta:
+        primary_key = CompositeKey('material', 'bucket', 'key')
+    
+    def __str__(self):
+        return f"{self.material_id} - 分段{self.bucket} - {self.order_count}条"
+
+
+# 全部数据表 (新建数据库时一次创建)
+ALL_MODELS = [
+    Material, Machine, WorkOrder, MachineConfig, MaterialEfficiencyStats,
+    MaterialWeightBucket, MaterialEfficiencySketch, MachineMaterialStats
+]
+
+
 # ============================================================
 # 数据库初始化函数
 # ============================================================
 
-def init_db():
+# 数据库结构版本, 记录在 PRAGMA user_version 中
+# 修改表结构时递增, 并在 _MIGRATIONS 末尾追加对应的升级函数
+SCHEMA_VERSION = 9
+
+
+def init_db(profile=None, path=None):
     """
     初始化数据库
-    - 连接数据库
-    - 创建表结构
-    - 注入冷启动数据
+    - 按连接配置连接数据库 (默认 DATABASE_PROFILE)
+    - 读取 PRAGMA user_version, 结构已是最新时直接返回 (只有这一条查询)
+    - 否则在一个事务内依次执行升级步骤 (建表、注入冷启动数据)
+    
+    Args:
+        profile: 连接配置名称; 'read-only-report' 要求数据库已是最新结构
+        path: 数据库文件路径, 默认 get_db_path()
     """
-    db_path = get_db_path()
-    db.init(db_path)
+    global _active_profile
+    profile = profile or DATABASE_PROFILE
+    db_path = path or get_db_path()
+    db.init(db_path, pragmas=_profile_pragmas(profile))
     db.connect()
+    _active_profile = profile
     
-    # 创建表 (如果不存在)
-    db.create_tables([Material, WorkOrder, MachineConfig], safe=True)
+    version = db.pragma('user_version')
+    if version < SCHEMA_VERSION:
+        _upgrade_schema(version)
     
-    # 检查是否需要冷启动数据
-    _inject_cold_start_data()
+    # 数据库已切换或已升级, 使所有缓存失效
+    bump_data_version()
     
     return db
 
 
+def _upgrade_schema(version):
+    """
+    从指定结构版本升级到 SCHEMA_VERSION
+    
+    所有升级步骤和新的 user_version 在同一事务中提交,
+    中途失败时数据库保持原版本, 下次启动会重新升级。
+    升级步骤返回 True 表示效率聚合表需要重建; 重建在全部步骤之后
+    只执行一次, 此时表结构已与当前模型一致
+    """
+    with db.atomic():
+        needs_rebuild = False
+        for target, migrate in enumerate(_MIGRATIONS, start=1):
+            if version < target:
+                needs_rebuild = migrate() or needs_rebuild
+        if needs_rebuild:
+            rebuild_stats()
+        db.pragma('user_version', SCHEMA_VERSION)
+
+
+def _migrate_v1():
+    """
+    版本1: 基础表结构 + 冷启动数据
+    
+    也用于升级未记录版本号的旧数据库 (user_version 为 0),
+    因此每一步都必须可以在已有数据上重复执行
+    """
+    # 聚合表是新增的表, 旧数据库首次升级时需要从工单表重建
+    stats_missing = not MaterialEfficiencyStats.table_exists()
+    
+    # 旧数据库的工单表缺少设备列, 需在建索引之前补齐
+    # (否则 SQLite 会把索引中不存在的列名当作字符串常量)
+    if WorkOrder.table_exists():
+        _add_missing_columns(WorkOrder, (WorkOrder.machine,))
+    # 旧数据库的材料表缺少密度列, 需在注入预设材料之前补齐
+    if Material.table_exists():
+        _add_missing_columns(Material, (Material.density,))
+    
+    # 创建表 (如果不存在), 新建的数据库直接按当前模型建表
+    db.create_tables(ALL_MODELS, safe=True)
+    
+    _inject_cold_start_data()
+    return stats_missing
+
+
+def _migrate_v2():
+    """
+    版本2: 效率聚合表增加衰减加权累计列, 并从工单表重建
+    
+    新建的数据库在版本1中已按当前模型建表, 只补充缺少的列
+    """
+    S = MaterialEfficiencyStats
+    _add_missing_columns(S, (S.decayed_count, S.decayed_weight, S.decayed_time))
+    return True
+
+
+def _migrate_v3():
+    """版本3: 效率聚合表增加离差平方和列, 并从工单表重建"""
+    S = MaterialEfficiencyStats
+    _add_missing_columns(S, (S.m2_weight, S.m2_time, S.c_weight_time))
+    return True
+
+
+def _migrate_v4():
+    """版本4: 新增重量分段效率表, 并从工单表重建"""
+    db.create_tables([MaterialWeightBucket], safe=True)
+    return True
+
+
+def _migrate_v5():
+    """版本5: 新增效率分布草图表, 并从工单表重建"""
+    db.create_tables([MaterialEfficiencySketch], safe=True)
+    return True
+
+
+def _migrate_v6():
+    """
+    版本6: 新增设备表 (由 DEFAULT_MACHINES 注入)、工单的设备列
+    和设备-材料效率聚合表
+    
+    已有工单未记录设备, 设备列保持为空, 不影响材料整体统计
+    """
+    db.create_tables([Machine, MachineMaterialStats], safe=True)
+    _inject_default_machines()
+    _add_missing_columns(WorkOrder, (WorkOrder.machine,))
+    return False
+
+
+def _migrate_v7():
+    """
+    版本7: 材料表增加密度列
+    
+    预设材料按 DEFAULT_MATERIALS 补充密度, 其余材料保持为空 (需手动设置)
+    """
+    _add_missing_columns(Material, (Material.density,))
+    for mat_name, mat_info in DEFAULT_MATERIALS.items():
+        (Material
+         .update(density=mat_info['density'])
+         .where((Material.name == mat_name) & Material.density.is_null())
+         .execute())
+    return False
+
+
+def _migrate_v8():
+    """
+    版本8: 重量分段效率表按效率分箱细分 (主键变化, 重建表), 并从工单表重建
+    """
+    db.drop_tables([MaterialWeightBucket], safe=True)
+    db.create_tables([MaterialWeightBucket])
+    return True
+
+
+def _migrate_v9():
+    """
+    版本9: 设备-材料效率聚合表按效率分箱细分 (主键变化, 重建表), 并从工单表重建
+    """
+    db.drop_tables([MachineMaterialStats], safe=True)
+    db.create_tables([MachineMaterialStats])
+    return True
+
+
+def _add_missing_columns(model, fields):
+    """为已有的表补充模型中新增的列 (已存在的列跳过)"""
+    from playhouse.migrate import SqliteMigrator, migrate
+    
+    table = model._meta.table_name
+    existing = {column.name for column in db.get_columns(table)}
+    migrator = SqliteMigrator(db)
+    migrate(*[
+        migrator.add_column(table, field.column_name, field)
+        for field in fields
+        if field.column_name not in existing
+    ])
+
+
+# 升级函数列表, 第 i 项将结构从版本 i 升级到 i+1
+_MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+    _migrate_v8,
+    _migrate_v9,
+]
+
+
 def _inject_cold_start_data():
     """
     注入冷启动数据
     - 预设材料信息
+    - 预设设备信息
     - 模拟历史工单数据
     - 默认设备配置
     """
-    # 1. 注入材料数据
-    for mat_name, mat_info in DEFAULT_MATERIALS.items():
-        Material.get_or_create(
-            name=mat_name,
-            defaults={
-                'default_efficiency': mat_info['default_efficiency'],
-                'description': mat_info.get('description', '')
-            }
-        )
+    # 1. 注入材料数据 (已存在的同名材料保持不变)
+    (Material
+     .insert_many([
+         {
+             'name': mat_name,
+             'default_efficiency': mat_info['default_efficiency'],
+             'density': mat_info.get('density'),
+             'description': mat_info.get('description', '')
+         }
+         for mat_name, mat_info in DEFAULT_MATERIALS.items()
+     ])
+     .on_conflict_ignore()
+     .execute())
     
-    # 2. 检查是否有历史工单，没有则注入模拟数据
-    if WorkOrder.select().count() == 0:
+    # 2. 注入设备数据
+    _inject_default_machines()
+    
+    # 3. 检查是否有历史工单，没有则注入模拟数据
+    if not WorkOrder.select().exists():
         _inject_sample_work_orders()
     
-    # 3. 检查是否有设备配置，没有则创建默认配置
-    if MachineConfig.select().count() == 0:
-        # 默认使用DW-HP120，3年折旧
+    # 4. 检查是否有设备配置，没有则创建默认配置
+    if not MachineConfig.select().exists():
+        # 默认使用第一台预设设备，3年折旧
+        machine_name, total_price = next(iter(DEFAULT_MACHINES.items()))
         MachineConfig.create(
-            machine_name="DW-HP120",
-            total_price=MACHINES["DW-HP120"],
+            machine_name=machine_name,
+            total_price=total_price,
             depreciation_years=3,
             is_active=True
         )
 
 
+def _inject_default_machines():
+    """注入预设设备 (已存在的同名设备保持不变)"""
+    (Machine
+     .insert_many([
+         {'name': name, 'total_price': total_price}
+         for name, total_price in DEFAULT_MACHINES.items()
+     ])
+     .on_conflict_ignore()
+     .execute())
+
+
+# 冷启动模拟工单: 材料名 -> [(重量g, 时长min, 备注)]
+SAMPLE_WORK_ORDERS = {
+    # 316L不锈钢 (效率约0.053 g/min)
+    "316L不锈钢": [
+        (150.0, 2830.0, "标准结构件"),
+        (85.0, 1603.0, "支架"),
+        (220.0, 4150.0, "壳体"),
+        (45.0, 849.0, "小型零件"),
+        (180.0, 3396.0, "法兰盘"),
+    ],
+    # TC4钛合金 (效率约0.047 g/min)
+    "TC4钛合金": [
+        (120.0, 2553.0, "航空接头"),
+        (65.0, 1383.0, "医疗植入件"),
+        (200.0, 4255.0, "结构件"),
+        (35.0, 745.0, "小型配件"),
+        (95.0, 2021.0, "支架结构"),
+    ],
+}
+
+
 def _inject_sample_work_orders():
     """
     注入模拟的历史工单数据
     用于冷启动时提供初始的效率参考值
+    全部工单以一次 add_work_orders 批量写入并同步更新效率聚合表
     """
-    # 获取材料对象
-    mat_316l = Material.get_or_none(Material.name == "316L不锈钢")
-    mat_tc4 = Material.get_or_none(Material.name == "TC4钛合金")
-    
-    # 316L不锈钢的模拟工单 (效率约0.053 g/min)
-    if mat_316l:
-        sample_orders_316l = [
-            {"weight_g": 150.0, "time_min": 2830.0, "is_lattice": False, "note": "标准结构件"},
-            {"weight_g": 85.0, "time_min": 1603.0, "is_lattice": False, "note": "支架"},
-            {"weight_g": 220.0, "time_min": 4150.0, "is_lattice": False, "note": "壳体"},
-            {"weight_g": 45.0, "time_min": 849.0, "is_lattice": False, "note": "小型零件"},
-            {"weight_g": 180.0, "time_min": 3396.0, "is_lattice": False, "note": "法兰盘"},
-        ]
-        for order in sample_orders_316l:
-            WorkOrder.create(material=mat_316l, **order)
-    
-    # TC4钛合金的模拟工单 (效率约0.047 g/min)
-    if mat_tc4:
-        sample_orders_tc4 = [
-            {"weight_g": 120.0, "time_min": 2553.0, "is_lattice": False, "note": "航空接头"},
-            {"weight_g": 65.0, "time_min": 1383.0, "is_lattice": False, "note": "医疗植入件"},
-            {"weight_g": 200.0, "time_min": 4255.0, "is_lattice": False, "note": "结构件"},
-            {"weight_g": 35.0, "time_min": 745.0, "is_lattice": False, "note": "小型配件"},
-            {"weight_g": 95.0, "time_min": 2021.0, "is_lattice": False, "note": "支架结构"},
-        ]
-        for order in sample_orders_tc4:
-            WorkOrder.create(material=mat_tc4, **order)
+    material_names = {m.name for m in get_all_materials()}
+    add_work_orders([
+        {
+            'material_name': material_name,
+            'weight_g': weight_g,
+            'time_min': time_min,
+            'is_lattice': False,
+            'note': note,
+        }
+        for material_name, orders in SAMPLE_WORK_ORDERS.items()
+        if material_name in material_names
+        for weight_g, time_min, note in orders
+    ])
 
 
 def close_db():
@@ -205,6 +657,62 @@ def close_db():
         db.close()
 
 
+# ============================================================
+# 连接配置
+# ============================================================
+
+def _profile_pragmas(name):
+    """获取连接配置的 PRAGMA 列表, 未知名称抛出 ValueError"""
+    if name not in CONNECTION_PROFILES:
+        raise ValueError(
+            f"未知的连接配置 '{name}', 可选: {', '.join(CONNECTION_PROFILES)}"
+        )
+    return list(CONNECTION_PROFILES[name].items())
+
+
+def get_connection_profile():
+    """获取当前连接配置名称 (未初始化时为 None)"""
+    return _active_profile
+
+
+def set_connection_profile(name):
+    """
+    切换连接配置
+    
+    立即作用于当前线程的连接, 并作为之后新建连接的默认 PRAGMA;
+    其他线程已打开的连接不受影响。不能在事务中切换 journal_mode。
+    
+    Args:
+        name: CONNECTION_PROFILES 中的配置名称
+    
+    Returns:
+        str: 切换前的配置名称
+    """
+    global _active_profile
+    pragmas = _profile_pragmas(name)
+    for key, value in pragmas:
+        db.pragma(key, value, permanent=True)
+    previous, _active_profile = _active_profile, name
+    return previous
+
+
+@contextmanager
+def connection_profile(name):
+    """
+    在 with 块内临时使用指定连接配置, 退出时恢复原配置
+    
+    用法:
+        with connection_profile('bulk-import'):
+            import_work_orders(path)
+    """
+    previous = set_connection_profile(name)
+    try:
+        yield
+    finally:
+        if previous is not None:
+            set_connection_profile(previous)
+
+
 # ============================================================
 # 数据查询辅助函数
 # ============================================================
@@ -219,6 +727,46 @@ def get_material_by_name(name):
     return Material.get_or_none(Material.name == name)
 
 
+def get_all_machines():
+    """获取所有设备列表"""
+    return list(Machine.select().order_by(Machine.id))
+
+
+def get_machine_by_name(name):
+    """根据型号获取设备"""
+    return Machine.get_or_none(Machine.name == name)
+
+
+def save_machine(name, total_price, description=""):
+    """
+    新增或更新设备
+    
+    Args:
+        name: 设备型号
+        total_price: 设备总价 (元)
+        description: 设备描述
+    
+    Returns:
+        Machine: 设备对象
+    """
+    if total_price <= 0:
+        raise ValueError("设备总价必须大于0")
+    (Machine
+     .insert(name=name, total_price=total_price, description=description)
+     .on_conflict(
+         conflict_target=[Machine.name],
+         update={Machine.total_price: EXCLUDED.total_price,
+                 Machine.description: EXCLUDED.description}
+     )
+     .execute())
+    # 设备配置中记录的价格同步更新
+    MachineConfig.update(total_price=total_price).where(
+        MachineConfig.machine_name == name
+    ).execute()
+    bump_data_version()
+    return get_machine_by_name(name)
+
+
 def get_active_machine_config():
     """获取当前激活的设备配置"""
     return MachineConfig.get_or_none(MachineConfig.is_active == True)
@@ -232,32 +780,39 @@ def save_machine_config(machine_name, depreciation_years):
         machine_name: 设备型号
         depreciation_years: 折旧年限
     """
-    # 先将所有配置设为非激活
-    MachineConfig.update(is_active=False).execute()
-    
-    # 获取设备价格
-    total_price = MACHINES.get(machine_name, 1_500_000)
-    
-    # 创建或更新配置
-    config, created = MachineConfig.get_or_create(
-        machine_name=machine_name,
-        depreciation_years=depreciation_years,
-        defaults={
-            'total_price': total_price,
-            'is_active': True,
-            'updated_at': datetime.now()
-        }
-    )
+    # 先获取设备价格: 设备不存在时不改动当前激活的配置
+    machine = get_machine_by_name(machine_name)
+    if not machine:
+        raise ValueError(f"设备 '{machine_name}' 不存在")
+    total_price = machine.total_price
     
-    if not created:
-        config.is_active = True
-        config.updated_at = datetime.now()
-        config.save()
+    with db.atomic():
+        # 先将所有配置设为非激活
+        MachineConfig.update(is_active=False).execute()
+        
+        # 创建或更新配置
+        config, created = MachineConfig.get_or_create(
+            machine_name=machine_name,
+            depreciation_years=depreciation_years,
+            defaults={
+                'total_price': total_price,
+                'is_active': True,
+                'updated_at': datetime.now()
+            }
+        )
+        
+        if not created:
+            config.is_active = True
+            config.total_price = total_price
+            config.updated_at = datetime.now()
+            config.save()
     
+    bump_data_version()
     return config
 
 
-def add_work_order(material_name, weight_g, time_min, is_lattice=False, note=""):
+def add_work_order(material_name, weight_g, time_min, is_lattice=False, note="",
+                   machine_name=None):
     """
     添加新的工单记录
     
@@ -267,6 +822,7 @@ def add_work_order(material_name, weight_g, time_min, is_lattice=False, note="")
         time_min: 时长 (分钟)
         is_lattice: 是否晶格结构
         note: 备注
+        machine_name: 打印设备型号, 可选
     
     Returns:
         WorkOrder: 创建的工单对象
@@ -274,14 +830,140 @@ def add_work_order(material_name, weight_g, time_min, is_lattice=False, note="")
     material = get_material_by_name(material_name)
     if not material:
         raise ValueError(f"材料 '{material_name}' 不存在")
+    machine = None
+    if machine_name:
+        machine = get_machine_by_name(machine_name)
+        if not machine:
+            raise ValueError(f"设备 '{machine_name}' 不存在")
     
-    return WorkOrder.create(
-        material=material,
-        weight_g=weight_g,
-        time_min=time_min,
-        is_lattice=is_lattice,
-        note=note
-    )
+    # 工单与效率聚合在同一事务中写入
+    with db.atomic():
+        order = WorkOrder.create(
+            material=material,
+            machine=machine,
+            weight_g=weight_g,
+            time_min=time_min,
+            is_lattice=is_lattice,
+            note=note
+        )
+        _apply_stats_delta(order, 1)
+    
+    bump_data_version()
+    return order
+
+
+def add_work_orders(orders):
+    """
+    批量添加工单记录 (与 add_work_order 语义相同)
+    
+    全部工单在同一事务中写入: INSERT 语句只生成一次, 以 executemany
+    批量执行; 各效率聚合表、重量分段表和效率草图按各自的主键
+    汇总后每组只更新一次。
+    
+    Args:
+        orders: 工单字典序列, 键为 material_name, weight_g, time_min,
+                is_lattice (可选), note (可选), created_at (可选),
+                machine_name (可选)
+    
+    Returns:
+        int: 写入的工单数
+    """
+    material_ids = {m.name: m.id for m in get_all_materials()}
+    machine_ids = None
+    
+    rows = []
+    deltas = {}
+    machine_deltas = {}
+    bucket_deltas = {}
+    sketch_deltas = {}
+    now = str(datetime.now())
+    for order in orders:
+        material_name = order['material_name']
+        material_id = material_ids.get(material_name)
+        if material_id is None:
+            raise ValueError(f"材料 '{material_name}' 不存在")
+        
+        machine_id = None
+        machine_name = order.get('machine_name')
+        if machine_name:
+            if machine_ids is None:
+                machine_ids = {m.name: m.id for m in get_all_machines()}
+            machine_id = machine_ids.get(machine_name)
+            if machine_id is None:
+                raise ValueError(f"设备 '{machine_name}' 不存在")
+        
+        is_lattice = bool(order.get('is_lattice', False))
+        weight_g = float(order['weight_g'])
+        time_min = float(order['time_min'])
+        created_at = str(order.get('created_at') or now)
+        rows.append((
+            material_id,
+            machine_id,
+            weight_g,
+            time_min,
+            is_lattice,
+            order.get('note') or "",
+            created_at,
+        ))
+        
+        order_delta = _order_stats_delta(weight_g, time_min, created_at)
+        delta = deltas.get((material_id, is_lattice))
+        if delta is None:
+            deltas[(material_id, is_lattice)] = order_delta
+        else:
+            _merge_stats_delta(delta, order_delta)
+        
+        if is_lattice:
+            continue
+        
+        key = efficiency_key(weight_g, time_min)
+        if machine_id is not None and key is not None:
+            machine_delta = machine_deltas.get((machine_id, material_id, key))
+            if machine_delta is None:
+                machine_deltas[(machine_id, material_id, key)] = list(order_delta)
+            else:
+                _merge_stats_delta(machine_delta, order_delta)
+        
+        bucket = weight_bucket(weight_g)
+        if bucket is not None and key is not None:
+            bucket_delta = bucket_deltas.setdefault((material_id, bucket, key), [0, 0.0, 0.0])
+            bucket_delta[0] += 1
+            bucket_delta[1] += weight_g
+            bucket_delta[2] += time_min
+        
+        if key is not None:
+            sketch_delta = sketch_deltas.get((material_id, key))
+            if sketch_delta is None:
+                sketch_deltas[(material_id, key)] = list(order_delta)
+            else:
+                _merge_stats_delta(sketch_delta, order_delta)
+    
+    if not rows:
+        return 0
+    
+    # 以第一行生成参数化的 INSERT 语句, 其余行复用同一语句
+    fields = [WorkOrder.material, WorkOrder.machine, WorkOrder.weight_g,
+              WorkOrder.time_min, WorkOrder.is_lattice, WorkOrder.note,
+              WorkOrder.created_at]
+    sql, _ = WorkOrder.insert_many(rows[:1], fields=fields).sql()
+    
+    with db.atomic():
+        timed_query(lambda: db.cursor().executemany(sql, rows), sql)
+        for (material_id, is_lattice), delta in deltas.items():
+            _upsert_stats(MaterialEfficiencyStats,
+                          {'material': material_id, 'is_lattice': is_lattice}, delta)
+        for (machine_id, material_id, key), delta in machine_deltas.items():
+            _upsert_stats(MachineMaterialStats,
+                          {'machine': machine_id, 'material': material_id, 'key': key},
+                          delta)
+        for (material_id, bucket, key), delta in bucket_deltas.items():
+            _upsert_bucket(material_id, bucket, key, delta)
+        for (material_id, key), delta in sketch_deltas.items():
+            _upsert_stats(MaterialEfficiencySketch,
+                          {'material': material_id, 'key': key}, delta)
+    
+    bump_data_version()
+    return len(rows)
 
 
 def get_recent_work_orders(limit=20):
@@ -293,10 +975,768 @@ def get_recent_work_orders(limit=20):
             .limit(limit))
 
 
+# 工单分页结果: rows 为行元组列表, 游标为 None 表示没有更多数据
+WorkOrderPage = namedtuple('WorkOrderPage', ['rows', 'next_cursor', 'prev_cursor'])
+
+
+def _encode_cursor(direction, row):
+    """将 (方向, 行的 created_at/id) 编码为不透明游标"""
+    payload = json.dumps([direction, str(row[-1]), row[0]])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """解析游标, 返回 (方向, created_at 字符串, 工单ID)"""
+    try:
+        direction, created_at, order_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii'))
+        )
+    except (ValueError, TypeError):
+        raise ValueError("无效的分页游标")
+    if direction not in ('next', 'prev'):
+        raise ValueError("无效的分页游标")
+    return direction, created_at, order_id
+
+
+def get_work_orders_page(cursor=None, limit=50, material=None, is_lattice=None,
+                         date_from=None, date_to=None,
+                         weight_min=None, weight_max=None):
+    """
+    按 (created_at, id) 键集分页获取工单 (最新在前)
+    
+    以上一页边界行的 (created_at, id) 作为查询起点, 不使用 OFFSET,
+    任意深度的翻页代价相同。
+    
+    Args:
+        cursor: 上一次返回的 next_cursor / prev_cursor, None 表示第一页
+        limit: 每页条数
+        material: 材料名称筛选
+        is_lattice: 晶格标记筛选 (None 表示不筛选)
+        date_from: 起始时间 (含)
+        date_to: 截止时间 (含; 传入 date 时包含当天全天)
+        weight_min: 最小重量 (含)
+        weight_max: 最大重量 (含)
+    
+    Returns:
+        WorkOrderPage: rows 为 [(工单ID, 材料名, 重量, 时长, 是否晶格, 备注,
+                                 设备型号, 创建时间)], 未记录设备时设备型号为None
+    """
+    query = (WorkOrder
+             .select(
+                 WorkOrder.id, Material.name, WorkOrder.weight_g,
+                 WorkOrder.time_min, WorkOrder.is_lattice, WorkOrder.note,
+                 Machine.name, WorkOrder.created_at
+             )
+             .join(Material)
+             .switch(WorkOrder)
+             .join(Machine, JOIN.LEFT_OUTER))
+    
+    # 筛选条件
+    if material is not None:
+        query = query.where(Material.name == material)
+    if is_lattice is not None:
+        query = query.where(WorkOrder.is_lattice == bool(is_lattice))
+    if date_from is not None:
+        query = query.where(WorkOrder.created_at >= date_from)
+    if date_to is not None:
+        if isinstance(date_to, date) and not isinstance(date_to, datetime):
+            query = query.where(WorkOrder.created_at < date_to + timedelta(days=1))
+        else:
+            query = query.where(WorkOrder.created_at <= date_to)
+    if weight_min is not None:
+        query = query.where(WorkOrder.weight_g >= weight_min)
+    if weight_max is not None:
+        query = query.where(WorkOrder.weight_g <= weight_max)
+    
+    # 键集条件: 向后翻页取更旧的记录, 向前翻页取更新的记录
+    direction = 'next'
+    key = Tuple(WorkOrder.created_at, WorkOrder.id)
+    if cursor:
+        direction, created_at, order_id = _decode_cursor(cursor)
+        if direction == 'next':
+            query = query.where(key < Tuple(created_at, order_id))
+        else:
+            query = query.where(key > Tuple(created_at, order_id))
+    
+    if direction == 'next':
+        query = query.order_by(WorkOrder.created_at.desc(), WorkOrder.id.desc())
+    else:
+        query = query.order_by(WorkOrder.created_at.asc(), WorkOrder.id.asc())
+    
+    # 多取一行用于判断是否还有下一页
+    rows = list(query.limit(limit + 1).tuples())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+    
+    if not rows:
+        return WorkOrderPage([], None, None)
+    
+    if direction == 'next':
+        has_next, has_prev = has_more, cursor is not None
+    else:
+        has_next, has_prev = True, has_more
+    
+    return WorkOrderPage(
+        rows,
+        _encode_cursor('next', rows[-1]) if has_next else None,
+        _encode_cursor('prev', rows[0]) if has_prev else None
+    )
+
+
 def delete_work_order(order_id):
     """删除指定工单"""
-    order = WorkOrder.get_or_none(WorkOrder.id == order_id)
-    if order:
+    with db.atomic():
+        order = WorkOrder.get_or_none(WorkOrder.id == order_id)
+        if not order:
+            return False
         order.delete_instance()
-        return True
-    return False
+        _apply_stats_delta(order, -1)
+    
+    bump_data_version()
+    return True
+
+
+# ============================================================
+# 效率聚合表维护
+# ============================================================
+
+# 衰减权重的固定时间锚点: 权重只取决于工单时间与锚点的间隔,
+# 新增工单直接累加, 已有工单的权重无需随时间推移重新计算
+DECAY_EPOCH = datetime(2020, 1, 1)
+
+# 聚合表中随工单增减而累加的列
+STATS_SUM_FIELDS = (
+    'order_count', 'total_weight', 'total_time',
+    'decayed_count', 'decayed_weight', 'decayed_time',
+)
+
+# 聚合表中按 Chan/Welford 公式合并的离差平方和列
+STATS_MOMENT_FIELDS = ('m2_weight', 'm2_time', 'c_weight_time')
+
+STATS_FIELDS = STATS_SUM_FIELDS + STATS_MOMENT_FIELDS
+
+
+@db.func('decay_factor')
+def decay_factor(created_at=None):
+    """
+    工单的衰减权重 2^((工单时间 - DECAY_EPOCH) / 半衰期)
+    
+    工单每早 EFFICIENCY_HALF_LIFE_DAYS 天, 权重减半。同时注册为SQL函数,
+    供 rebuild_stats() 在分组汇总中使用。
+    
+    Args:
+        created_at: datetime 或数据库中的时间字符串, 默认当前时间
+    
+    Returns:
+        float: 衰减权重
+    """
+    if created_at is None:
+        created_at = datetime.now()
+    elif isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    days = (created_at - DECAY_EPOCH).total_seconds() / 86400
+    return 2.0 ** (days / EFFICIENCY_HALF_LIFE_DAYS)
+
+
+@db.func('weight_bucket')
+def weight_bucket(weight_g):
+    """
+    重量所在的分段编号 floor(log2(重量) × WEIGHT_BUCKETS_PER_OCTAVE)
+    
+    分段在对数坐标上等距, 每个2倍重量区间划分 WEIGHT_BUCKETS_PER_OCTAVE 段。
+    同时注册为SQL函数, 供 rebuild_stats() 分组使用。
+    
+    Returns:
+        int: 分段编号, 重量不大于0时为 None
+    """
+    if weight_g <= 0:
+        return None
+    return math.floor(math.log2(weight_g) * WEIGHT_BUCKETS_PER_OCTAVE)
+
+
+def bucket_center(bucket):
+    """分段中心的 log2(重量) (分段上下界 log2 的中点)"""
+    return (bucket + 0.5) / WEIGHT_BUCKETS_PER_OCTAVE
+
+
+# 效率分布草图的相对精度 α: 分箱 k 覆盖效率区间 (γ^(k-1), γ^k], γ = (1+α)/(1-α)
+# 修改后需执行 rebuild_stats() 重算草图表
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+
+
+@db.func('efficiency_key')
+def efficiency_key(weight_g, time_min):
+    """
+    工单效率所在的草图分箱编号 ceil(log_γ(重量 / 时长))
+    
+    同时注册为SQL函数, 供 rebuild_stats() 分组使用。
+    
+    Returns:
+        int: 分箱编号, 重量或时长不大于0时为 None
+    """
+    if weight_g <= 0 or time_min <= 0:
+        return None
+    return math.ceil(math.log(weight_g / time_min) / math.log(SKETCH_GAMMA))
+
+
+def sketch_key_value(key):
+    """分箱的代表效率 2γ^k / (γ+1), 与箱内任一效率的相对误差不超过 α"""
+    return 2 * SKETCH_GAMMA ** key / (SKETCH_GAMMA + 1)
+
+
+def _order_stats_delta(weight_g, time_min, created_at, sign=1):
+    """
+    单条工单对聚合表各列的增量 (顺序同 STATS_FIELDS)
+    
+    单条工单自身的离差平方和为0, 与已有统计合并时才产生修正项
+    
+    Args:
+        sign: 1 表示新增, -1 表示删除
+    """
+    decay = decay_factor(created_at)
+    return [
+        sign,
+        sign * weight_g,
+        sign * time_min,
+        sign * decay,
+        sign * decay * weight_g,
+        sign * decay * time_min,
+        0.0,
+        0.0,
+        0.0,
+    ]
+
+
+def _merge_stats_delta(target, delta):
+    """
+    将增量 delta 合并到 target (原地修改, 顺序同 STATS_FIELDS)
+    
+    累加列直接相加; 离差平方和按 Chan 并行合并公式:
+        M2 = M2_a + M2_b + δ_w² · n_a · n_b / n
+        C  = C_a  + C_b  + δ_w · δ_t · n_a · n_b / n
+    其中 δ 为两组均值之差。n_b 为负数时即为从 target 中移除一组工单。
+    与 _upsert_stats 中的 SQL 表达式保持一致。
+    """
+    count_a, weight_a, time_a = target[:3]
+    count_b, weight_b, time_b = delta[:3]
+    count = count_a + count_b
+    
+    m2_weight, m2_time, c_weight_time = (
+        a + b for a, b in zip(target[6:], delta[6:])
+    )
+    if count_a and count_b and count:
+        scale = count_a * count_b / count
+        d_weight = weight_b / count_b - weight_a / count_a
+        d_time = time_b / count_b - time_a / count_a
+        m2_weight += d_weight * d_weight * scale
+        m2_time += d_time * d_time * scale
+        c_weight_time += d_weight * d_time * scale
+    
+    for i in range(6):
+        target[i] += delta[i]
+    target[6:] = [m2_weight, m2_time, c_weight_time]
+
+
+def _apply_stats_delta(order, sign):
+    """
+    将单条工单的增减同步到效率聚合表, 以及设备-材料效率聚合表、
+    重量分段表和效率草图 (非晶格工单)
+    
+    删除时按工单自身的创建时间扣除衰减累计值, 与新增时加上的完全抵消
+    
+    Args:
+        order: 工单对象
+        sign: 1 表示新增, -1 表示删除
+    """
+    delta = _order_stats_delta(order.weight_g, order.time_min, order.created_at, sign)
+    _upsert_stats(
+        MaterialEfficiencyStats,
+        {'material': order.material_id, 'is_lattice': bool(order.is_lattice)},
+        delta
+    )
+    if order.is_lattice:
+        return
+    
+    key = efficiency_key(order.weight_g, order.time_min)
+    if order.machine_id is not None and key is not None:
+        _upsert_stats(
+            MachineMaterialStats,
+            {'machine': order.machine_id, 'material': order.material_id, 'key': key},
+            delta
+        )
+    
+    bucket = weight_bucket(order.weight_g)
+    if bucket is not None and key is not None:
+        _upsert_bucket(order.material_id, bucket, key,
+                       [sign, sign * order.weight_g, sign * order.time_min])
+    
+    if key is not None:
+        _upsert_stats(MaterialEfficiencySketch,
+                      {'material': order.material_id, 'key': key}, delta)
+
+
+def _upsert_stats(model, key, delta):
+    """
+    按主键累加效率统计 (单条 UPSERT 语句)
+    
+    离差平方和的合并方式同 _merge_stats_delta。
+    工单数归零时同时清零累计值, 避免浮点残差
+    
+    Args:
+        model: MaterialEfficiencyStats / MachineMaterialStats / MaterialEfficiencySketch
+        key: 主键字段值, 如 {'material': 1, 'is_lattice': False}
+        delta: 各列的增量, 顺序同 STATS_FIELDS
+    """
+    S = model
+    old_count = S.order_count
+    add_count = EXCLUDED.order_count
+    new_count = old_count + add_count
+    update = {S.order_count: new_count}
+    for name in STATS_SUM_FIELDS[1:]:
+        field = getattr(S, name)
+        update[field] = Case(None, [(new_count == 0, 0)],
+                             field + getattr(EXCLUDED, name))
+    
+    # Chan 合并的修正项 (任一组为空时为0, 避免除以0)
+    d_weight = EXCLUDED.total_weight / add_count - S.total_weight / old_count
+    d_time = EXCLUDED.total_time / add_count - S.total_time / old_count
+    scale = old_count * add_count * 1.0 / new_count
+    for name, correction in (('m2_weight', d_weight * d_weight * scale),
+                             ('m2_time', d_time * d_time * scale),
+                             ('c_weight_time', d_weight * d_time * scale)):
+        field = getattr(S, name)
+        update[field] = Case(None, [
+            (new_count == 0, 0),
+            (old_count == 0, field + getattr(EXCLUDED, name)),
+        ], field + getattr(EXCLUDED, name) + correction)
+    
+    (S
+     .insert(**key, **dict(zip(STATS_FIELDS, delta)))
+     .on_conflict(
+         conflict_target=[getattr(S, name) for name in key],
+         update=update
+     )
+     .execute())
+
+
+def _upsert_bucket(material_id, bucket, key, delta):
+    """
+    按 (材料, 重量分段, 效率分箱) 累加统计 (单条 UPSERT 语句)
+    
+    Args:
+        delta: [工单数, 重量, 时长] 的增量
+    """
+    B = MaterialWeightBucket
+    new_count = B.order_count + EXCLUDED.order_count
+    (B
+     .insert(material=material_id, bucket=bucket, key=key, order_count=delta[0],
+             total_weight=delta[1], total_time=delta[2])
+     .on_conflict(
+         conflict_target=[B.material, B.bucket, B.key],
+         update={
+             B.order_count: new_count,
+             B.total_weight: Case(None, [(new_count == 0, 0)],
+                                  B.total_weight + EXCLUDED.total_weight),
+             B.total_time: Case(None, [(new_count == 0, 0)],
+                                B.total_time + EXCLUDED.total_time),
+         }
+     )
+     .execute())
+
+
+def get_material_stats(material_name):
+    """
+    一次查询获取材料的预设效率及其非晶格工单聚合统计
+    
+    Returns:
+        dict: {default_efficiency, STATS_FIELDS 各列},
+              材料不存在时返回 None
+    """
+    return _material_stats_query(material_name).dicts().first()
+
+
+def _material_stats_query(material_name):
+    """材料预设效率 + 非晶格聚合统计的查询"""
+    S = MaterialEfficiencyStats
+    return (Material
+            .select(
+                Material.default_efficiency,
+                *[fn.COALESCE(getattr(S, name), 0).alias(name)
+                  for name in STATS_FIELDS]
+            )
+            .join(S, JOIN.LEFT_OUTER, on=(
+                (S.material == Material.id) & (S.is_lattice == False)
+            ))
+            .where(Material.name == material_name))
+
+
+def get_all_material_stats():
+    """
+    一次查询获取全部材料及其按晶格标记分组的聚合统计
+    
+    Returns:
+        list: [{name, default_efficiency, density, is_lattice, STATS_FIELDS 各列}],
+              没有任何工单的材料 is_lattice 及各统计列为 None
+    """
+    S = MaterialEfficiencyStats
+    return list(Material
+                .select(
+                    Material.name,
+                    Material.default_efficiency,
+                    Material.density,
+                    S.is_lattice,
+                    *[getattr(S, name) for name in STATS_FIELDS]
+                )
+                .join(S, JOIN.LEFT_OUTER, on=(S.material == Material.id))
+                .order_by(Material.id, S.is_lattice)
+                .dicts())
+
+
+def get_all_machine_stats():
+    """
+    一次查询获取全部 (设备, 材料) 的非晶格工单分箱统计
+    
+    Returns:
+        list: [{machine, name, key, STATS_FIELDS 各列}], machine 为设备型号,
+              name 为材料名, key 为效率分箱编号; 按设备、材料排序
+    """
+    S = MachineMaterialStats
+    return list(S
+                .select(
+                    Machine.name.alias('machine'),
+                    Material.name,
+                    S.key,
+                    *[getattr(S, name) for name in STATS_FIELDS]
+                )
+                .join(Machine, on=(S.machine == Machine.id))
+                .switch(S)
+                .join(Material, on=(S.material == Material.id))
+                .where(S.order_count > 0)
+                .order_by(S.machine, S.material, S.key)
+                .dicts())
+
+
+def get_machine_stats(machine_name, material_name):
+    """
+    一次查询获取指定 (设备, 材料) 的非晶格工单分箱统计
+    
+    Returns:
+        list: [{key, STATS_FIELDS 各列}], 按分箱编号排序; 没有该设备的工单时为空
+    """
+    S = MachineMaterialStats
+    return list(S
+                .select(S.key, *[getattr(S, name) for name in STATS_FIELDS])
+                .join(Machine, on=(S.machine == Machine.id))
+                .switch(S)
+                .join(Material, on=(S.material == Material.id))
+                .where((Machine.name == machine_name) &
+                       (Material.name == material_name) & (S.order_count > 0))
+                .order_by(S.key)
+                .dicts())
+
+
+def get_all_weight_buckets():
+    """
+    一次查询获取全部材料的重量分段统计
+    
+    Returns:
+        list: [(材料名, 分段编号, 效率分箱编号, 工单数, 总重量, 总时长)],
+              按材料和分段排序
+    """
+    B = MaterialWeightBucket
+    return list(B
+                .select(Material.name, B.bucket, B.key, B.order_count,
+                        B.total_weight, B.total_time)
+                .join(Material, on=(B.material == Material.id))
+                .where(B.order_count > 0)
+                .order_by(B.material, B.bucket)
+                .tuples())
+
+
+def get_efficiency_sketch(material_name):
+    """
+    一次查询获取材料的效率草图
+    
+    Returns:
+        list: [{key, STATS_FIELDS 各列}], 按分箱编号排序
+    """
+    return list(_efficiency_sketch_query(material_name).dicts())
+
+
+def _efficiency_sketch_query(material_name):
+    """单个材料效率草图的查询"""
+    K = MaterialEfficiencySketch
+    return (K
+            .select(K.key, *[getattr(K, name) for name in STATS_FIELDS])
+            .join(Material, on=(K.material == Material.id))
+            .where((Material.name == material_name) & (K.order_count > 0))
+            .order_by(K.key))
+
+
+def get_all_efficiency_sketches():
+    """
+    一次查询获取全部材料的效率草图
+    
+    Returns:
+        dict: {材料名: [{key, STATS_FIELDS 各列}]}, 各草图按分箱编号排序
+    """
+    K = MaterialEfficiencySketch
+    sketches = {}
+    for row in (K
+                .select(Material.name, K.key, *[getattr(K, name) for name in STATS_FIELDS])
+                .join(Material, on=(K.material == Material.id))
+                .where(K.order_count > 0)
+                .order_by(K.material, K.key)
+                .dicts()):
+        sketches.setdefault(row.pop('name'), []).append(row)
+    return sketches
+
+
+def merge_stats_rows(rows):
+    """
+    合并若干效率统计行 (如草图的部分分箱) 为一行
+    
+    Returns:
+        dict: {STATS_FIELDS 各列}
+    """
+    merged = [0] + [0.0] * (len(STATS_FIELDS) - 1)
+    for row in rows:
+        _merge_stats_delta(merged, [row[name] for name in STATS_FIELDS])
+    return dict(zip(STATS_FIELDS, merged))
+
+
+def rebuild_stats(tolerance=1e-6):
+    """
+    从工单表全量重建各效率聚合表、重量分段表和效率草图, 并检查增量统计是否发生漂移
+    
+    修改 EFFICIENCY_HALF_LIFE_DAYS 或 WEIGHT_BUCKETS_PER_OCTAVE 后也需要调用,
+    以按新的设置重算
+    
+    Args:
+        tolerance: 累计值允许的相对误差
+    
+    Returns:
+        list: 漂移记录 [{material_id, is_lattice / machine / bucket / key,
+                         expected, actual}],
+              为空表示聚合表与工单表一致
+    """
+    with db.atomic():
+        drift = _rebuild_table(
+            MaterialEfficiencyStats, ('material', 'is_lattice'), STATS_FIELDS,
+            _stats_group_query(), tolerance
+        )
+        drift += _rebuild_table(
+            MachineMaterialStats, ('machine', 'material', 'key'), STATS_FIELDS,
+            _machine_stats_group_query(), tolerance
+        )
+        drift += _rebuild_table(
+            MaterialWeightBucket, ('material', 'bucket', 'key'),
+            ('order_count', 'total_weight', 'total_time'),
+            _bucket_group_query(), tolerance
+        )
+        drift += _rebuild_table(
+            MaterialEfficiencySketch, ('material', 'key'), STATS_FIELDS,
+            _sketch_group_query(), tolerance
+        )
+    
+    bump_data_version()
+    return drift
+
+
+def _rebuild_table(model, key_fields, value_fields, query, tolerance):
+    """
+    用分组查询 query 的结果替换聚合表 model, 返回替换前的漂移记录
+    
+    value_fields 的第一列为工单数, 需完全相等; 其余列按相对误差比较
+    """
+    def normalize(key):
+        return tuple(bool(v) if name == 'is_lattice' else v
+                     for name, v in zip(key_fields, key))
+    
+    expected = {
+        normalize([row[name] for name in key_fields]):
+            tuple(row[name] for name in value_fields)
+        for row in query.dicts()
+    }
+    actual = {
+        normalize([row[name] for name in key_fields]):
+            tuple(row[name] for name in value_fields)
+        for row in model.select().dicts()
+    }
+    
+    empty = (0,) + (0.0,) * (len(value_fields) - 1)
+    drift = []
+    for key in sorted(set(expected) | set(actual)):
+        exp = expected.get(key, empty)
+        act = actual.get(key, empty)
+        if exp[0] != act[0] or any(
+            abs(e - a) > tolerance * max(1.0, abs(e))
+            for e, a in zip(exp[1:], act[1:])
+        ):
+            record = {
+                'material_id' if name == 'material' else name: value
+                for name, value in zip(key_fields, key)
+            }
+            record['expected'] = exp
+            record['actual'] = act
+            drift.append(record)
+    
+    # 用全量结果替换聚合表
+    model.delete().execute()
+    rows = [
+        dict(zip(key_fields + tuple(value_fields), key + values))
+        for key, values in expected.items()
+    ]
+    if rows:
+        model.insert_many(rows).execute()
+    return drift
+
+
+def _stats_group_query():
+    """按 (材料, 晶格标记) 分组汇总工单表的查询"""
+    return (WorkOrder
+            .select(WorkOrder.material, WorkOrder.is_lattice, *_stats_columns())
+            .group_by(WorkOrder.material, WorkOrder.is_lattice))
+
+
+def _machine_stats_group_query():
+    """按 (设备, 材料, 效率分箱) 分组汇总记录了设备的非晶格工单的查询"""
+    key = fn.efficiency_key(WorkOrder.weight_g, WorkOrder.time_min)
+    return (WorkOrder
+            .select(WorkOrder.machine, WorkOrder.material, key.alias('key'),
+                    *_stats_columns())
+            .where((WorkOrder.is_lattice == False) & WorkOrder.machine.is_null(False) &
+                   (WorkOrder.weight_g > 0) & (WorkOrder.time_min > 0))
+            .group_by(WorkOrder.machine, WorkOrder.material, key))
+
+
+def _sketch_group_query():
+    """按 (材料, 效率分箱) 分组汇总非晶格工单的查询"""
+    key = fn.efficiency_key(WorkOrder.weight_g, WorkOrder.time_min)
+    return (WorkOrder
+            .select(WorkOrder.material, key.alias('key'), *_stats_columns())
+            .where((WorkOrder.is_lattice == False) &
+                   (WorkOrder.weight_g > 0) & (WorkOrder.time_min > 0))
+            .group_by(WorkOrder.material, key))
+
+
+def _stats_columns():
+    """分组汇总出 STATS_FIELDS 各列的表达式"""
+    decay = fn.decay_factor(WorkOrder.created_at)
+    count = fn.COUNT(WorkOrder.id)
+    total_weight = fn.SUM(WorkOrder.weight_g)
+    total_time = fn.SUM(WorkOrder.time_min)
+    # 离差平方和 = Σx·y - Σx·Σy / n
+    return [
+        count.alias('order_count'),
+        total_weight.alias('total_weight'),
+        total_time.alias('total_time'),
+        fn.SUM(decay).alias('decayed_count'),
+        fn.SUM(decay * WorkOrder.weight_g).alias('decayed_weight'),
+        fn.SUM(decay * WorkOrder.time_min).alias('decayed_time'),
+        (fn.SUM(WorkOrder.weight_g * WorkOrder.weight_g)
+         - total_weight * total_weight / count).alias('m2_weight'),
+        (fn.SUM(WorkOrder.time_min * WorkOrder.time_min)
+         - total_time * total_time / count).alias('m2_time'),
+        (fn.SUM(WorkOrder.weight_g * WorkOrder.time_min)
+         - total_weight * total_time / count).alias('c_weight_time'),
+    ]
+
+
+def _bucket_group_query():
+    """按 (材料, 重量分段, 效率分箱) 分组汇总非晶格工单的查询"""
+    bucket = fn.weight_bucket(WorkOrder.weight_g)
+    key = fn.efficiency_key(WorkOrder.weight_g, WorkOrder.time_min)
+    return (WorkOrder
+            .select(
+                WorkOrder.material,
+                bucket.alias('bucket'),
+                key.alias('key'),
+                fn.COUNT(WorkOrder.id).alias('order_count'),
+                fn.SUM(WorkOrder.weight_g).alias('total_weight'),
+                fn.SUM(WorkOrder.time_min).alias('total_time')
+            )
+            .where((WorkOrder.is_lattice == False) &
+                   (WorkOrder.weight_g > 0) & (WorkOrder.time_min > 0))
+            .group_by(WorkOrder.material, bucket, key))
+
+
+# ============================================================
+# 查询计划诊断
+# ============================================================
+
+def _hot_queries():
+    """
+    需要走索引的热点查询
+    
+    Returns:
+        dict: {查询名称: peewee查询}
+    """
+    return {
+        'material_efficiency_sum': (WorkOrder
+                                    .select(
+                                        fn.SUM(WorkOrder.weight_g),
+                                        fn.SUM(WorkOrder.time_min)
+                                    )
+                                    .where(
+                                        (WorkOrder.material == 1) &
+                                        (WorkOrder.is_lattice == False)
+                                    )),
+        'material_stats': _material_stats_query(""),
+        'stats_rebuild': _stats_group_query(),
+        'efficiency_sketch': _efficiency_sketch_query(""),
+        'recent_work_orders': get_recent_work_orders(20),
+        'work_orders_page': (WorkOrder
+                             .select(WorkOrder.id)
+                             .where(
+                                 (WorkOrder.material == 1) &
+                                 (Tuple(WorkOrder.created_at, WorkOrder.id) <
+                                  Tuple("", 1))
+                             )
+                             .order_by(WorkOrder.created_at.desc(),
+                                       WorkOrder.id.desc())
+                             .limit(51)),
+        'work_order_by_id': WorkOrder.select().where(WorkOrder.id == 1),
+    }
+
+
+def explain_query_plans():
+    """
+    对所有热点查询执行 EXPLAIN QUERY PLAN
+    
+    Returns:
+        dict: {查询名称: [查询计划描述行]}
+    """
+    plans = {}
+    for name, query in _hot_queries().items():
+        sql, params = query.sql()
+        cursor = db.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params)
+        plans[name] = [row[-1] for row in cursor.fetchall()]
+    return plans
+
+
+def check_query_plans():
+    """
+    检查热点查询是否全部命中索引
+    
+    全表扫描 (SCAN 且未使用索引) 或临时 B 树排序均视为失败
+    
+    Returns:
+        dict: {查询名称: [查询计划描述行]}
+    
+    Raises:
+        RuntimeError: 存在未命中索引的热点查询
+    """
+    plans = explain_query_plans()
+    problems = []
+    for name, details in plans.items():
+        for detail in details:
+            table_scan = detail.startswith("SCAN") and "USING" not in detail
+            if table_scan or "USE TEMP B-TREE" in detail:
+                problems.append(f"{name}: {detail}")
+    if problems:
+        raise RuntimeError("热点查询未命中索引:\n" + "\n".join(problems))
+    return plans
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 历史工单批量导入
+==================================
+从 CSV / XLSX 文件流式导入历史工单
+按 "读取 → 校验/单位归一 → 分块写入" 的生成器流水线处理,
+内存占用与文件行数无关
+
+用法:
+    python -m src.importer 工单.csv [--chunk-size 5000]
+"""
+
+import csv
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+from .database import add_work_orders, get_all_materials, get_all_machines
+
+
+# ============================================================
+# 列名映射
+# ============================================================
+
+# 标准字段 -> 可识别的表头 (不区分大小写, 忽略首尾空格)
+COLUMN_ALIASES = {
+    'material_name': ('material_name', 'material', '材料', '材质', '打印材质'),
+    'weight_g': ('weight_g', 'weight', '重量', '重量(g)', '重量(克)', '实际重量'),
+    'time_min': ('time_min', '时长(分钟)', '总时长(分钟)', '打印时长(分钟)'),
+    'hours': ('hours', 'time_h', '小时', '时长(小时)'),
+    'minutes': ('minutes', '分钟'),
+    'is_lattice': ('is_lattice', 'lattice', '晶格', '是否晶格', '晶格结构'),
+    'machine_name': ('machine_name', 'machine', '设备', '设备型号', '打印设备'),
+    'note': ('note', 'notes', '备注'),
+    'created_at': ('created_at', 'date', '日期', '录入时间', '创建时间'),
+}
+
+# 晶格标记的真值写法
+TRUE_VALUES = {'1', 'true', 'yes', 'y', '是', '√', 't'}
+
+# 日期格式 (fromisoformat 无法识别时依次尝试)
+DATE_FORMATS = ('%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%Y/%m/%d', '%Y%m%d')
+
+# 报告中最多保留的错误明细条数
+MAX_ERROR_DETAILS = 100
+
+
+class ImportReport:
+    """
+    导入结果报告
+    
+    字段:
+        rows_read: 读取的数据行数
+        rows_imported: 成功写入的工单数
+        rows_rejected: 校验失败被跳过的行数
+        errors: 错误明细 [(行号, 原因)], 最多保留 MAX_ERROR_DETAILS 条
+        elapsed: 耗时 (秒)
+    """
+    
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+    
+    @property
+    def rows_per_second(self) -> float:
+        """导入速度 (行/秒)"""
+        if self.elapsed > 0:
+            return self.rows_read / self.elapsed
+        return 0.0
+    
+    def reject(self, line_no, reason):
+        """记录一条被拒绝的行"""
+        self.rows_rejected += 1
+        if len(self.errors) < MAX_ERROR_DETAILS:
+            self.errors.append((line_no, reason))
+    
+    def __str__(self):
+        return (f"读取 {self.rows_read} 行 | 导入 {self.rows_imported} 条 | "
+                f"跳过 {self.rows_rejected} 行 | 耗时 {self.elapsed:.2f}s | "
+                f"{self.rows_per_second:,.0f} 行/秒")
+
+
+# ============================================================
+# 流水线: 读取
+# ============================================================
+
+def read_rows(path):
+    """
+    逐行读取 CSV / XLSX 文件
+    
+    Yields:
+        tuple: (行号, {表头: 原始值})
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        yield from _read_xlsx(path)
+    else:
+        yield from _read_csv(path)
+
+
+def read_header(path):
+    """
+    读取 CSV / XLSX 文件的表头 (不读取数据行)
+    
+    Returns:
+        list: 表头各列名称, 空文件返回空列表
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(values_only=True), None)
+        finally:
+            workbook.close()
+        return ["" if h is None else str(h) for h in header or ()]
+    
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), None) or []
+
+
+def _read_csv(path):
+    """流式读取 CSV (兼容带 BOM 的 UTF-8)"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        for line_no, values in enumerate(reader, start=2):
+            if any(v.strip() for v in values):
+                yield line_no, dict(zip(header, values))
+
+
+def _read_xlsx(path):
+    """流式读取 XLSX 第一个工作表 (需要 openpyxl)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("导入 XLSX 需要 openpyxl: pip install openpyxl")
+    
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ["" if h is None else str(h) for h in header]
+        for line_no, values in enumerate(rows, start=2):
+            if any(v not in (None, "") for v in values):
+                yield line_no, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+# ============================================================
+# 流水线: 校验与单位归一
+# ============================================================
+
+def _build_column_map(header, column_aliases=COLUMN_ALIASES):
+    """将文件表头映射为标准字段名"""
+    lookup = {
+        alias.strip().lower(): field
+        for field, aliases in column_aliases.items()
+        for alias in aliases
+    }
+    return {
+        key: lookup[str(key).strip().lower()]
+        for key in header
+        if str(key).strip().lower() in lookup
+    }
+
+
+def _parse_float(value):
+    """解析数值, 空值返回 None; NaN / 无穷大视为无效 (ValueError)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        value = str(value).strip().replace(',', '')
+        if not value:
+            return None
+        number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"无效的数值 '{value}'")
+    return number
+
+
+def _parse_bool(value):
+    """解析晶格标记 (数值按是否等于1判断, 表格导出的 1 可能是 1.0 或 "1.0")"""
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    text = str(value).strip().lower()
+    try:
+        return float(text) == 1
+    except ValueError:
+        return text in TRUE_VALUES
+
+
+def _parse_datetime(value):
+    """
+    解析日期时间, 空值返回 None
+    
+    带时区的时间 (如 2024-05-01T08:00:00+08:00) 换算为本地时间并去掉时区,
+    与数据库中的其他时间一致
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return _naive_local(value)
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return _naive_local(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"无法识别的日期 '{value}'")
+
+
+def _naive_local(value):
+    """带时区的时间换算为本地时间 (无时区), 无时区的时间原样返回"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def normalize_rows(rows, material_names, report, machine_names=()):
+    """
+    校验并归一化原始行
+    
+    时长可以是 time_min (分钟), 也可以是 小时 + 分钟 两列,
+    与数据进化页的录入规则一致: 重量和总时长都必须大于0。
+    校验失败的行记入 report 并跳过。
+    
+    Args:
+        rows: read_rows 产生的 (行号, 原始行) 迭代器
+        material_names: 数据库中已有的材料名集合
+        report: ImportReport
+        machine_names: 数据库中已有的设备型号集合 (设备列为空时不记录设备)
+    
+    Yields:
+        dict: add_work_orders 可接受的工单字典
+    """
+    column_map = None
+    for line_no, raw in rows:
+        report.rows_read += 1
+        if column_map is None:
+            column_map = _build_column_map(raw.keys())
+        record = {column_map[k]: v for k, v in raw.items() if k in column_map}
+        
+        try:
+            material_name = str(record.get('material_name') or "").strip()
+            if material_name not in material_names:
+                raise ValueError(f"材料 '{material_name}' 不存在")
+            
+            weight = _parse_float(record.get('weight_g'))
+            if weight is None or weight <= 0:
+                raise ValueError("重量必须大于0")
+            
+            time_min = _parse_float(record.get('time_min'))
+            if time_min is None:
+                hours = _parse_float(record.get('hours')) or 0
+                mins = _parse_float(record.get('minutes')) or 0
+                time_min = hours * 60 + mins
+            if time_min <= 0:
+                raise ValueError("打印时长必须大于0")
+            
+            machine_name = str(record.get('machine_name') or "").strip() or None
+            if machine_name is not None and machine_name not in machine_names:
+                raise ValueError(f"设备 '{machine_name}' 不存在")
+            
+            note = record.get('note')
+            order = {
+                'material_name': material_name,
+                'weight_g': weight,
+                'time_min': time_min,
+                'is_lattice': _parse_bool(record.get('is_lattice')),
+                'note': "" if note is None else str(note).strip()[:200],
+                'created_at': _parse_datetime(record.get('created_at')),
+                'machine_name': machine_name,
+            }
+        except ValueError as e:
+            report.reject(line_no, str(e))
+            continue
+        
+        yield order
+
+
+# ============================================================
+# 流水线: 分块写入
+# ============================================================
+
+def _chunks(iterable, size):
+    """将迭代器按固定大小切块"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_work_orders(path, chunk_size=5000, progress=None) -> ImportReport:
+    """
+    从 CSV / XLSX 文件导入历史工单
+    
+    每块在一个事务内以 insert_many 写入, 并一次性更新效率聚合表
+    
+    Args:
+        path: 文件路径
+        chunk_size: 每个事务写入的行数
+        progress: 可选回调, 每写完一块调用 progress(report)
+    
+    Returns:
+        ImportReport: 导入结果
+    """
+    report = ImportReport()
+    material_names = {m.name for m in get_all_materials()}
+    machine_names = {m.name for m in get_all_machines()}
+    
+    start = time.perf_counter()
+    records = normalize_rows(read_rows(path), material_names, report, machine_names)
+    for chunk in _chunks(records, chunk_size):
+        report.rows_imported += add_work_orders(chunk)
+        report.elapsed = time.perf_counter() - start
+        if progress:
+            progress(report)
+    report.elapsed = time.perf_counter() - start
+    
+    return report
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    from .database import init_db, close_db
+    
+    parser = argparse.ArgumentParser(description="批量导入历史工单 (CSV / XLSX)")
+    parser.add_argument('path', help="工单文件路径")
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help="每个事务写入的行数 (默认 5000)")
+    args = parser.parse_args(argv)
+    
+    # 导入期间使用批量导入连接配置 (不等待 fsync, 大缓存)
+    init_db(profile='bulk-import')
+    try:
+        report = import_work_orders(
+            args.path,
+            chunk_size=args.chunk_size,
+            progress=lambda r: print(f"[IMPORT] {r}", flush=True)
+        )
+    finally:
+        close_db()
+    
+    print(f"[OK] {report}")
+    for line_no, reason in report.errors:
+        print(f"  第{line_no}行: {reason}")
+    if report.rows_rejected > len(report.errors):
+        print(f"  ... 其余 {report.rows_rejected - len(report.errors)} 行错误未显示")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
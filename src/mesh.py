@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - STL 模型几何计算
+==================================
+读取 STL 模型, 计算体积、表面积和包围盒, 按材料密度换算零件重量。
+
+二进制 STL 通过内存映射 + np.frombuffer 直接按记录结构读取 (不复制文件),
+体积按有向四面体体积求和, 全部为分块的 NumPy 数组运算。
+ASCII STL 逐个解析顶点坐标, 仅用于小模型。
+
+STL 没有单位, 坐标按 config.STL_UNIT_MM 换算为毫米。
+
+用法:
+    python -m src.mesh 零件.stl [--material 316L不锈钢]
+"""
+
+import mmap
+import os
+import re
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from .config import STL_UNIT_MM
+
+
+# ============================================================
+# 文件格式
+# ============================================================
+
+# 二进制 STL: 80字节文件头 + uint32 三角面数 + 每个三角面50字节
+HEADER_SIZE = 84
+RECORD_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+])
+
+# 每块计算的三角面数: 中间数组保持在 CPU 缓存内
+# (每面9个 float64 坐标 + 若干同长度的临时列, 约 1MB/块)
+CHUNK_TRIANGLES = 1 << 14
+
+# ASCII STL 顶点行: vertex x y z
+_ASCII_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+MeshProperties = namedtuple(
+    'MeshProperties',
+    ['triangle_count', 'volume_mm3', 'surface_area_mm2', 'bbox_min', 'bbox_max']
+)
+MeshProperties.__doc__ = """
+STL 模型几何属性 (单位: 毫米)
+
+字段:
+    triangle_count: 三角面数
+    volume_mm3: 体积 (mm³), 取有向体积的绝对值, 与三角面朝向无关
+    surface_area_mm2: 表面积 (mm²)
+    bbox_min: 包围盒最小角 (x, y, z)
+    bbox_max: 包围盒最大角 (x, y, z)
+"""
+
+
+def _binary_triangle_count(buffer, size):
+    """
+    按文件大小判断是否为二进制 STL
+    
+    部分二进制文件头也以 "solid" 开头, 因此以文件头记录的面数
+    与文件大小是否吻合为准。
+    
+    Returns:
+        int: 三角面数, 不是二进制 STL 时返回 None
+    """
+    if size < HEADER_SIZE:
+        return None
+    count = int(np.frombuffer(buffer, dtype='<u4', count=1, offset=80)[0])
+    if HEADER_SIZE + count * RECORD_DTYPE.itemsize == size:
+        return count
+    return None
+
+
+def _ascii_triangles(buffer):
+    """
+    解析 ASCII STL 的顶点坐标
+    
+    Returns:
+        np.ndarray: (三角面数, 3, 3) 的 float64 数组
+    """
+    coords = _ASCII_VERTEX.findall(buffer)
+    if len(coords) % 3:
+        raise ValueError(f"顶点数 {len(coords)} 不是3的倍数, 文件可能已损坏")
+    try:
+        return np.array(coords, dtype='S').astype(np.float64).reshape(-1, 3, 3)
+    except ValueError:
+        raise ValueError("顶点坐标不是有效的数字") from None
+
+
+# ============================================================
+# 几何计算
+# ============================================================
+
+def mesh_properties(triangles, unit_mm=None) -> MeshProperties:
+    """
+    计算三角网格的体积、表面积和包围盒
+    
+    对每个三角面 (v0, v1, v2), 以 c = (v1 - v0) × (v2 - v0) 计算:
+        面积 = |c| / 2
+        有向四面体体积 (以原点为顶点) = v0 · c / 6 (= v0 · (v1 × v2) / 6)
+    闭合网格的有向体积之和即为模型体积。
+    
+    按 CHUNK_TRIANGLES 分块, 每块转置为 9 列连续的 float64 坐标
+    (x0, y0, z0, x1, ..., z2) 后逐列运算: 二进制记录中坐标按 50 字节
+    交错存放, 直接在交错布局上求最值和叉积会慢数倍。
+    
+    Args:
+        triangles: (三角面数, 3, 3) 数组, 可以是内存映射上的只读视图
+        unit_mm: 坐标单位 (毫米), 默认 config.STL_UNIT_MM
+    
+    Returns:
+        MeshProperties: 几何属性
+    """
+    unit = STL_UNIT_MM if unit_mm is None else unit_mm
+    count = len(triangles)
+    if count == 0:
+        raise ValueError("模型不包含三角面")
+    
+    volume = 0.0
+    area = 0.0
+    lower = np.full(3, np.inf)
+    upper = np.full(3, -np.inf)
+    for start in range(0, count, CHUNK_TRIANGLES):
+        chunk = triangles[start:start + CHUNK_TRIANGLES].reshape(-1, 9)
+        columns = np.array(chunk.T, dtype=np.float64, order='C')
+        lower = np.minimum(lower, columns.min(axis=1).reshape(3, 3).min(axis=0))
+        upper = np.maximum(upper, columns.max(axis=1).reshape(3, 3).max(axis=0))
+        
+        x0, y0, z0, x1, y1, z1, x2, y2, z2 = columns
+        ax, ay, az = x1 - x0, y1 - y0, z1 - z0
+        bx, by, bz = x2 - x0, y2 - y0, z2 - z0
+        cx = ay * bz - az * by
+        cy = az * bx - ax * bz
+        cz = ax * by - ay * bx
+        
+        volume += float((x0 * cx + y0 * cy + z0 * cz).sum())
+        area += float(np.sqrt(cx * cx + cy * cy + cz * cz).sum())
+    
+    if not (np.isfinite(lower).all() and np.isfinite(upper).all()):
+        raise ValueError("顶点坐标包含无效数值 (NaN/Inf)")
+    
+    return MeshProperties(
+        triangle_count=count,
+        volume_mm3=abs(volume) / 6 * unit ** 3,
+        surface_area_mm2=area / 2 * unit ** 2,
+        bbox_min=tuple(float(v) * unit for v in lower),
+        bbox_max=tuple(float(v) * unit for v in upper),
+    )
+
+
+def load_mesh(path, unit_mm=None) -> MeshProperties:
+    """
+    读取 STL 文件并计算几何属性
+    
+    二进制 STL 在内存映射上用 np.frombuffer 按 RECORD_DTYPE 解释,
+    坐标直接取自映射的页面, 不读入或复制整个文件。
+    
+    Args:
+        path: STL 文件路径 (二进制或 ASCII)
+        unit_mm: 坐标单位 (毫米), 默认 config.STL_UNIT_MM
+    
+    Returns:
+        MeshProperties: 几何属性
+    
+    Raises:
+        ValueError: 文件为空、格式无法识别或模型不包含三角面
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        raise ValueError("STL 文件为空")
+    
+    # 映射由其上的数组视图持有, 视图释放后随之关闭 (同 np.memmap);
+    # 不显式关闭, 计算出错时异常回溯仍引用视图也不会导致关闭失败
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    count = _binary_triangle_count(buffer, size)
+    if count is not None:
+        records = np.frombuffer(buffer, dtype=RECORD_DTYPE, count=count,
+                                offset=HEADER_SIZE)
+        return mesh_properties(records['vertices'], unit_mm)
+    
+    if not buffer[:HEADER_SIZE].lstrip().startswith(b'solid'):
+        raise ValueError("无法识别的 STL 文件 (文件大小与三角面数不符)")
+    return mesh_properties(_ascii_triangles(buffer[:]), unit_mm)
+
+
+def weight_from_volume(volume_mm3: float, density: float) -> float:
+    """
+    由体积和材料密度换算重量
+    
+    Args:
+        volume_mm3: 体积 (mm³)
+        density: 密度 (g/cm³)
+    
+    Returns:
+        float: 重量 (克)
+    """
+    return volume_mm3 / 1000 * density
+
+
+# ============================================================
+# 命令行
+# ============================================================
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    import time
+    
+    parser = argparse.ArgumentParser(description="计算 STL 模型的体积、重量并报价")
+    parser.add_argument('path', help="STL 文件路径")
+    parser.add_argument('--material', help="材料名称, 指定时按密度换算重量并报价")
+    parser.add_argument('--unit-mm', type=float, default=None,
+                        help=f"坐标单位 (毫米), 默认 {STL_UNIT_MM}")
+    args = parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    try:
+        mesh = load_mesh(args.path, args.unit_mm)
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    
+    size = [hi - lo for lo, hi in zip(mesh.bbox_min, mesh.bbox_max)]
+    print(f"三角面数: {mesh.triangle_count:,}  (耗时 {elapsed:.3f}s)")
+    print(f"体积: {mesh.volume_mm3 / 1000:,.3f} cm³")
+    print(f"表面积: {mesh.surface_area_mm2 / 100:,.2f} cm²")
+    print(f"包围盒: {size[0]:.2f} × {size[1]:.2f} × {size[2]:.2f} mm")
+    
+    if args.material:
+        from .database import init_db, close_db
+        from .services import QuoteService
+        
+        init_db()
+        try:
+            result = QuoteService.calculate_mesh_quote(mesh, args.material)
+        except ValueError as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            return 1
+        finally:
+            close_db()
+        print(f"重量: {result['weight_g']:,.2f} g ({args.material}, "
+              f"{result['density']} g/cm³)")
+        print(f"预估时长: {result['time_formatted']}")
+        print(f"报价: {QuoteService.format_quote(result['total_quote'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - SQL查询统计
+==============================
+按逻辑操作 (如 quote.recalc / data.submit / page.show:data) 统计
+SQL查询次数、总耗时和最慢语句, 用于定位一次按键或页面切换
+触发了多少查询。
+
+用法:
+    with track_operation("data.submit"):
+        add_work_order(...)
+    
+    with assert_max_queries(1, "quote.recalc"):
+        QuoteService.calculate_quote("TC4钛合金", 100)
+    
+    get_query_stats()   # {操作名: {calls, queries, total_ms, ...}}
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# 不在任何操作中执行的查询归入此分组
+UNTRACKED = "(untracked)"
+
+# 断言失败时最多列出的语句条数
+MAX_LISTED_STATEMENTS = 20
+
+
+class _Scope:
+    """一次正在执行的操作 (或查询计数断言) 的计数"""
+    
+    __slots__ = ('name', 'queries', 'total_time', 'statements')
+    
+    def __init__(self, name, keep_statements=False):
+        self.name = name
+        self.queries = 0
+        self.total_time = 0.0
+        self.statements = [] if keep_statements else None
+
+
+class OperationStats:
+    """单个逻辑操作的累计统计"""
+    
+    __slots__ = ('calls', 'queries', 'total_time', 'slowest_time', 'slowest_sql')
+    
+    def __init__(self):
+        self.calls = 0
+        self.queries = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+    
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'queries': self.queries,
+            'queries_per_call': self.queries / self.calls if self.calls else None,
+            'total_ms': self.total_time * 1000,
+            'slowest_ms': self.slowest_time * 1000,
+            'slowest_sql': self.slowest_sql,
+        }
+
+
+# 当前上下文中正在执行的操作栈 (线程 / asyncio 任务各自独立)
+_active_scopes = ContextVar('query_scopes', default=())
+
+_lock = threading.Lock()
+_stats = {}
+_last_operation = None  # 最近一次完成的操作: (名称, 查询数, 耗时秒)
+
+
+def record_query(sql, seconds):
+    """
+    记录一条已执行的SQL (由数据库层在每次执行后调用)
+    
+    归入最内层的操作; 外层操作和查询计数断言也会累计次数。
+    """
+    scopes = _active_scopes.get()
+    for scope in scopes:
+        scope.queries += 1
+        scope.total_time += seconds
+        if scope.statements is not None and len(scope.statements) < MAX_LISTED_STATEMENTS:
+            scope.statements.append(sql)
+    
+    name = scopes[-1].name if scopes else UNTRACKED
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = OperationStats()
+        stats.queries += 1
+        stats.total_time += seconds
+        if seconds >= stats.slowest_time:
+            stats.slowest_time = seconds
+            stats.slowest_sql = sql
+
+
+@contextmanager
+def track_operation(name):
+    """
+    将 with 块 (或被装饰的函数) 内的查询归入逻辑操作 name
+    
+    可以嵌套, 查询归入最内层的操作。
+    """
+    global _last_operation
+    scope = _Scope(name)
+    token = _active_scopes.set(_active_scopes.get() + (scope,))
+    try:
+        yield scope
+    finally:
+        _active_scopes.reset(token)
+        with _lock:
+            stats = _stats.get(name)
+            if stats is None:
+                stats = _stats[name] = OperationStats()
+            stats.calls += 1
+            _last_operation = (name, scope.queries, scope.total_time)
+
+
+@contextmanager
+def assert_max_queries(limit, operation=None):
+    """
+    断言 with 块内执行的查询不超过 limit 条
+    
+    Args:
+        limit: 查询条数上限
+        operation: 同时以该名称记录为逻辑操作, 可选
+    
+    Raises:
+        AssertionError: 超出上限时, 消息中列出执行过的语句
+    """
+    scope = _Scope(operation or "assert_max_queries", keep_statements=True)
+    token = _active_scopes.set(_active_scopes.get() + (scope,))
+    try:
+        if operation:
+            with track_operation(operation):
+                yield scope
+        else:
+            yield scope
+    finally:
+        _active_scopes.reset(token)
+    
+    if scope.queries > limit:
+        listed = "\n".join(f"  {sql}" for sql in scope.statements)
+        raise AssertionError(
+            f"{scope.name}: 执行了 {scope.queries} 条查询, 上限 {limit}\n{listed}"
+        )
+
+
+def get_query_stats() -> dict:
+    """
+    获取各逻辑操作的累计统计
+    
+    Returns:
+        dict: {操作名: {calls, queries, queries_per_call, total_ms,
+                         slowest_ms, slowest_sql}}
+    """
+    with _lock:
+        return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def get_last_operation():
+    """
+    获取最近一次完成的操作
+    
+    Returns:
+        tuple: (操作名, 查询数, 耗时毫秒), 尚无记录时为None
+    """
+    last = _last_operation
+    if last is None:
+        return None
+    return last[0], last[1], last[2] * 1000
+
+
+def reset_query_stats():
+    """清空全部统计"""
+    global _last_operation
+    with _lock:
+        _stats.clear()
+        _last_operation = None
+
+
+def timed_query(func, sql):
+    """执行 func() 并将其记为一条查询 sql (用于绕过 execute_sql 的批量执行)"""
+    start = time.perf_counter()
+    try:
+        return func()
+    finally:
+        record_query(sql, time.perf_counter() - start)
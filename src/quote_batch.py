@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 批量报价 (无界面)
+==================================
+从 CSV / XLSX / JSON Lines 文件读取零件清单, 多进程批量报价,
+按块流式写出 CSV 或 JSON Lines 结果。
+
+报价快照只从数据库构建一次, 在工作进程启动时传入,
+工作进程不连接数据库。
+
+用法:
+    python -m src.quote_batch 零件.csv -o 报价.csv [--workers 4] [--chunk-size 5000]
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .importer import read_rows, read_header, _build_column_map, _parse_float, _chunks
+from .services import PricingCache, PricingSnapshot
+
+
+# ============================================================
+# 列名映射
+# ============================================================
+
+# 标准字段 -> 可识别的表头 (不区分大小写, 忽略首尾空格)
+COLUMN_ALIASES = {
+    'id': ('id', 'part_id', 'part', 'rfq', '编号', '零件编号', '询价单号'),
+    'material_name': ('material_name', 'material', '材料', '材质', '打印材质'),
+    'weight_g': ('weight_g', 'weight', '重量', '重量(g)', '重量(克)', '预估重量'),
+    'difficulty': ('difficulty', '难度', '难度系数'),
+    'risk': ('risk', '风险', '风险系数'),
+    'post_process_hours': ('post_process_hours', '后处理时长', '后处理时长(小时)'),
+    'post_process_rate': ('post_process_rate', '后处理单价', '后处理单价(元/小时)'),
+}
+
+# 输出字段 (id 仅在输入含编号列时输出)
+OUTPUT_FIELDS = (
+    'id', 'material_name', 'weight_g',
+    'total_quote', 'total_quote_low', 'total_quote_high',
+    'print_price', 'base_print_price', 'post_process_price',
+    'coefficient', 'difficulty', 'risk', 'time_min', 'time_formatted',
+    'efficiency', 'efficiency_source', 'cost_per_min', 'order_count',
+    'post_process_hours', 'post_process_rate',
+)
+
+# 报告中最多保留的错误明细条数
+MAX_ERROR_DETAILS = 100
+
+
+class BatchReport:
+    """
+    批量报价结果报告
+    
+    字段:
+        rows_read: 读取的数据行数
+        rows_quoted: 成功报价的行数
+        rows_rejected: 校验失败被跳过的行数
+        errors: 错误明细 [(行号, 原因)], 最多保留 MAX_ERROR_DETAILS 条
+        elapsed: 耗时 (秒)
+    """
+    
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_quoted = 0
+        self.rows_rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+    
+    @property
+    def rows_per_second(self) -> float:
+        """报价速度 (行/秒)"""
+        if self.elapsed > 0:
+            return self.rows_quoted / self.elapsed
+        return 0.0
+    
+    def reject(self, line_no, reason):
+        """记录一条被拒绝的行"""
+        self.rows_rejected += 1
+        if len(self.errors) < MAX_ERROR_DETAILS:
+            self.errors.append((line_no, reason))
+    
+    def __str__(self):
+        return (f"读取 {self.rows_read} 行 | 报价 {self.rows_quoted} 条 | "
+                f"跳过 {self.rows_rejected} 行 | 耗时 {self.elapsed:.2f}s | "
+                f"{self.rows_per_second:,.0f} 行/秒")
+
+
+# ============================================================
+# 流水线: 读取与校验
+# ============================================================
+
+def read_parts(path):
+    """
+    逐行读取零件清单 (.jsonl / .ndjson 为 JSON Lines, 其余同 importer.read_rows)
+    
+    Yields:
+        tuple: (行号, {表头: 原始值}); JSON Lines 中不是有效 JSON 对象的行
+               为 (行号, None), 由校验环节报告
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.jsonl', '.ndjson'):
+        yield from read_rows(path)
+        return
+    
+    with open(path, encoding='utf-8-sig') as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+
+
+def read_part_columns(path):
+    """
+    读取零件清单中出现的全部列名 (用于确定输出表头)
+    
+    CSV / XLSX 只读表头; JSON Lines 每行的键可能不同,
+    需要预先扫描整个文件取并集 (逐行解析, 内存占用与行数无关)
+    
+    Returns:
+        set: 列名集合
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in ('.jsonl', '.ndjson'):
+        return set(read_header(path))
+    
+    columns = set()
+    for _, record in read_parts(path):
+        if record is not None:
+            columns.update(record)
+    return columns
+
+
+def normalize_parts(rows, material_names, report):
+    """
+    校验并归一化零件行
+    
+    材料必须存在, 重量必须大于0; 其余字段缺省时使用 calculate_quote 的默认值。
+    
+    Yields:
+        dict: 含 QuoteService.QUOTE_FIELDS 字段 (及可选 id) 的零件字典
+    """
+    column_maps = {}
+    for line_no, raw in rows:
+        report.rows_read += 1
+        if raw is None:
+            report.reject(line_no, "不是有效的JSON对象")
+            continue
+        # JSON Lines 每行的键可能不同, 按键集合缓存映射
+        keys = tuple(raw)
+        column_map = column_maps.get(keys)
+        if column_map is None:
+            column_map = column_maps[keys] = _build_column_map(keys, COLUMN_ALIASES)
+        record = {column_map[k]: v for k, v in raw.items() if k in column_map}
+        
+        try:
+            material_name = str(record.get('material_name') or "").strip()
+            if material_name not in material_names:
+                raise ValueError(f"材料 '{material_name}' 不存在")
+            
+            weight = _parse_float(record.get('weight_g'))
+            if weight is None or weight <= 0:
+                raise ValueError("重量必须大于0")
+            
+            part = {
+                'material_name': material_name,
+                'weight_g': weight,
+                'difficulty': _parse_float(record.get('difficulty')) or 1,
+                'risk': _parse_float(record.get('risk')) or 0,
+                'post_process_hours': _parse_float(record.get('post_process_hours')) or 0,
+                'post_process_rate': _parse_float(record.get('post_process_rate')),
+            }
+            if part['post_process_rate'] is None:
+                part['post_process_rate'] = 50
+            if 'id' in record:
+                part['id'] = record['id']
+        except ValueError as e:
+            report.reject(line_no, str(e))
+            continue
+        
+        yield part
+
+
+# ============================================================
+# 工作进程
+# ============================================================
+
+# 工作进程内的报价快照 (由 _init_worker 设置)
+_worker_snapshot = None
+
+
+def _init_worker(snapshot):
+    """工作进程初始化: 每个进程只接收一次快照"""
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+
+def _format_chunk(parts, quotes, output_format, fields):
+    """将一块报价结果序列化为文本 (在工作进程中完成, 减少进程间传输)"""
+    buffer = io.StringIO()
+    if output_format == 'csv':
+        writer = csv.writer(buffer, lineterminator='\n')
+        for part, quote in zip(parts, quotes):
+            writer.writerow([
+                part.get(name, "") if name in ('id', 'material_name', 'weight_g')
+                else quote[name]
+                for name in fields
+            ])
+    else:
+        for part, quote in zip(parts, quotes):
+            record = {
+                name: part.get(name) if name in ('id', 'material_name', 'weight_g')
+                else quote[name]
+                for name in fields
+            }
+            buffer.write(json.dumps(record, ensure_ascii=False))
+            buffer.write('\n')
+    return buffer.getvalue()
+
+
+def _quote_chunk(parts, output_format, fields, model=None, snapshot=None):
+    """
+    报价一块零件并序列化
+    
+    Returns:
+        tuple: (行数, 输出文本)
+    """
+    snapshot = snapshot or _worker_snapshot
+    quotes = snapshot.quotes(parts, model=model)
+    return len(parts), _format_chunk(parts, quotes, output_format, fields)
+
+
+# ============================================================
+# 批量报价
+# ============================================================
+
+def quote_file(path, out, output_format='jsonl', workers=None,
+               chunk_size=5000, snapshot=None, progress=None,
+               model=None) -> BatchReport:
+    """
+    批量报价零件清单文件, 结果按输入顺序流式写出
+    
+    同时在途的块数限制为工作进程数的2倍, 内存占用与文件行数无关。
+    
+    Args:
+        path: 零件清单路径 (CSV / XLSX / JSON Lines)
+        out: 文本输出流
+        output_format: 'csv' 或 'jsonl'
+        workers: 工作进程数, 默认CPU核数; 0 或 1 时在当前进程内计算
+        chunk_size: 每块行数
+        snapshot: 报价快照, 默认 PricingCache.get_snapshot()
+        progress: 可选回调, 每写完一块调用 progress(report)
+        model: 效率模型 ('ratio' / 'bucket' / 'linear'), 默认 QUOTE_EFFICIENCY_MODEL
+    
+    Returns:
+        BatchReport: 报价结果
+    """
+    report = BatchReport()
+    snapshot = snapshot or PricingCache.get_snapshot()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    start = time.perf_counter()
+    
+    # 输出表头由输入的列决定: 任一列可识别为编号时输出 id 列
+    has_id = 'id' in _build_column_map(read_part_columns(path), COLUMN_ALIASES).values()
+    fields = tuple(f for f in OUTPUT_FIELDS if has_id or f != 'id')
+    if output_format == 'csv':
+        csv.writer(out, lineterminator='\n').writerow(fields)
+    
+    parts = normalize_parts(
+        read_parts(path), set(snapshot.material_names), report
+    )
+    chunks = _chunks(parts, chunk_size)
+    
+    def write(result):
+        count, text = result
+        out.write(text)
+        report.rows_quoted += count
+        report.elapsed = time.perf_counter() - start
+        if progress:
+            progress(report)
+    
+    if workers <= 1:
+        for chunk in chunks:
+            write(_quote_chunk(chunk, output_format, fields, model, snapshot))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(snapshot,)) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(
+                    _quote_chunk, chunk, output_format, fields, model))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+    
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    from .database import init_db, close_db
+    
+    parser = argparse.ArgumentParser(description="批量报价零件清单 (CSV / XLSX / JSON Lines)")
+    parser.add_argument('path', help="零件清单路径")
+    parser.add_argument('-o', '--output', default='-',
+                        help="输出文件, 默认标准输出")
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help="输出格式, 默认按输出文件扩展名 (标准输出为 jsonl)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="工作进程数 (默认CPU核数, 0 表示不使用进程池)")
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help="每块行数 (默认 5000)")
+    parser.add_argument('--model', choices=PricingSnapshot.MODELS,
+                        help="效率模型 (默认见 config.QUOTE_EFFICIENCY_MODEL)")
+    args = parser.parse_args(argv)
+    
+    output_format = args.format
+    if output_format is None:
+        output_format = 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+    
+    # 只在构建快照时访问数据库, 之后立即关闭连接
+    init_db()
+    try:
+        snapshot = PricingCache.get_snapshot()
+    finally:
+        close_db()
+    
+    if args.output == '-':
+        out = sys.stdout
+    else:
+        out = open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        report = quote_file(
+            args.path, out,
+            output_format=output_format,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            snapshot=snapshot,
+            model=args.model,
+            progress=lambda r: print(f"[QUOTE] {r}", file=sys.stderr, flush=True)
+        )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    print(f"[OK] {report}", file=sys.stderr)
+    for line_no, reason in report.errors:
+        print(f"  第{line_no}行: {reason}", file=sys.stderr)
+    if report.rows_rejected > len(report.errors):
+        print(f"  ... 其余 {report.rows_rejected - len(report.errors)} 行错误未显示",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,474 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 本地报价HTTP服务
+==================================
+基于 asyncio 的轻量 HTTP/1.1 JSON 服务 (仅标准库), 供ERP/CRM调用
+
+- 报价请求直接由内存中的报价快照计算, 不访问数据库
+- 所有数据库读写都在唯一的数据库线程中串行执行
+- 后台任务定期检查数据变化 (包括其他进程的写入) 并替换快照
+
+接口:
+    GET    /health                健康检查
+    POST   /quote                 单件报价, 参数同 QuoteService.calculate_quote
+    POST   /quotes                批量报价 {"items": [...]}
+    POST   /quote/matrix          全部设备 × 折旧年限的报价矩阵, 单件 (不指定材料时
+                                  为全部材料) 或批量 {"items": [...]}
+    GET    /efficiency            全部材料效率
+    GET    /efficiency/<材料名>   单个材料效率
+    GET    /stats                 概览统计
+    POST   /work-orders           录入工单
+    DELETE /work-orders/<工单ID>  删除工单
+
+用法:
+    python -m src.quote_server [--host 127.0.0.1] [--port 8765]
+"""
+
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from .config import (
+    QUOTE_SERVER_HOST, QUOTE_SERVER_PORT, QUOTE_SERVER_REFRESH_SECONDS
+)
+from . import database
+from .services import PricingSnapshot, QuoteService, StatisticsService
+
+
+# 请求体大小上限 (字节)
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# 单件报价接受的参数
+QUOTE_PARAMS = frozenset(
+    [name for name, _ in QuoteService.QUOTE_FIELDS]
+    + ['machine_name', 'depreciation_years', 'model']
+)
+
+# 单件报价矩阵接受的参数 (material_name 可省略, 表示全部材料)
+MATRIX_PARAMS = frozenset(name for name, _ in QuoteService.QUOTE_FIELDS)
+
+# 批量报价 / 报价矩阵的每一项接受的参数
+ITEM_PARAMS = frozenset(name for name, _ in QuoteService.QUOTE_FIELDS)
+
+HTTP_REASONS = {
+    200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """以指定状态码返回给客户端的错误"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class QuoteServer:
+    """
+    本地报价HTTP服务
+    
+    用法:
+        server = QuoteServer(port=0)      # 0 表示随机端口 (测试用)
+        await server.start()
+        ...
+        await server.close()
+    """
+    
+    def __init__(self, host=QUOTE_SERVER_HOST, port=QUOTE_SERVER_PORT,
+                 refresh_seconds=QUOTE_SERVER_REFRESH_SECONDS,
+                 db_path=None, profile=None):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口 (0 为随机端口, 启动后见 self.port)
+            refresh_seconds: 后台检查数据变化的间隔 (秒)
+            db_path: 数据库路径, 默认 get_db_path()
+            profile: 数据库连接配置, 默认 DATABASE_PROFILE
+        """
+        self.host = host
+        self.port = port
+        self.refresh_seconds = refresh_seconds
+        self.db_path = db_path
+        self.profile = profile
+        
+        # 当前报价快照, 只在事件循环线程中整体替换
+        self.snapshot = None
+        
+        # 唯一的数据库线程: 持有唯一的连接, 读写依次执行
+        self._db_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="quote-db"
+        )
+        self._sqlite_data_version = None
+        self._server = None
+        self._refresh_task = None
+    
+    # ============================================================
+    # 生命周期
+    # ============================================================
+    
+    async def start(self):
+        """连接数据库、构建首个快照并开始监听"""
+        await self._run_db(
+            database.init_db, profile=self.profile, path=self.db_path
+        )
+        self.snapshot = await self._run_db(self._load_snapshot)
+        
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    async def serve_forever(self):
+        """启动并一直运行, 直到被取消"""
+        if self._server is None:
+            await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+    
+    async def close(self):
+        """停止监听、停止刷新并关闭数据库连接"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self._run_db(database.close_db)
+        self._db_executor.shutdown(wait=True)
+    
+    # ============================================================
+    # 数据库线程
+    # ============================================================
+    
+    async def _run_db(self, func, *args, **kwargs):
+        """在数据库线程中执行 func"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._db_executor, lambda: func(*args, **kwargs)
+        )
+    
+    def _load_snapshot(self):
+        """构建报价快照 (数据库线程)"""
+        # PRAGMA data_version 在其他连接提交写入后变化
+        self._sqlite_data_version = database.db.pragma('data_version')
+        return PricingSnapshot.from_db()
+    
+    def _refresh_if_changed(self, snapshot):
+        """
+        数据有变化时重新构建快照 (数据库线程)
+        
+        Returns:
+            PricingSnapshot: 新快照, 无变化时返回None
+        """
+        if (snapshot.version == database.get_data_version()
+                and database.db.pragma('data_version') == self._sqlite_data_version):
+            return None
+        return self._load_snapshot()
+    
+    async def refresh(self):
+        """检查数据变化并在需要时替换快照"""
+        snapshot = await self._run_db(self._refresh_if_changed, self.snapshot)
+        if snapshot is not None:
+            self.snapshot = snapshot
+    
+    async def _refresh_loop(self):
+        """后台定期刷新快照"""
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # 刷新失败时继续使用旧快照
+                print(f"[SERVER] Snapshot refresh failed: {e}", file=sys.stderr)
+    
+    # ============================================================
+    # HTTP
+    # ============================================================
+    
+    async def _handle_connection(self, reader, writer):
+        """处理一个连接上的请求 (支持 keep-alive)"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                
+                lines = head.decode('latin-1').split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if version == "HTTP/1.0":
+                    keep_alive = headers.get('connection', '').lower() == 'keep-alive'
+                
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length > MAX_BODY_SIZE:
+                        raise HTTPError(413, "请求体过大")
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self._dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                    if e.status == 413:
+                        keep_alive = False
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        # NaN / Infinity 不是合法的 JSON, 不能原样输出
+        try:
+            body = json.dumps(payload, ensure_ascii=False, allow_nan=False)
+        except ValueError:
+            status = 500
+            body = json.dumps({'error': "响应包含非有限数值 (NaN/Inf)"}, ensure_ascii=False)
+        body = body.encode('utf-8')
+        writer.write(
+            (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+             f"Content-Type: application/json; charset=utf-8\r\n"
+             f"Content-Length: {len(body)}\r\n"
+             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+             f"\r\n").encode('latin-1') + body
+        )
+    
+    async def _dispatch(self, method, target, body):
+        """
+        路由请求
+        
+        Returns:
+            tuple: (状态码, JSON可序列化的响应)
+        """
+        path = unquote(target.split("?", 1)[0]).rstrip("/") or "/"
+        
+        if path == "/health" and method == "GET":
+            return 200, {'status': 'ok', 'data_version': self.snapshot.version}
+        
+        if path == "/quote" and method == "POST":
+            return 200, self._quote(self._parse_json(body))
+        
+        if path == "/quotes" and method == "POST":
+            return 200, self._quotes(self._parse_json(body))
+        
+        if path == "/quote/matrix" and method == "POST":
+            return 200, self._price_matrix(self._parse_json(body))
+        
+        if path == "/efficiency" and method == "GET":
+            return 200, {
+                name: self._efficiency_json(self.snapshot.efficiency_estimate(name))
+                for name in self.snapshot.material_names
+            }
+        
+        if path.startswith("/efficiency/") and method == "GET":
+            name = path[len("/efficiency/"):]
+            if name not in self.snapshot.material_names:
+                raise HTTPError(404, f"材料 '{name}' 不存在")
+            return 200, self._efficiency_json(self.snapshot.efficiency_estimate(name))
+        
+        if path == "/stats" and method == "GET":
+            return 200, await self._run_db(StatisticsService.get_overview_stats)
+        
+        if path == "/work-orders" and method == "POST":
+            return 201, await self._add_work_order(self._parse_json(body))
+        
+        if path.startswith("/work-orders/") and method == "DELETE":
+            try:
+                order_id = int(path[len("/work-orders/"):])
+            except ValueError:
+                raise HTTPError(404, "工单不存在")
+            return 200, await self._delete_work_order(order_id)
+        
+        raise HTTPError(404, f"未知接口: {method} {path}")
+    
+    @staticmethod
+    def _reject_constant(name):
+        """json.loads 的 parse_constant: NaN / Infinity 不是合法的 JSON"""
+        raise ValueError(f"不支持的数值 {name}")
+    
+    @staticmethod
+    def _parse_json(body):
+        try:
+            return json.loads(body or b"{}", parse_constant=QuoteServer._reject_constant)
+        except ValueError:
+            raise HTTPError(400, "请求体不是有效的JSON")
+    
+    @staticmethod
+    def _efficiency_json(estimate):
+        return {
+            'efficiency': estimate.efficiency,
+            'source': estimate.source,
+            'order_count': estimate.count,
+            'low': estimate.low,
+            'high': estimate.high,
+        }
+    
+    # ============================================================
+    # 接口实现
+    # ============================================================
+    
+    def _quote(self, params):
+        """单件报价 (事件循环线程, 纯计算)"""
+        if not isinstance(params, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        unknown = set(params) - QUOTE_PARAMS
+        if unknown:
+            raise HTTPError(400, f"未知参数: {', '.join(sorted(unknown))}")
+        if 'material_name' not in params or 'weight_g' not in params:
+            raise HTTPError(400, "缺少参数 material_name 或 weight_g")
+        try:
+            return self.snapshot.quote(**params)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+    
+    @staticmethod
+    def _check_items(items):
+        """校验批量请求的每一项 (缺失或非有限的数值由 _quote_columns 报告)"""
+        for index, item in enumerate(items, start=1):
+            if isinstance(item, dict):
+                unknown = set(item) - ITEM_PARAMS
+                if unknown:
+                    raise HTTPError(
+                        400, f"第{index}项包含未知参数: {', '.join(sorted(unknown))}"
+                    )
+            elif not isinstance(item, list):
+                raise HTTPError(400, f"第{index}项必须是JSON对象或数组")
+    
+    def _quotes(self, request):
+        """批量报价 (事件循环线程, 向量化)"""
+        if not isinstance(request, dict) or not isinstance(request.get('items'), list):
+            raise HTTPError(400, "请求体格式应为 {\"items\": [...]}")
+        self._check_items(request['items'])
+        try:
+            return {'quotes': self.snapshot.quotes(
+                request['items'],
+                machine_name=request.get('machine_name'),
+                depreciation_years=request.get('depreciation_years'),
+                model=request.get('model')
+            )}
+        except (TypeError, ValueError, KeyError) as e:
+            raise HTTPError(400, str(e))
+    
+    def _price_matrix(self, request):
+        """报价矩阵 (事件循环线程, 向量化)"""
+        if not isinstance(request, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        params = dict(request)
+        model = params.pop('model', None)
+        if 'items' in params:
+            items = params.pop('items')
+            if not isinstance(items, list) or params:
+                raise HTTPError(400, "批量请求格式应为 {\"items\": [...], \"model\": ...}")
+            self._check_items(items)
+        else:
+            unknown = set(params) - MATRIX_PARAMS
+            if unknown:
+                raise HTTPError(400, f"未知参数: {', '.join(sorted(unknown))}")
+            if 'weight_g' not in params:
+                raise HTTPError(400, "缺少参数 weight_g")
+            names = ([params.pop('material_name')] if 'material_name' in params
+                     else self.snapshot.material_names)
+            items = [dict(params, material_name=name) for name in names]
+        try:
+            matrix = self.snapshot.price_matrix(items, model=model)
+        except (TypeError, ValueError, KeyError) as e:
+            raise HTTPError(400, str(e))
+        
+        # NaN (报价区间缺失) 输出为 null
+        for key in ('total_quote', 'total_quote_low', 'total_quote_high'):
+            matrix[key] = [
+                [[None if value != value else value for value in row] for row in part]
+                for part in matrix[key].tolist()
+            ]
+        return matrix
+    
+    async def _add_work_order(self, order):
+        """录入工单 (数据库线程), 完成后立即刷新快照"""
+        if not isinstance(order, dict):
+            raise HTTPError(400, "请求体必须是JSON对象")
+        try:
+            weight_g = float(order['weight_g'])
+            time_min = float(order['time_min'])
+            if weight_g <= 0 or time_min <= 0:
+                raise ValueError("重量和时长必须大于0")
+            is_lattice = order.get('is_lattice', False)
+            if not isinstance(is_lattice, bool):
+                raise ValueError("is_lattice 必须是 true 或 false")
+            work_order = await self._run_db(
+                database.add_work_order,
+                str(order['material_name']),
+                weight_g,
+                time_min,
+                is_lattice=is_lattice,
+                note=str(order.get('note') or "")[:200],
+                machine_name=order.get('machine_name') or None
+            )
+        except KeyError as e:
+            raise HTTPError(400, f"缺少参数 {e.args[0]}")
+        except (TypeError, ValueError) as e:
+            raise HTTPError(400, str(e))
+        await self.refresh()
+        return {'id': work_order.id}
+    
+    async def _delete_work_order(self, order_id):
+        """删除工单 (数据库线程), 完成后立即刷新快照"""
+        if not await self._run_db(database.delete_work_order, order_id):
+            raise HTTPError(404, "工单不存在")
+        await self.refresh()
+        return {'deleted': order_id}
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="SLM 智能报价本地HTTP服务")
+    parser.add_argument('--host', default=QUOTE_SERVER_HOST,
+                        help=f"监听地址 (默认 {QUOTE_SERVER_HOST})")
+    parser.add_argument('--port', type=int, default=QUOTE_SERVER_PORT,
+                        help=f"监听端口 (默认 {QUOTE_SERVER_PORT})")
+    parser.add_argument('--refresh', type=float, default=QUOTE_SERVER_REFRESH_SECONDS,
+                        help="检查数据变化的间隔秒数")
+    args = parser.parse_args(argv)
+    
+    async def run():
+        server = QuoteServer(args.host, args.port, args.refresh)
+        await server.start()
+        print(f"[SERVER] Listening on http://{server.host}:{server.port}", flush=True)
+        await server.serve_forever()
+    
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,24 @@ SLM智能报价系统 - 核心业务逻辑
 包含成本计算、效率统计、报价生成等核心算法
 """
 
-from peewee import fn
-from .config import WORK_DAYS_PER_YEAR, HOURS_PER_DAY, MACHINES
+import math
+import threading
+from collections import namedtuple
+from statistics import NormalDist
+from .config import (
+    WORK_DAYS_PER_YEAR, HOURS_PER_DAY, DEPRECIATION_YEARS_OPTIONS,
+    EFFICIENCY_ESTIMATOR, EFFICIENCY_CONFIDENCE, EFFICIENCY_PRIOR_STRENGTH,
+    QUOTE_EFFICIENCY_MODEL, EFFICIENCY_BUCKET_MIN_ORDERS,
+    EFFICIENCY_OUTLIER_FILTER, EFFICIENCY_OUTLIER_THRESHOLD,
+    MACHINE_EFFICIENCY_MIN_ORDERS
+)
 from .database import (
-    Material, WorkOrder, MachineConfig,
-    get_active_machine_config, get_material_by_name
+    Material, MachineConfig,
+    get_active_machine_config, get_all_machines,
+    get_material_stats, get_all_material_stats, get_machine_stats, get_all_machine_stats,
+    get_all_weight_buckets, get_efficiency_sketch, get_all_efficiency_sketches,
+    get_data_version, decay_factor, bucket_center, efficiency_key,
+    sketch_key_value, merge_stats_rows
 )
 
 
@@ -46,15 +59,16 @@ class CostCalculator:
     @staticmethod
     def get_machine_cost_table():
         """
-        获取所有设备在不同折旧年限下的成本表
+        获取所有设备在不同折旧年限下的成本表 (设备取自设备表, 单次查询)
         
         Returns:
             dict: {设备型号: {年限: 每分钟成本}}
         """
         cost_table = {}
-        for machine_name, total_price in MACHINES.items():
+        for machine in get_all_machines():
+            machine_name, total_price = machine.name, machine.total_price
             cost_table[machine_name] = {}
-            for years in [1, 2, 3]:
+            for years in DEPRECIATION_YEARS_OPTIONS:
                 cost_per_min = CostCalculator.calculate_cost_per_minute(
                     total_price, years
                 )
@@ -64,242 +78,1673 @@ class CostCalculator:
     @staticmethod
     def get_current_cost_per_minute() -> float:
         """
-        获取当前配置下的每分钟成本
+        获取当前配置下的每分钟成本 (经由报价数据缓存)
         
         Returns:
             float: 每分钟成本，如果没有配置返回0
         """
-        config = get_active_machine_config()
-        if config:
-            return CostCalculator.calculate_cost_per_minute(
-                config.total_price,
-                config.depreciation_years
-            )
-        return 0.0
+        return PricingCache.get_cost_per_minute()
 
 
 # ============================================================
 # 效率统计服务
 # ============================================================
 
+# 材料效率估计: 效率值、来源描述、工单数及置信区间
+# 工单不足2条 (无法估计方差) 时 low / high 为 None
+EfficiencyEstimate = namedtuple(
+    'EfficiencyEstimate', ['efficiency', 'source', 'count', 'low', 'high']
+)
+
+
 class EfficiencyService:
     """
     效率统计服务
     基于历史工单数据动态计算材料打印效率
+    
+    估计方式 (estimator):
+        all_time: 全部历史工单的 总重量 / 总时长
+        recent: 按工单时间衰减加权的 总重量 / 总时长 (半衰期 EFFICIENCY_HALF_LIFE_DAYS)
+    
+    EFFICIENCY_OUTLIER_FILTER 开启时, 两种方式都只汇总效率草图中
+    正常范围内的分箱 (见 outlier_bounds)
+    
+    指定设备时按 设备+材料 → 材料 → 默认值 的顺序取效率:
+    该设备上的工单不少于 MACHINE_EFFICIENCY_MIN_ORDERS 条时使用设备-材料统计
     """
     
+    ESTIMATORS = ('all_time', 'recent')
+    
+    # 工单数不少于此值时才剔除异常工单
+    OUTLIER_MIN_ORDERS = 10
+    
+    # 对数效率的最小离散程度 (约 ±5%), 避免效率高度集中时把正常波动判为异常
+    OUTLIER_MIN_SPREAD = 0.05
+    
+    # MAD 换算为正态标准差的系数
+    MAD_SCALE = 1.4826
+    
+    # 线性时长模型至少需要的工单数
+    LINEAR_MIN_ORDERS = 3
+    
+    # 置信区间的正态分位数
+    CONFIDENCE_Z = NormalDist().inv_cdf((1 + EFFICIENCY_CONFIDENCE) / 2)
+    
     @staticmethod
-    def get_material_efficiency(material_name: str) -> tuple:
+    def get_material_efficiency(material_name: str, estimator: str = None) -> tuple:
         """
         获取指定材料的打印效率
         
         使用加权平均法计算: 总重量 / 总时长
         自动排除晶格结构的工单数据
+        总重量和总时长取自增量维护的效率聚合表
         
         Args:
             material_name: 材料名称
+            estimator: 估计方式, 默认 EFFICIENCY_ESTIMATOR
         
         Returns:
             tuple: (效率值g/min, 数据来源描述, 有效工单数)
         """
-        material = get_material_by_name(material_name)
-        if not material:
-            return 0.05, "默认值", 0
+        return tuple(
+            EfficiencyService.get_efficiency_estimate(material_name, estimator)[:3]
+        )
+    
+    @staticmethod
+    def get_efficiency_estimate(material_name: str, estimator: str = None,
+                                machine_name: str = None) -> EfficiencyEstimate:
+        """
+        获取指定材料的效率及其置信区间 (单次查询, 不扫描工单表)
+        
+        Args:
+            material_name: 材料名称
+            estimator: 估计方式, 默认 EFFICIENCY_ESTIMATOR
+            machine_name: 设备型号, 可选; 该设备上的工单足够时使用设备-材料效率
+        
+        Returns:
+            EfficiencyEstimate: (效率, 来源, 工单数, 区间下限, 区间上限)
+        """
+        estimator = EfficiencyService._check_estimator(estimator)
+        
+        # 单次查询读取效率聚合表 (工单增删时已同步维护)
+        stats = get_material_stats(material_name)
+        if not stats:
+            return EfficiencyEstimate(0.05, "默认值", 0, None, None)
         
-        # 查询该材料的有效工单 (排除晶格结构)
-        valid_orders = (WorkOrder
-                       .select()
-                       .where(
-                           (WorkOrder.material == material) &
-                           (WorkOrder.is_lattice == False)
-                       ))
+        bounds = None
+        if EFFICIENCY_OUTLIER_FILTER and stats['order_count']:
+            sketch = get_efficiency_sketch(material_name)
+            bounds = EfficiencyService.outlier_bounds(sketch)
+            stats = EfficiencyService._filter_outliers(stats, sketch)
+        estimate = EfficiencyService._estimate_from_stats(stats, estimator)
+        if machine_name:
+            machine_bins = get_machine_stats(machine_name, material_name)
+            if machine_bins:
+                estimate = EfficiencyService._machine_estimate(
+                    machine_name,
+                    EfficiencyService._merge_machine_bins(machine_bins, bounds),
+                    estimate, estimator
+                ) or estimate
+        return estimate
+    
+    @staticmethod
+    def _check_estimator(estimator):
+        """校验估计方式, None 时返回配置的默认值"""
+        estimator = estimator or EFFICIENCY_ESTIMATOR
+        if estimator not in EfficiencyService.ESTIMATORS:
+            raise ValueError(
+                f"未知的效率估计方式 '{estimator}', "
+                f"可选: {', '.join(EfficiencyService.ESTIMATORS)}"
+            )
+        return estimator
+    
+    @staticmethod
+    def _estimate_from_stats(stats, estimator, prior_name="预设值") -> EfficiencyEstimate:
+        """
+        由非晶格工单的聚合统计计算效率及置信区间
         
-        order_count = valid_orders.count()
+        EFFICIENCY_PRIOR_STRENGTH 为 k > 0 时, 效率向预设值收缩:
+            效率 = (n · 历史效率 + k · 预设效率) / (n + k)
         
-        if order_count == 0:
+        Args:
+            stats: 含 default_efficiency 及聚合表各列的字典
+            estimator: 估计方式
+            prior_name: 收缩目标在来源描述中的名称
+        """
+        default_efficiency = stats['default_efficiency']
+        order_count = stats['order_count']
+        preset = EfficiencyEstimate(default_efficiency, "预设值", 0, None, None)
+        if not order_count:
             # 没有历史数据，返回预设效率
-            return material.default_efficiency, "预设值", 0
+            return preset
         
-        # 使用聚合查询计算总重量和总时长
-        stats = (WorkOrder
-                .select(
-                    fn.SUM(WorkOrder.weight_g).alias('total_weight'),
-                    fn.SUM(WorkOrder.time_min).alias('total_time')
-                )
-                .where(
-                    (WorkOrder.material == material) &
-                    (WorkOrder.is_lattice == False)
-                )
-                .dicts()
-                .first())
+        std_error = EfficiencyService._ratio_std_error(stats)
+        if estimator == 'recent':
+            total_weight = stats['decayed_weight'] or 0
+            total_time = stats['decayed_time'] or 0
+            # 衰减权重折算到当前时间的有效工单数
+            effective = min(order_count, (stats['decayed_count'] or 0) / decay_factor())
+            source = (f"基于{order_count}条历史数据, "
+                      f"近期加权约{effective:.1f}条")
+            # 标准误沿用全部工单的估计, 按有效工单数放大
+            if std_error is not None and effective > 0:
+                std_error *= math.sqrt(order_count / effective)
+        else:
+            total_weight = stats['total_weight'] or 0
+            total_time = stats['total_time'] or 0
+            effective = order_count
+            source = f"基于{order_count}条历史数据"
+        
+        if stats.get('outlier_count'):
+            source += f", 已排除{stats['outlier_count']}条异常"
+        
+        if total_time <= 0:
+            return preset
+        
+        efficiency = total_weight / total_time
+        if EFFICIENCY_PRIOR_STRENGTH > 0:
+            share = effective / (effective + EFFICIENCY_PRIOR_STRENGTH)
+            efficiency = share * efficiency + (1 - share) * default_efficiency
+            if std_error is not None:
+                std_error *= share
+            source += f", 向{prior_name}收缩{1 - share:.0%}"
+        
+        if std_error is None:
+            return EfficiencyEstimate(efficiency, source, order_count, None, None)
+        margin = EfficiencyService.CONFIDENCE_Z * std_error
+        return EfficiencyEstimate(
+            efficiency, source, order_count,
+            max(efficiency - margin, 0.0), efficiency + margin
+        )
+    
+    @staticmethod
+    def _ratio_std_error(stats):
+        """
+        比率估计 总重量 / 总时长 的标准误 (由离差平方和直接计算)
+        
+        方差 ≈ (M2_w - 2R·C_wt + R²·M2_t) / (n - 1) / (n · 平均时长²)
         
-        total_weight = stats['total_weight'] or 0
+        Returns:
+            float: 标准误, 工单不足2条时为 None
+        """
+        order_count = stats['order_count']
         total_time = stats['total_time'] or 0
+        if order_count < 2 or total_time <= 0:
+            return None
+        
+        ratio = (stats['total_weight'] or 0) / total_time
+        mean_time = total_time / order_count
+        residual = (stats['m2_weight']
+                    - 2 * ratio * stats['c_weight_time']
+                    + ratio * ratio * stats['m2_time'])
+        variance = max(residual, 0.0) / (order_count - 1) / (order_count * mean_time ** 2)
+        return math.sqrt(variance)
+    
+    @staticmethod
+    def _machine_estimate(machine_name, stats, material_estimate, estimator):
+        """
+        由设备-材料聚合统计计算该设备上的效率, 以材料整体效率作为收缩目标
+        
+        Returns:
+            EfficiencyEstimate: 工单不足 MACHINE_EFFICIENCY_MIN_ORDERS 条时为 None
+        """
+        if (stats['order_count'] or 0) < MACHINE_EFFICIENCY_MIN_ORDERS:
+            return None
+        estimate = EfficiencyService._estimate_from_stats(
+            dict(stats, default_efficiency=material_estimate.efficiency),
+            estimator, prior_name="材料整体效率"
+        )
+        return estimate._replace(source=f"{machine_name}: {estimate.source}")
+    
+    @staticmethod
+    def _merge_machine_bins(bins, bounds):
+        """
+        合并设备-材料统计中材料正常效率范围内的分箱
+        
+        与材料整体效率剔除相同的异常工单 (范围由材料的效率草图决定,
+        单台设备的工单通常不足以单独判定)
+        
+        Args:
+            bins: 设备-材料分箱统计 [{key, STATS_FIELDS 各列}]
+            bounds: 材料的 outlier_bounds() 结果, None 表示不剔除
         
-        if total_time > 0:
-            efficiency = total_weight / total_time
-            return efficiency, f"基于{order_count}条历史数据", order_count
+        Returns:
+            dict: {STATS_FIELDS 各列}, 有剔除时含 outlier_count
+        """
+        if bounds is None:
+            return merge_stats_rows(bins)
+        inliers = [row for row in bins
+                   if bounds[0] <= sketch_key_value(row['key']) <= bounds[1]]
+        merged = merge_stats_rows(inliers)
+        outlier_count = sum(row['order_count'] for row in bins) - merged['order_count']
+        if outlier_count:
+            merged['outlier_count'] = outlier_count
+        return merged
+    
+    @staticmethod
+    def get_all_machine_efficiency_estimates(estimator: str = None,
+                                             material_estimates=None,
+                                             bounds=None) -> dict:
+        """
+        获取所有 (设备, 材料) 的效率及置信区间 (单次查询)
+        
+        Args:
+            estimator: 估计方式, 默认 EFFICIENCY_ESTIMATOR
+            material_estimates: get_all_efficiency_estimates() 的结果, 默认重新查询
+            bounds: get_outlier_bounds() 的结果, 默认重新查询
+        
+        Returns:
+            dict: {(设备型号, 材料名): EfficiencyEstimate},
+                  工单不足 MACHINE_EFFICIENCY_MIN_ORDERS 条的组合不在结果中
+        """
+        estimator = EfficiencyService._check_estimator(estimator)
+        if material_estimates is None:
+            material_estimates = EfficiencyService.get_all_efficiency_estimates(estimator)
+        if bounds is None:
+            bounds = EfficiencyService.get_outlier_bounds()
         
-        return material.default_efficiency, "预设值", 0
+        # 按 (设备, 材料) 归并分箱, 查询结果已按设备和材料排序
+        groups = {}
+        for row in get_all_machine_stats():
+            groups.setdefault((row['machine'], row['name']), []).append(row)
+        
+        result = {}
+        for (machine_name, material_name), bins in groups.items():
+            material_estimate = material_estimates.get(material_name)
+            if material_estimate is None:
+                continue
+            estimate = EfficiencyService._machine_estimate(
+                machine_name,
+                EfficiencyService._merge_machine_bins(bins, bounds.get(material_name)),
+                material_estimate, estimator
+            )
+            if estimate is not None:
+                result[(machine_name, material_name)] = estimate
+        return result
     
     @staticmethod
-    def get_all_materials_efficiency() -> dict:
+    def get_all_materials_efficiency(estimator: str = None) -> dict:
         """
         获取所有材料的效率统计
         
+        单次聚合查询, 查询次数与材料数量无关
+        
+        Args:
+            estimator: 估计方式, 默认 EFFICIENCY_ESTIMATOR
+        
         Returns:
             dict: {材料名: (效率, 来源, 工单数)}
         """
-        from .database import get_all_materials
+        return {
+            name: tuple(estimate[:3])
+            for name, estimate in
+            EfficiencyService.get_all_efficiency_estimates(estimator).items()
+        }
+    
+    @staticmethod
+    def get_all_efficiency_estimates(estimator: str = None, stats_rows=None) -> dict:
+        """
+        获取所有材料的效率及置信区间 (单次聚合查询)
+        
+        Args:
+            estimator: 估计方式, 默认 EFFICIENCY_ESTIMATOR
+            stats_rows: get_all_filtered_stats() 的结果, 默认重新查询
+        
+        Returns:
+            dict: {材料名: EfficiencyEstimate}
+        """
+        estimator = EfficiencyService._check_estimator(estimator)
+        if stats_rows is None:
+            stats_rows = EfficiencyService.get_all_filtered_stats()
         
         result = {}
-        for material in get_all_materials():
-            result[material.name] = EfficiencyService.get_material_efficiency(
-                material.name
-            )
+        for stats in stats_rows:
+            if stats['is_lattice']:
+                result.setdefault(stats['name'], EfficiencyEstimate(
+                    stats['default_efficiency'], "预设值", 0, None, None
+                ))
+            else:
+                result[stats['name']] = EfficiencyService._estimate_from_stats(
+                    stats, estimator
+                )
         return result
-
-
-# ============================================================
-# 报价服务
-# ============================================================
-
-class QuoteService:
-    """
-    报价服务
-    整合成本和效率计算，生成最终报价
-    """
     
     @staticmethod
-    def calculate_quote(
-        material_name: str,
-        weight_g: float,
-        difficulty: int = 1,
-        risk: float = 0,
-        post_process_hours: float = 0,
-        post_process_rate: float = 50
-    ) -> dict:
+    def get_all_filtered_stats(sketches=None) -> list:
         """
-        计算报价 (v2.2 新版算法)
+        获取所有材料的聚合统计, 非晶格统计已剔除异常工单
         
-        公式:
-            基准打印价格 = (重量 / 效率) × 每分钟成本
-            打印价格 = 基准打印价格 × (难度系数 + 风险系数)
-            后处理价格 = 后处理时长 × 后处理单价
-            最终报价 = 打印价格 + 后处理价格
+        Args:
+            sketches: get_all_efficiency_sketches() 的结果, 默认按需查询
+        
+        Returns:
+            list: get_all_material_stats() 的行, 开启 EFFICIENCY_OUTLIER_FILTER 时
+                  非晶格行替换为 _filter_outliers 的结果
+        """
+        if not EFFICIENCY_OUTLIER_FILTER:
+            sketches = {}
+        elif sketches is None:
+            sketches = get_all_efficiency_sketches()
+        return [
+            EfficiencyService._filter_outliers(stats, sketches[stats['name']])
+            if stats['name'] in sketches and not stats['is_lattice'] else stats
+            for stats in get_all_material_stats()
+        ]
+    
+    # ============================================================
+    # 异常工单剔除 (基于效率草图)
+    # ============================================================
+    
+    @staticmethod
+    def outlier_bounds(sketch):
+        """
+        由效率草图计算正常效率范围
+        
+        在对数效率上取中位数 m 和 MAD, 范围为
+            exp(m ± EFFICIENCY_OUTLIER_THRESHOLD × 1.4826 × MAD)
+        草图分箱数与工单数无关, 计算量也与工单数无关。
         
         Args:
-            material_name: 材料名称
-            weight_g: 预估重量 (克)
-            difficulty: 难度系数 (1/2/3)
-            risk: 风险系数 (0/0.5/1/1.5/2)
-            post_process_hours: 后处理时长 (小时)
-            post_process_rate: 后处理单价 (元/小时)
+            sketch: 效率草图分箱 [{key, order_count, ...}], 按分箱编号排序
         
         Returns:
-            dict: 包含各项价格明细的字典
+            tuple: (效率下限, 效率上限) g/min, 工单不足 OUTLIER_MIN_ORDERS 条时为 None
         """
-        # 获取每分钟成本
-        cost_per_min = CostCalculator.get_current_cost_per_minute()
+        total = sum(row['order_count'] for row in sketch)
+        if total < EfficiencyService.OUTLIER_MIN_ORDERS:
+            return None
         
-        # 获取材料效率
-        efficiency, source, order_count = EfficiencyService.get_material_efficiency(
-            material_name
-        )
+        values = [(math.log(sketch_key_value(row['key'])), row['order_count'])
+                  for row in sketch]
+        median = EfficiencyService._weighted_median(values, total)
+        deviations = sorted((abs(value - median), count) for value, count in values)
+        mad = EfficiencyService._weighted_median(deviations, total)
         
-        # 计算预估打印时长 (分钟)
-        if efficiency > 0:
-            time_min = weight_g / efficiency
-        else:
-            time_min = 0
+        spread = max(EfficiencyService.MAD_SCALE * mad, EfficiencyService.OUTLIER_MIN_SPREAD)
+        margin = EFFICIENCY_OUTLIER_THRESHOLD * spread
+        return math.exp(median - margin), math.exp(median + margin)
+    
+    @staticmethod
+    def _weighted_median(values, total):
+        """按值排序的 [(值, 次数)] 的中位数"""
+        half = total / 2
+        cumulative = 0
+        for value, count in values:
+            cumulative += count
+            if cumulative >= half:
+                return value
+        return values[-1][0]
+    
+    @staticmethod
+    def is_outlier(bounds, weight_g, time_min) -> bool:
+        """
+        判断单条工单是否超出正常效率范围 (与草图按分箱判定的结果一致)
         
-        # 计算基准打印价格
-        base_print_price = time_min * cost_per_min
+        Args:
+            bounds: outlier_bounds() 的结果, None 表示不剔除
+        """
+        key = efficiency_key(weight_g, time_min)
+        if bounds is None or key is None:
+            return False
+        value = sketch_key_value(key)
+        return not bounds[0] <= value <= bounds[1]
+    
+    @staticmethod
+    def _filter_outliers(stats, sketch):
+        """
+        用草图中正常范围内的分箱重新汇总非晶格统计
         
-        # 计算系数加成
-        coefficient = difficulty + risk
+        Returns:
+            dict: 替换了统计列的 stats 副本, outlier_count 为剔除的工单数
+        """
+        bounds = EfficiencyService.outlier_bounds(sketch)
+        if bounds is None:
+            return stats
         
-        # 计算打印价格 (含系数)
-        print_price = base_print_price * coefficient
+        inliers = [row for row in sketch
+                   if bounds[0] <= sketch_key_value(row['key']) <= bounds[1]]
+        outlier_count = sum(row['order_count'] for row in sketch) - sum(
+            row['order_count'] for row in inliers
+        )
+        if not outlier_count:
+            return stats
+        return dict(stats, **merge_stats_rows(inliers), outlier_count=outlier_count)
+    
+    @staticmethod
+    def get_outlier_bounds(sketches=None) -> dict:
+        """
+        获取各材料的正常效率范围 (单次查询)
         
-        # 计算后处理价格
-        post_process_price = post_process_hours * post_process_rate
+        Args:
+            sketches: get_all_efficiency_sketches() 的结果, 默认重新查询
         
-        # 计算最终总报价
-        total_quote = print_price + post_process_price
+        Returns:
+            dict: {材料名: (效率下限, 效率上限)}, 未开启剔除或工单不足的材料不在结果中
+        """
+        if not EFFICIENCY_OUTLIER_FILTER:
+            return {}
+        if sketches is None:
+            sketches = get_all_efficiency_sketches()
+        result = {}
+        for name, sketch in sketches.items():
+            bounds = EfficiencyService.outlier_bounds(sketch)
+            if bounds is not None:
+                result[name] = bounds
+        return result
+    
+    # ============================================================
+    # 重量分段效率
+    # ============================================================
+    
+    @staticmethod
+    def get_all_weight_curves(bounds=None) -> dict:
+        """
+        获取所有材料按重量分段的效率曲线 (单次查询)
         
-        # 格式化时长
-        hours = int(time_min // 60)
-        minutes = int(time_min % 60)
-        if hours > 0:
-            time_formatted = f"{hours}小时{minutes}分钟"
-        else:
-            time_formatted = f"{minutes}分钟"
+        各分段只汇总正常效率范围内的效率分箱 (与整体效率剔除相同的异常工单),
+        只保留剔除后工单数不少于 EFFICIENCY_BUCKET_MIN_ORDERS 的分段,
+        没有可用分段的材料不在结果中
+        
+        Args:
+            bounds: get_outlier_bounds() 的结果, 默认重新查询
+        
+        Returns:
+            dict: {材料名: ((各分段中心的 log2 重量, ...), (各分段效率, ...))}
+        """
+        if bounds is None:
+            bounds = EfficiencyService.get_outlier_bounds()
+        
+        # 按 (材料, 分段) 汇总正常范围内的分箱, 查询结果已按材料和分段排序
+        totals = {}
+        for name, bucket, key, count, weight, time in get_all_weight_buckets():
+            limits = bounds.get(name)
+            if limits and not limits[0] <= sketch_key_value(key) <= limits[1]:
+                continue
+            total = totals.setdefault((name, bucket), [0, 0.0, 0.0])
+            total[0] += count
+            total[1] += weight
+            total[2] += time
         
+        curves = {}
+        for (name, bucket), (count, weight, time) in totals.items():
+            if count >= EFFICIENCY_BUCKET_MIN_ORDERS and time > 0:
+                centers, values = curves.setdefault(name, ([], []))
+                centers.append(bucket_center(bucket))
+                values.append(weight / time)
         return {
-            'base_print_price': round(base_print_price, 2),
-            'print_price': round(print_price, 2),
-            'post_process_price': round(post_process_price, 2),
-            'total_quote': round(total_quote, 2),
-            'coefficient': coefficient,
-            'difficulty': difficulty,
-            'risk': risk,
-            'time_min': round(time_min, 1),
-            'time_formatted': time_formatted,
-            'efficiency': round(efficiency, 4),
-            'efficiency_source': source,
-            'cost_per_min': round(cost_per_min, 4),
-            'order_count': order_count,
-            'post_process_hours': post_process_hours,
-            'post_process_rate': post_process_rate
+            name: (tuple(centers), tuple(values))
+            for name, (centers, values) in curves.items()
         }
     
     @staticmethod
-    def format_quote(quote: float) -> str:
+    def curve_efficiency(curve, weight_g):
         """
-        格式化报价金额
+        由效率曲线求指定重量的效率
+        
+        在 log2(重量) 上对相邻两个分段的效率线性插值,
+        超出曲线范围时取最近分段的效率。分段数有上限, 与工单数量无关。
         
         Args:
-            quote: 报价金额
+            curve: get_all_weight_curves() 中的一条曲线
+            weight_g: 重量 (克), 可以是 NumPy 数组
+        """
+        import numpy as np
+        return np.interp(np.log2(weight_g), curve[0], curve[1])
+    
+    # ============================================================
+    # 线性时长模型: 时长 = 固定时长 + 单位重量时长 × 重量
+    # ============================================================
+    
+    @staticmethod
+    def linear_fit(stats):
+        """
+        由聚合统计闭式拟合 时长 = a + b × 重量 (最小二乘)
+        
+        b = C_wt / M2_w, a = 平均时长 - b × 平均重量
+        离差平方和随工单增删增量维护, 拟合计算量与工单数无关。
+        
+        Args:
+            stats: 含聚合表各列的字典 (如 get_material_stats 的结果)
         
         Returns:
-            str: 格式化后的字符串 (如: ¥12,345.00)
+            tuple: (固定时长a 分钟, 单位重量时长b 分钟/克);
+                   工单不足 LINEAR_MIN_ORDERS 条、重量全部相同或
+                   拟合结果不合理 (b <= 0 或 a < 0) 时为 None
         """
-        return f"¥{quote:,.2f}"
+        order_count = stats['order_count'] or 0
+        m2_weight = stats['m2_weight'] or 0
+        if order_count < EfficiencyService.LINEAR_MIN_ORDERS or m2_weight <= 0:
+            return None
+        
+        slope = (stats['c_weight_time'] or 0) / m2_weight
+        intercept = (stats['total_time'] - slope * stats['total_weight']) / order_count
+        if slope <= 0 or intercept < 0:
+            return None
+        return intercept, slope
+    
+    @staticmethod
+    def get_linear_fit(material_name: str):
+        """
+        获取指定材料的线性时长模型 (非晶格工单, 已剔除异常工单)
+        
+        Returns:
+            tuple: (固定时长a, 单位重量时长b), 无法拟合时为 None
+        """
+        stats = get_material_stats(material_name)
+        if not stats or not stats['order_count']:
+            return None
+        if EFFICIENCY_OUTLIER_FILTER:
+            stats = EfficiencyService._filter_outliers(
+                stats, get_efficiency_sketch(material_name)
+            )
+        return EfficiencyService.linear_fit(stats)
+    
+    @staticmethod
+    def get_all_linear_fits(stats_rows=None) -> dict:
+        """
+        获取所有材料的线性时长模型
+        
+        Args:
+            stats_rows: get_all_filtered_stats() 的结果, 默认重新查询
+        
+        Returns:
+            dict: {材料名: (固定时长a, 单位重量时长b)}, 无法拟合的材料不在结果中
+        """
+        if stats_rows is None:
+            stats_rows = EfficiencyService.get_all_filtered_stats()
+        fits = {}
+        for stats in stats_rows:
+            if stats['is_lattice']:
+                continue
+            fit = EfficiencyService.linear_fit(stats)
+            if fit is not None:
+                fits[stats['name']] = fit
+        return fits
+    
+    @staticmethod
+    def linear_efficiency(fit, weight_g):
+        """
+        线性时长模型下指定重量的等效效率 重量 / (a + b × 重量)
+        
+        Args:
+            fit: (固定时长a, 单位重量时长b)
+            weight_g: 重量 (克), 可以是 NumPy 数组
+        """
+        intercept, slope = fit
+        return weight_g / (intercept + slope * weight_g)
 
 
 # ============================================================
-# 数据统计服务
+# 报价数据快照
 # ============================================================
 
-class StatisticsService:
+class PricingSnapshot:
     """
-    数据统计服务
-    提供各类统计分析功能
+    不可变的报价数据快照
+    
+    持有每台设备在各折旧年限下的每分钟成本、当前激活的设备配置、
+    各材料及各 (设备, 材料) 的效率、重量分段效率曲线、线性时长模型及材料密度。
+    由 from_db() 一次性从数据库构建, 之后 quote() 等计算不再访问数据库,
+    因此可以在线程间共享, 也可以 pickle 后发送到工作进程。
+    
+    效率按 设备+材料 → 材料 → 默认值 逐级查找, 每级都是一次字典查找,
+    与设备和材料数量无关。
     """
     
-    @staticmethod
-    def get_overview_stats() -> dict:
+    __slots__ = (
+        'version', 'machine_name', 'depreciation_years', 'cost_per_min',
+        '_cost_table', '_efficiency', '_weight_curves', '_linear_fits',
+        '_machine_efficiency', '_densities'
+    )
+    
+    # 报价可选的效率模型 (见 QUOTE_EFFICIENCY_MODEL)
+    MODELS = ('ratio', 'bucket', 'linear')
+    
+    # 按重量计算效率的模型在来源描述后追加的说明
+    MODEL_SOURCES = {'bucket': ", 按重量分段", 'linear': ", 线性时长模型"}
+    
+    # 未知材料的效率
+    DEFAULT_EFFICIENCY = (0.05, "默认值", 0)
+    DEFAULT_ESTIMATE = EfficiencyEstimate(*DEFAULT_EFFICIENCY, None, None)
+    
+    def __init__(self, version, machine_name, depreciation_years,
+                 cost_per_min, cost_table, efficiency, weight_curves=None,
+                 linear_fits=None, machine_efficiency=None, densities=None):
         """
-        获取概览统计数据
-        
-        Returns:
-            dict: 包含总工单数、各材料工单数等
+        Args:
+            version: 构建时的数据版本号
+            machine_name: 当前设备型号 (无配置时为None)
+            depreciation_years: 当前折旧年限 (无配置时为None)
+            cost_per_min: 当前配置下的每分钟成本
+            cost_table: {(设备型号, 年限): 每分钟成本}
+            efficiency: {材料名: EfficiencyEstimate}
+            weight_curves: {材料名: 重量分段效率曲线}, 见 get_all_weight_curves
+            linear_fits: {材料名: (固定时长, 单位重量时长)}, 见 get_all_linear_fits
+            machine_efficiency: {(设备型号, 材料名): EfficiencyEstimate},
+                                见 get_all_machine_efficiency_estimates
+            densities: {材料名: 密度 g/cm³ 或 None}
         """
-        from .database import get_all_materials
-        
-        total_orders = WorkOrder.select().count()
-        valid_orders = WorkOrder.select().where(WorkOrder.is_lattice == False).count()
-        lattice_orders = total_orders - valid_orders
+        init = object.__setattr__
+        init(self, 'version', version)
+        init(self, 'machine_name', machine_name)
+        init(self, 'depreciation_years', depreciation_years)
+        init(self, 'cost_per_min', cost_per_min)
+        init(self, '_cost_table', dict(cost_table))
+        init(self, '_efficiency', dict(efficiency))
+        init(self, '_weight_curves', dict(weight_curves or {}))
+        init(self, '_linear_fits', dict(linear_fits or {}))
+        init(self, '_machine_efficiency', dict(machine_efficiency or {}))
+        init(self, '_densities', dict(densities or {}))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingSnapshot 是不可变对象")
+    
+    def __delattr__(self, name):
+        raise AttributeError("PricingSnapshot 是不可变对象")
+    
+    def __reduce__(self):
+        return (PricingSnapshot, (
+            self.version, self.machine_name, self.depreciation_years,
+            self.cost_per_min, self._cost_table, self._efficiency,
+            self._weight_curves, self._linear_fits, self._machine_efficiency,
+            self._densities
+        ))
+    
+    def __repr__(self):
+        return (f"PricingSnapshot(version={self.version}, "
+                f"machine={self.machine_name!r}, years={self.depreciation_years}, "
+                f"materials={len(self._efficiency)})")
+    
+    @classmethod
+    def from_db(cls):
+        """
+        从数据库构建快照 (设备配置、设备表、全部材料效率、效率草图、
+        设备-材料效率、重量分段各一次查询; 效率和线性时长模型共用同一份聚合统计,
+        整体效率和重量分段效率按同一组草图剔除异常工单)
+        
+        版本号在查询之前读取: 构建期间发生写入时, 快照版本落后于
+        当前版本, 下次读取缓存时会重新构建。
+        """
+        version = get_data_version()
+        config = get_active_machine_config()
+        sketches = get_all_efficiency_sketches() if EFFICIENCY_OUTLIER_FILTER else {}
+        outlier_bounds = EfficiencyService.get_outlier_bounds(sketches)
+        stats_rows = EfficiencyService.get_all_filtered_stats(sketches)
+        efficiency = EfficiencyService.get_all_efficiency_estimates(stats_rows=stats_rows)
+        linear_fits = EfficiencyService.get_all_linear_fits(stats_rows)
+        machine_efficiency = EfficiencyService.get_all_machine_efficiency_estimates(
+            material_estimates=efficiency, bounds=outlier_bounds
+        )
+        weight_curves = EfficiencyService.get_all_weight_curves(outlier_bounds)
+        densities = {stats['name']: stats['density'] for stats in stats_rows}
+        
+        cost_table = {
+            (machine_name, years): cost_per_min
+            for machine_name, costs in CostCalculator.get_machine_cost_table().items()
+            for years, cost_per_min in costs.items()
+        }
+        
+        if config:
+            return cls(
+                version, config.machine_name, config.depreciation_years,
+                CostCalculator.calculate_cost_per_minute(
+                    config.total_price, config.depreciation_years
+                ),
+                cost_table, efficiency, weight_curves, linear_fits, machine_efficiency,
+                densities
+            )
+        return cls(version, None, None, 0.0, cost_table, efficiency,
+                   weight_curves, linear_fits, machine_efficiency, densities)
+    
+    @property
+    def material_names(self) -> tuple:
+        """快照中的全部材料名"""
+        return tuple(self._efficiency)
+    
+    def mesh_weight(self, mesh, material_name: str) -> tuple:
+        """
+        按材料密度将模型体积换算为重量 (同 QuoteService.mesh_weight)
+        
+        Args:
+            mesh: mesh.MeshProperties
+            material_name: 材料名称
+        
+        Returns:
+            tuple: (重量克 (保留2位小数), 密度 g/cm³)
+        
+        Raises:
+            ValueError: 材料不存在或未设置密度
+        """
+        from .mesh import weight_from_volume
+        
+        if material_name not in self._densities:
+            raise ValueError(f"材料 '{material_name}' 不存在")
+        density = self._densities[material_name]
+        if not density or density <= 0:
+            raise ValueError(f"材料 '{material_name}' 未设置密度, 无法由模型体积换算重量")
+        return round(weight_from_volume(mesh.volume_mm3, density), 2), density
+    
+    def material_efficiency(self, material_name: str, machine_name: str = None) -> tuple:
+        """
+        获取材料效率 (同 EfficiencyService.get_material_efficiency)
+        
+        Returns:
+            tuple: (效率值g/min, 数据来源描述, 有效工单数)
+        """
+        return tuple(self.efficiency_estimate(material_name, machine_name)[:3])
+    
+    def efficiency_estimate(self, material_name: str,
+                            machine_name: str = None) -> EfficiencyEstimate:
+        """
+        获取材料在指定设备上的效率及置信区间 (同 EfficiencyService.get_efficiency_estimate)
+        
+        依次查找 设备+材料、材料, 都没有时返回默认效率
+        
+        Args:
+            material_name: 材料名称
+            machine_name: 设备型号, 默认当前配置的设备
+        
+        Returns:
+            EfficiencyEstimate: (效率, 来源, 工单数, 区间下限, 区间上限)
+        """
+        estimate = self._machine_efficiency.get(
+            (machine_name or self.machine_name, material_name)
+        )
+        if estimate is not None:
+            return estimate
+        return self._efficiency.get(material_name, self.DEFAULT_ESTIMATE)
+    
+    def model_efficiency(self, material_name: str, weight_g: float,
+                         model: str = None, machine_name: str = None) -> EfficiencyEstimate:
+        """
+        按效率模型获取指定重量零件的效率
+        
+        bucket 模型: 材料有可用的重量分段时按重量插值
+        linear 模型: 材料有线性时长模型时, 效率为 重量 / (固定时长 + 单位重量时长 × 重量)
+        两者的置信区间都按材料整体估计的相对宽度换算;
+        材料没有可用的分段或线性模型时同 ratio 模型。
+        分段和线性模型按材料整体拟合; 设备有自己的效率时,
+        再乘以 设备效率 / 材料整体效率
+        
+        Args:
+            material_name: 材料名称
+            weight_g: 重量 (克)
+            model: 效率模型, 默认 QUOTE_EFFICIENCY_MODEL
+            machine_name: 设备型号, 默认当前配置的设备
+        
+        Returns:
+            EfficiencyEstimate: (效率, 来源, 工单数, 区间下限, 区间上限)
+        """
+        model = self._check_model(model)
+        estimate = self.efficiency_estimate(material_name, machine_name)
+        if model == 'bucket':
+            curve = self._weight_curves.get(material_name)
+        elif model == 'linear':
+            curve = self._linear_fits.get(material_name)
+        else:
+            curve = None
+        if curve is None or weight_g <= 0 or estimate.efficiency <= 0:
+            return estimate
+        
+        if model == 'bucket':
+            efficiency = float(EfficiencyService.curve_efficiency(curve, weight_g))
+        else:
+            efficiency = EfficiencyService.linear_efficiency(curve, weight_g)
+        efficiency *= self._machine_factor(material_name, estimate)
+        scale = efficiency / estimate.efficiency
+        return EfficiencyEstimate(
+            efficiency,
+            estimate.source + self.MODEL_SOURCES[model],
+            estimate.count,
+            estimate.low * scale if estimate.low is not None else None,
+            estimate.high * scale if estimate.high is not None else None
+        )
+    
+    def _machine_factor(self, material_name, estimate):
+        """设备效率相对材料整体效率的倍数 (estimate 不是设备效率时为1)"""
+        base = self._efficiency.get(material_name)
+        if base is None or estimate is base or not base.efficiency > 0:
+            return 1.0
+        return estimate.efficiency / base.efficiency
+    
+    @classmethod
+    def _check_model(cls, model):
+        """校验效率模型, None 时返回配置的默认值"""
+        model = model or QUOTE_EFFICIENCY_MODEL
+        if model not in cls.MODELS:
+            raise ValueError(
+                f"未知的效率模型 '{model}', 可选: {', '.join(cls.MODELS)}"
+            )
+        return model
+    
+    def cost_per_minute(self, machine_name=None, depreciation_years=None) -> float:
+        """
+        获取每分钟成本
+        
+        Args:
+            machine_name: 设备型号, 默认当前配置
+            depreciation_years: 折旧年限, 默认当前配置
+        
+        Returns:
+            float: 每分钟成本 (元/分钟)
+        """
+        if machine_name is None and depreciation_years is None:
+            return self.cost_per_min
+        key = (machine_name or self.machine_name,
+               depreciation_years or self.depreciation_years)
+        if key not in self._cost_table:
+            raise ValueError(f"未知的设备配置: {key[0]} / {key[1]}年")
+        return self._cost_table[key]
+    
+    def quote(
+        self,
+        material_name: str,
+        weight_g: float,
+        difficulty: int = 1,
+        risk: float = 0,
+        post_process_hours: float = 0,
+        post_process_rate: float = 50,
+        machine_name: str = None,
+        depreciation_years: int = None,
+        model: str = None
+    ) -> dict:
+        """
+        计算报价 (纯计算, 不访问数据库)
+        
+        参数和返回值同 QuoteService.calculate_quote;
+        machine_name / depreciation_years 可指定其他设备配置, 默认当前配置
+        """
+        cost_per_min = self.cost_per_minute(machine_name, depreciation_years)
+        efficiency, source, order_count, efficiency_low, efficiency_high = (
+            self.model_efficiency(material_name, weight_g, model, machine_name)
+        )
+        
+        # 计算预估打印时长 (分钟)
+        if efficiency > 0:
+            time_min = weight_g / efficiency
+        else:
+            time_min = 0
+        
+        # 计算基准打印价格
+        base_print_price = time_min * cost_per_min
+        
+        # 计算系数加成
+        coefficient = difficulty + risk
+        
+        # 计算打印价格 (含系数)
+        print_price = base_print_price * coefficient
+        
+        # 计算后处理价格
+        post_process_price = post_process_hours * post_process_rate
+        
+        # 计算最终总报价
+        total_quote = print_price + post_process_price
+        
+        # 按效率置信区间计算报价区间 (效率越高, 时长越短, 报价越低)
+        total_quote_low = total_quote_high = None
+        if efficiency > 0 and efficiency_high is not None:
+            total_quote_low = round(
+                weight_g / efficiency_high * cost_per_min * coefficient
+                + post_process_price, 2
+            )
+        if efficiency > 0 and efficiency_low:
+            total_quote_high = round(
+                weight_g / efficiency_low * cost_per_min * coefficient
+                + post_process_price, 2
+            )
+        
+        # 格式化时长
+        hours = int(time_min // 60)
+        minutes = int(time_min % 60)
+        if hours > 0:
+            time_formatted = f"{hours}小时{minutes}分钟"
+        else:
+            time_formatted = f"{minutes}分钟"
+        
+        return {
+            'base_print_price': round(base_print_price, 2),
+            'print_price': round(print_price, 2),
+            'post_process_price': round(post_process_price, 2),
+            'total_quote': round(total_quote, 2),
+            'total_quote_low': total_quote_low,
+            'total_quote_high': total_quote_high,
+            'coefficient': coefficient,
+            'difficulty': difficulty,
+            'risk': risk,
+            'time_min': round(time_min, 1),
+            'time_formatted': time_formatted,
+            'efficiency': round(efficiency, 4),
+            'efficiency_source': source,
+            'cost_per_min': round(cost_per_min, 4),
+            'order_count': order_count,
+            'post_process_hours': post_process_hours,
+            'post_process_rate': post_process_rate
+        }
+    
+    def _efficiency_columns(self, columns, model, machine_name=None):
+        """
+        按行计算效率及置信区间 (quotes / price_matrix 共用)
+        
+        Args:
+            columns: QuoteService._quote_columns 的结果
+            model: 已校验的效率模型
+            machine_name: 设备型号, 默认当前配置的设备
+        
+        Returns:
+            tuple: (各行材料编号, 各材料 EfficiencyEstimate 列表,
+                    效率, 区间下限, 区间上限, 是否按重量计算效率);
+                   区间缺失的位置为 NaN
+        """
+        import numpy as np
+        
+        material_index = {}
+        codes = np.fromiter(
+            (material_index.setdefault(name, len(material_index))
+             for name in columns['material_name'].tolist()),
+            dtype=np.int64,
+            count=len(columns['material_name'])
+        )
+        lookups = [self.efficiency_estimate(name, machine_name) for name in material_index]
+        if lookups:
+            # 区间缺失 (None) 或下限为0时用 NaN 表示, 对应的报价区间为 None
+            bounds = np.array([
+                [lookup.efficiency,
+                 lookup.low if lookup.low else np.nan,
+                 lookup.high if lookup.high is not None else np.nan]
+                for lookup in lookups
+            ], dtype=float)[codes]
+            efficiency, efficiency_low, efficiency_high = bounds.T
+        else:
+            efficiency = efficiency_low = efficiency_high = np.zeros(0)
+        
+        # 按重量计算效率的行 (计算方式同 model_efficiency)
+        weight = columns['weight_g']
+        curved = np.zeros(len(weight), dtype=bool)
+        if model != 'ratio':
+            curves = self._weight_curves if model == 'bucket' else self._linear_fits
+            for name, code in material_index.items():
+                curve = curves.get(name)
+                if curve is None or not lookups[code].efficiency > 0:
+                    continue
+                rows = (codes == code) & (weight > 0)
+                if not rows.any():
+                    continue
+                if model == 'bucket':
+                    curve_efficiency = EfficiencyService.curve_efficiency(curve, weight[rows])
+                else:
+                    curve_efficiency = EfficiencyService.linear_efficiency(curve, weight[rows])
+                curve_efficiency *= self._machine_factor(name, lookups[code])
+                scale = curve_efficiency / efficiency[rows]
+                efficiency[rows] = curve_efficiency
+                efficiency_low[rows] = efficiency_low[rows] * scale
+                efficiency_high[rows] = efficiency_high[rows] * scale
+                curved |= rows
+        
+        return codes, lookups, efficiency, efficiency_low, efficiency_high, curved
+    
+    def quotes(self, items, machine_name=None, depreciation_years=None,
+               model=None) -> list:
+        """
+        批量计算报价 (向量化, 纯计算)
+        
+        计算顺序与 quote() 完全一致, 舍入结果也与 Python round 一致,
+        整数参数也按 int 回显, 因此逐行结果 (含数值类型) 与 quote() 相同
+        (见 tests/test_quotes.py)。
+        
+        Args:
+            items: 字典/元组序列、NumPy 结构化数组或列字典,
+                   字段同 calculate_quote 参数
+            machine_name / depreciation_years / model: 同 quote()
+        
+        Returns:
+            list: 与输入顺序一致的报价明细字典列表
+        """
+        import numpy as np
+        
+        columns = QuoteService._quote_columns(items)
+        
+        cost_per_min = self.cost_per_minute(machine_name, depreciation_years)
+        model = self._check_model(model)
+        codes, lookups, efficiency, efficiency_low, efficiency_high, curved = (
+            self._efficiency_columns(columns, model, machine_name)
+        )
+        weight = columns['weight_g']
+        
+        # 计算预估打印时长 (分钟), 效率无效时为0
+        time_min = np.zeros(len(weight))
+        np.divide(weight, efficiency, out=time_min, where=efficiency > 0)
+        
+        base_print_price = time_min * cost_per_min
+        coefficient = columns['difficulty'] + columns['risk']
+        print_price = base_print_price * coefficient
+        post_process_price = columns['post_process_hours'] * columns['post_process_rate']
+        total_quote = print_price + post_process_price
+        
+        # 报价区间 (计算顺序同 quote())
+        valid = efficiency > 0
+        with np.errstate(invalid='ignore'):
+            total_quote_low = np.where(
+                valid,
+                weight / efficiency_high * cost_per_min * coefficient + post_process_price,
+                np.nan
+            )
+            total_quote_high = np.where(
+                valid,
+                weight / efficiency_low * cost_per_min * coefficient + post_process_price,
+                np.nan
+            )
+        
+        # 格式化时长
+        hours = (time_min // 60).astype(np.int64).tolist()
+        minutes = (time_min % 60).astype(np.int64).tolist()
+        time_formatted = [
+            f"{h}小时{m}分钟" if h > 0 else f"{m}分钟"
+            for h, m in zip(hours, minutes)
+        ]
+        
+        # (来源, 工单数), 按重量计算效率的行来源描述不同
+        material_info = [(lookup.source, lookup.count) for lookup in lookups]
+        curved_info = [
+            (source + self.MODEL_SOURCES.get(model, ""), count)
+            for source, count in material_info
+        ]
+        infos = [
+            curved_info[code] if is_curved else material_info[code]
+            for code, is_curved in zip(codes.tolist(), curved.tolist())
+        ]
+        cost_rounded = round(cost_per_min, 4)
+        
+        # 与 quote() 的结果类型一致: 整数参数原样回显, 由整数参数算出的值也是 int
+        integer = columns['integer']
+        coefficient_integer = integer['difficulty'] & integer['risk']
+        post_integer = integer['post_process_hours'] & integer['post_process_rate']
+        
+        return [
+            {
+                'base_print_price': base,
+                'print_price': printed,
+                'post_process_price': post,
+                'total_quote': total,
+                'total_quote_low': low,
+                'total_quote_high': high,
+                'coefficient': coef,
+                'difficulty': difficulty,
+                'risk': risk,
+                'time_min': time_value,
+                'time_formatted': formatted,
+                'efficiency': efficiency_value,
+                'efficiency_source': info[0],
+                'cost_per_min': cost_rounded,
+                'order_count': info[1],
+                'post_process_hours': post_hours,
+                'post_process_rate': post_rate
+            }
+            for (base, printed, post, total, low, high, coef, difficulty, risk,
+                 time_value, formatted, efficiency_value, info,
+                 post_hours, post_rate) in zip(
+                _round_list(base_print_price, 2),
+                _round_list(print_price, 2),
+                _typed_list(_round_list(post_process_price, 2), post_integer),
+                _round_list(total_quote, 2),
+                _optional_list(_round_list(total_quote_low, 2)),
+                _optional_list(_round_list(total_quote_high, 2)),
+                _typed_list(coefficient, coefficient_integer),
+                _typed_list(columns['difficulty'], integer['difficulty']),
+                _typed_list(columns['risk'], integer['risk']),
+                # 效率无效时 quote() 的时长为整数 0
+                _typed_list(_round_list(time_min, 1), ~valid),
+                time_formatted,
+                _round_list(efficiency, 4),
+                infos,
+                _typed_list(columns['post_process_hours'], integer['post_process_hours']),
+                _typed_list(columns['post_process_rate'], integer['post_process_rate']),
+            )
+        ]
+    
+    def cost_matrix(self):
+        """
+        每分钟成本矩阵 (设备型号 × 折旧年限)
+        
+        Returns:
+            tuple: (设备型号元组, 年限元组, 成本数组 shape=(设备数, 年限数));
+                   成本表中缺少的组合为 NaN
+        """
+        import numpy as np
+        
+        machines = tuple(dict.fromkeys(machine for machine, _ in self._cost_table))
+        years = tuple(sorted({years for _, years in self._cost_table}))
+        costs = np.array([
+            [self._cost_table.get((machine, value), np.nan) for value in years]
+            for machine in machines
+        ], dtype=float).reshape(len(machines), len(years))
+        return machines, years, costs
+    
+    def price_matrix(self, items, model=None) -> dict:
+        """
+        计算每个零件在全部设备、全部折旧年限下的报价矩阵 (向量化, 纯计算)
+        
+        效率和打印时长与折旧年限无关, 按 (零件, 设备) 计算一次; 报价由
+        时长 (零件数 × 设备数) 与成本矩阵 (设备数 × 年限数) 一次广播得到。
+        计算顺序同 quote(), 因此 total_quote[i, m, y] 与
+        quote(..., machine_name=machines[m], depreciation_years=years[y]) 相同。
+        
+        Args:
+            items: 同 quotes()
+            model: 效率模型, 同 quote()
+        
+        Returns:
+            dict: {
+                machines: 设备型号元组,
+                depreciation_years: 折旧年限元组,
+                material_name: 各行材料名列表,
+                time_min: 各行在各设备上的预估打印时长 (分钟), [零件][设备] 嵌套列表,
+                efficiency: 各行在各设备上的效率, [零件][设备] 嵌套列表,
+                total_quote / total_quote_low / total_quote_high:
+                    报价数组 shape=(零件数, 设备数, 年限数), 报价区间缺失时为 NaN
+            }
+        """
+        import numpy as np
+        
+        columns = QuoteService._quote_columns(items)
+        model = self._check_model(model)
+        machines, years, costs = self.cost_matrix()
+        weight = columns['weight_g']
+        
+        # 各设备的效率列 (设备效率不足时逐级回退, 见 efficiency_estimate), shape=(零件, 设备)
+        by_machine = [
+            self._efficiency_columns(columns, model, machine)[2:5] for machine in machines
+        ]
+        efficiency, efficiency_low, efficiency_high = (
+            np.array([item[i] for item in by_machine], dtype=float)
+            .reshape(len(machines), len(weight)).T
+            for i in range(3)
+        )
+        
+        time_min = np.zeros(efficiency.shape)
+        np.divide(weight[:, None], efficiency, out=time_min, where=efficiency > 0)
+        
+        # (零件, 设备, 1) 与 (设备, 年限) 广播
+        cost = costs[np.newaxis]
+        coefficient = (columns['difficulty'] + columns['risk'])[:, None, None]
+        post_process_price = (
+            columns['post_process_hours'] * columns['post_process_rate']
+        )[:, None, None]
+        total_quote = time_min[:, :, None] * cost * coefficient + post_process_price
+        
+        valid = (efficiency > 0)[:, :, None]
+        with np.errstate(invalid='ignore'):
+            total_quote_low = np.where(
+                valid,
+                (weight[:, None] / efficiency_high)[:, :, None] * cost * coefficient
+                + post_process_price,
+                np.nan
+            )
+            total_quote_high = np.where(
+                valid,
+                (weight[:, None] / efficiency_low)[:, :, None] * cost * coefficient
+                + post_process_price,
+                np.nan
+            )
+        
+        def round_array(values, digits=2):
+            return np.array(_round_list(values.ravel(), digits)).reshape(values.shape)
+        
+        return {
+            'machines': machines,
+            'depreciation_years': years,
+            'material_name': columns['material_name'].tolist(),
+            'time_min': round_array(time_min, 1).tolist(),
+            'efficiency': round_array(efficiency, 4).tolist(),
+            'total_quote': round_array(total_quote),
+            'total_quote_low': round_array(total_quote_low),
+            'total_quote_high': round_array(total_quote_high),
+        }
+
+# ============================================================
+# 报价数据缓存
+# ============================================================
+
+class PricingCache:
+    """
+    进程级报价快照缓存
+    持有与数据版本号绑定的 PricingSnapshot。数据未变化时重复报价
+    不产生任何SQL查询; 工单或设备配置写入后版本号递增, 下次读取时
+    重新构建快照并整体替换引用。调用方拿到的快照在其生命周期内
+    始终自洽, 不会读到一半新一半旧的数据。
+    """
+    
+    _lock = threading.Lock()
+    _snapshot = None
+    
+    @classmethod
+    def get_snapshot(cls) -> PricingSnapshot:
+        """获取当前数据版本的报价快照, 版本变化时重新构建"""
+        snapshot = cls._snapshot
+        if snapshot is None or snapshot.version != get_data_version():
+            with cls._lock:
+                # 等锁期间其他线程可能已完成构建
+                snapshot = cls._snapshot
+                if snapshot is None or snapshot.version != get_data_version():
+                    snapshot = PricingSnapshot.from_db()
+                    cls._snapshot = snapshot
+        return snapshot
+    
+    @classmethod
+    def get_cost_per_minute(cls) -> float:
+        """
+        获取当前配置下的每分钟成本
+        
+        Returns:
+            float: 每分钟成本，如果没有配置返回0
+        """
+        return cls.get_snapshot().cost_per_min
+    
+    @classmethod
+    def get_material_efficiency(cls, material_name: str) -> tuple:
+        """
+        获取材料效率 (同 EfficiencyService.get_material_efficiency)
+        
+        Returns:
+            tuple: (效率值g/min, 数据来源描述, 有效工单数)
+        """
+        return cls.get_snapshot().material_efficiency(material_name)
+    
+    @classmethod
+    def invalidate(cls):
+        """强制清空缓存"""
+        with cls._lock:
+            cls._snapshot = None
+
+
+# ============================================================
+# 报价服务
+# ============================================================
+
+def _round_list(values, digits):
+    """
+    对 NumPy 数组做与 Python round 结果完全一致的舍入
+    
+    先按 rint(x·10^n) / 10^n 向量化计算; 缩放后接近 .5 的临界值、
+    超出整数精度或非有限值可能与 round 不同, 这些位置回退到 round。
+    
+    Returns:
+        list: 舍入后的 Python float 列表
+    """
+    import numpy as np
+    
+    scale = 10.0 ** digits
+    scaled = values * scale
+    result = (np.rint(scaled) / scale).tolist()
+    
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= np.abs(scaled) * 1e-12 + 1e-12
+    suspect = near_half | ~np.isfinite(scaled) | (np.abs(scaled) >= 2.0 ** 52)
+    for index in np.flatnonzero(suspect).tolist():
+        result[index] = round(float(values[index]), digits)
+    return result
+
+
+def _optional_list(values):
+    """将列表中的 NaN 替换为 None"""
+    return [None if value != value else value for value in values]
+
+
+def _integer_mask(column, size):
+    """
+    标记数值列中输入为整数 (int / NumPy 整数, 不含 bool) 的位置
+    
+    Returns:
+        np.ndarray: 长度为 size 的布尔数组
+    """
+    import numpy as np
+    
+    dtype = getattr(column, 'dtype', None)
+    if dtype is not None and dtype != object:
+        return np.full(size, np.issubdtype(dtype, np.integer))
+    
+    def is_integer(value_type):
+        return issubclass(value_type, (int, np.integer)) and value_type is not bool
+    
+    # 通常整列类型相同, 按类型集合判断即可, 混合类型时才逐项判断
+    types = set(map(type, column))
+    if len(types) == 1:
+        return np.full(size, is_integer(types.pop()))
+    return np.fromiter((is_integer(type(value)) for value in column),
+                       dtype=bool, count=size)
+
+
+def _typed_list(values, integer):
+    """
+    将数组 (或 _round_list 的结果) 转换为 Python 列表, integer 为 True 的位置恢复为 int
+    
+    quote() 原样回显输入参数 (及由整数参数算出的值), 批量结果也保持相同类型
+    """
+    import numpy as np
+    
+    result = values.tolist() if isinstance(values, np.ndarray) else values
+    if integer.all():
+        return [int(value) for value in result]
+    for index in np.flatnonzero(integer).tolist():
+        result[index] = int(result[index])
+    return result
+
+
+class QuoteService:
+    """
+    报价服务
+    整合成本和效率计算，生成最终报价
+    """
+    
+    @staticmethod
+    def calculate_quote(
+        material_name: str,
+        weight_g: float,
+        difficulty: int = 1,
+        risk: float = 0,
+        post_process_hours: float = 0,
+        post_process_rate: float = 50,
+        model: str = None
+    ) -> dict:
+        """
+        计算报价 (v2.2 新版算法)
+        
+        公式:
+            基准打印价格 = (重量 / 效率) × 每分钟成本
+            打印价格 = 基准打印价格 × (难度系数 + 风险系数)
+            后处理价格 = 后处理时长 × 后处理单价
+            最终报价 = 打印价格 + 后处理价格
+        
+        成本和效率取自当前数据版本的报价快照 (PricingSnapshot.quote)
+        
+        Args:
+            material_name: 材料名称
+            weight_g: 预估重量 (克)
+            difficulty: 难度系数 (1/2/3)
+            risk: 风险系数 (0/0.5/1/1.5/2)
+            post_process_hours: 后处理时长 (小时)
+            post_process_rate: 后处理单价 (元/小时)
+            model: 效率模型 ('ratio' / 'bucket' / 'linear'), 默认 QUOTE_EFFICIENCY_MODEL
+        
+        Returns:
+            dict: 包含各项价格明细的字典; total_quote_low / total_quote_high
+                  为按效率置信区间计算的报价区间, 工单不足2条时为 None
+        """
+        return PricingCache.get_snapshot().quote(
+            material_name,
+            weight_g,
+            difficulty=difficulty,
+            risk=risk,
+            post_process_hours=post_process_hours,
+            post_process_rate=post_process_rate,
+            model=model
+        )
+    
+    # 批量报价的输入字段及默认值 (与 calculate_quote 参数一致)
+    QUOTE_FIELDS = (
+        ('material_name', None),
+        ('weight_g', None),
+        ('difficulty', 1),
+        ('risk', 0),
+        ('post_process_hours', 0),
+        ('post_process_rate', 50),
+    )
+    
+    @staticmethod
+    def _quote_columns(items) -> dict:
+        """
+        将批量报价输入统一转换为按字段的列
+        
+        支持:
+            - 字典序列 (键同 calculate_quote 参数) 或按参数顺序的元组序列
+            - NumPy 结构化数组 (字段名同 calculate_quote 参数)
+            - 列字典 {字段名: 序列/数组}
+        
+        Returns:
+            dict: {字段名: 数组}, 数值字段为 float 数组;
+                  另含 'integer': {数值字段名: 布尔数组}, 标记输入为整数的位置
+                  (报价明细回显参数时恢复为 int, 与 quote() 一致)
+        
+        Raises:
+            ValueError: 缺少必填字段, 或数值字段为空、无法解析或非有限值 (NaN/Inf)
+        """
+        import numpy as np
+        
+        fields = QuoteService.QUOTE_FIELDS
+        dtype_names = getattr(getattr(items, 'dtype', None), 'names', None)
+        
+        if dtype_names:
+            source = {name: items[name] for name in dtype_names}
+            size = len(items)
+        elif isinstance(items, dict):
+            source = items
+            size = len(items['weight_g'])
+        else:
+            items = list(items)
+            size = len(items)
+            source = {}
+            for index, (name, default) in enumerate(fields):
+                column = [
+                    item.get(name, default) if isinstance(item, dict)
+                    else (item[index] if len(item) > index else default)
+                    for item in items
+                ]
+                # 必填字段缺失 (或显式为 None) 时逐项报告, 不能变成 NaN 报价
+                if None in column:
+                    raise ValueError(f"第{column.index(None) + 1}项缺少字段 '{name}'")
+                source[name] = column
+        
+        columns = {'integer': {}}
+        for name, default in fields:
+            if name in source:
+                column = source[name]
+            elif default is None:
+                raise ValueError(f"批量报价缺少字段 '{name}'")
+            else:
+                column = [default] * size
+            if name == 'material_name':
+                columns[name] = np.asarray(column, dtype=object)
+            else:
+                try:
+                    columns[name] = np.asarray(column, dtype=float)
+                except (TypeError, ValueError):
+                    raise ValueError(f"字段 '{name}' 包含无效数值") from None
+                invalid = ~np.isfinite(columns[name])
+                if invalid.any():
+                    raise ValueError(
+                        f"第{int(invalid.argmax()) + 1}项的字段 '{name}' 不是有效数值"
+                    )
+                columns['integer'][name] = _integer_mask(column, len(columns[name]))
+            if len(columns[name]) != size:
+                raise ValueError(f"字段 '{name}' 的长度与其他字段不一致")
+        return columns
+    
+    @staticmethod
+    def calculate_quotes(items, model=None) -> list:
+        """
+        批量计算报价 (向量化)
         
-        # 各材料统计
+        全部行使用同一个报价快照, 用 NumPy 数组运算计算。
+        逐行结果与 calculate_quote 相同 (见 PricingSnapshot.quotes)。
+        
+        Args:
+            items: 字典/元组序列、NumPy 结构化数组或列字典,
+                   字段同 calculate_quote 参数
+            model: 效率模型, 同 calculate_quote
+        
+        Returns:
+            list: 与输入顺序一致的报价明细字典列表
+        """
+        return PricingCache.get_snapshot().quotes(items, model=model)
+    
+    @staticmethod
+    def calculate_price_matrix(
+        weight_g: float,
+        material_names=None,
+        difficulty: int = 1,
+        risk: float = 0,
+        post_process_hours: float = 0,
+        post_process_rate: float = 50,
+        model: str = None
+    ) -> dict:
+        """
+        计算单个零件在各材料、各设备、各折旧年限下的报价矩阵
+        
+        Args:
+            weight_g: 预估重量 (克)
+            material_names: 材料名序列, 默认全部材料
+            difficulty / risk / post_process_hours / post_process_rate / model:
+                同 calculate_quote
+        
+        Returns:
+            dict: 同 PricingSnapshot.price_matrix, 每行对应一种材料,
+                  total_quote 的 shape 为 (材料数, 设备数, 年限数)
+        """
+        snapshot = PricingCache.get_snapshot()
+        if material_names is None:
+            material_names = snapshot.material_names
+        return snapshot.price_matrix([
+            {
+                'material_name': name,
+                'weight_g': weight_g,
+                'difficulty': difficulty,
+                'risk': risk,
+                'post_process_hours': post_process_hours,
+                'post_process_rate': post_process_rate,
+            }
+            for name in material_names
+        ], model=model)
+    
+    @staticmethod
+    def calculate_price_matrices(items, model=None) -> dict:
+        """
+        批量计算零件在各设备、各折旧年限下的报价矩阵
+        
+        Args:
+            items: 同 calculate_quotes
+            model: 效率模型, 同 calculate_quote
+        
+        Returns:
+            dict: 同 PricingSnapshot.price_matrix,
+                  total_quote 的 shape 为 (零件数, 设备数, 年限数)
+        """
+        return PricingCache.get_snapshot().price_matrix(items, model=model)
+    
+    @staticmethod
+    def mesh_weight(mesh, material_name: str) -> tuple:
+        """
+        按材料密度将模型体积换算为重量
+        
+        Args:
+            mesh: mesh.MeshProperties
+            material_name: 材料名称
+        
+        Returns:
+            tuple: (重量克 (保留2位小数), 密度 g/cm³)
+        
+        Raises:
+            ValueError: 材料不存在或未设置密度
+        """
+        return PricingCache.get_snapshot().mesh_weight(mesh, material_name)
+    
+    @staticmethod
+    def calculate_mesh_quote(
+        mesh,
+        material_name: str,
+        difficulty: int = 1,
+        risk: float = 0,
+        post_process_hours: float = 0,
+        post_process_rate: float = 50,
+        model: str = None
+    ) -> dict:
+        """
+        由 STL 模型几何属性计算报价: 体积 × 材料密度 → 重量 → calculate_quote
+        
+        Args:
+            mesh: mesh.MeshProperties (见 mesh.load_mesh)
+            material_name / difficulty / risk / post_process_hours /
+            post_process_rate / model: 同 calculate_quote
+        
+        Returns:
+            dict: calculate_quote 的报价明细, 另含 weight_g、density、
+                  volume_mm3、surface_area_mm2、bbox_min、bbox_max、triangle_count
+        """
+        weight_g, density = QuoteService.mesh_weight(mesh, material_name)
+        result = QuoteService.calculate_quote(
+            material_name,
+            weight_g,
+            difficulty=difficulty,
+            risk=risk,
+            post_process_hours=post_process_hours,
+            post_process_rate=post_process_rate,
+            model=model
+        )
+        result.update(mesh._asdict(), weight_g=weight_g, density=density)
+        return result
+    
+    @staticmethod
+    def calculate_stl_quote(path, material_name: str, unit_mm: float = None,
+                            **quote_params) -> dict:
+        """
+        读取 STL 文件并计算报价
+        
+        Args:
+            path: STL 文件路径 (二进制或 ASCII)
+            material_name: 材料名称
+            unit_mm: 坐标单位 (毫米), 默认 config.STL_UNIT_MM
+            **quote_params: 其余报价参数, 同 calculate_mesh_quote
+        
+        Returns:
+            dict: 同 calculate_mesh_quote
+        """
+        from .mesh import load_mesh
+        
+        return QuoteService.calculate_mesh_quote(
+            load_mesh(path, unit_mm), material_name, **quote_params
+        )
+    
+    @staticmethod
+    def format_quote(quote: float) -> str:
+        """
+        格式化报价金额
+        
+        Args:
+            quote: 报价金额
+        
+        Returns:
+            str: 格式化后的字符串 (如: ¥12,345.00)
+        """
+        return f"¥{quote:,.2f}"
+
+
+# ============================================================
+# 数据统计服务
+# ============================================================
+
+class StatisticsService:
+    """
+    数据统计服务
+    提供各类统计分析功能
+    """
+    
+    @staticmethod
+    def get_overview_stats() -> dict:
+        """
+        获取概览统计数据
+        
+        Returns:
+            dict: 包含总工单数、各材料工单数等
+        """
+        # 单次聚合查询, 查询次数与材料数量无关
+        total_orders = 0
+        valid_orders = 0
         material_stats = {}
-        for material in get_all_materials():
-            count = (WorkOrder
-                    .select()
-                    .where(WorkOrder.material == material)
-                    .count())
-            material_stats[material.name] = count
+        for stats in get_all_material_stats():
+            name = stats['name']
+            count = stats['order_count'] or 0
+            material_stats[name] = material_stats.get(name, 0) + count
+            total_orders += count
+            if not stats['is_lattice']:
+                valid_orders += count
+        lattice_orders = total_orders - valid_orders
         
         return {
             'total_orders': total_orders,
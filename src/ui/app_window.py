@@ -9,17 +9,28 @@ SLM智能报价系统 - 主窗口框架
 import customtkinter as ctk
 from ..config import (
     WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_MIN_WIDTH, WINDOW_MIN_HEIGHT,
-    COLORS, FONTS, APP_NAME, APP_VERSION
+    COLORS, FONTS, APP_NAME, APP_VERSION, DEBUG_QUERY_OVERLAY
 )
+from ..query_stats import track_operation, get_query_stats, get_last_operation
 
 
 class AppWindow(ctk.CTk):
     """
     主窗口类
     采用左侧侧边栏导航 + 右侧内容区的布局
+    页面在第一次显示时才导入模块并创建
     """
     
-    def __init__(self):
+    # 查询统计浮层的刷新间隔 (毫秒)
+    QUERY_OVERLAY_REFRESH_MS = 500
+    
+    def __init__(self, initial_page="config", show_query_overlay=DEBUG_QUERY_OVERLAY):
+        """
+        Args:
+            initial_page: 启动后显示的页面; 为None时由调用方稍后调用 show_page
+                          (例如先显示窗口, 数据库初始化完成后再显示页面)
+            show_query_overlay: 是否显示SQL查询统计浮层 (调试用)
+        """
         super().__init__()
         
         # ============================================================
@@ -45,10 +56,14 @@ class AppWindow(ctk.CTk):
         # ============================================================
         self._create_layout()
         self._create_sidebar()
-        self._create_pages()
         
-        # 默认显示设备配置页
-        self.show_page("config")
+        self.query_overlay = None
+        if show_query_overlay:
+            self._create_query_overlay()
+        
+        # 默认显示设备配置页 (其余页面首次切换时再创建)
+        if initial_page:
+            self.show_page(initial_page)
     
     def _create_layout(self):
         """创建主布局框架"""
@@ -168,21 +183,33 @@ class AppWindow(ctk.CTk):
         )
         tip_label.pack()
     
-    def _create_pages(self):
-        """创建所有页面 (延迟加载)"""
-        # 导入页面模块
-        from .page_config import ConfigPage
-        from .page_quote import QuotePage
-        from .page_data import DataPage
-        
-        # 创建页面实例
-        self.pages["config"] = ConfigPage(self.content_frame, self)
-        self.pages["quote"] = QuotePage(self.content_frame, self)
-        self.pages["data"] = DataPage(self.content_frame, self)
-        
-        # 初始隐藏所有页面
-        for page in self.pages.values():
-            page.grid_remove()
+    def _get_page(self, page_id: str):
+        """
+        获取页面实例, 第一次访问时导入页面模块并创建
+        
+        Args:
+            page_id: 页面标识 (config/quote/data)
+        
+        Returns:
+            页面实例, 未知标识返回None
+        """
+        if page_id in self.pages:
+            return self.pages[page_id]
+        
+        # 显式导入语句 (而非按名称动态导入), 便于 PyInstaller 收集依赖
+        if page_id == "config":
+            from .page_config import ConfigPage as page_class
+        elif page_id == "quote":
+            from .page_quote import QuotePage as page_class
+        elif page_id == "data":
+            from .page_data import DataPage as page_class
+        else:
+            return None
+        
+        page = page_class(self.content_frame, self)
+        page.grid_remove()
+        self.pages[page_id] = page
+        return page
     
     def show_page(self, page_id: str):
         """
@@ -195,11 +222,13 @@ class AppWindow(ctk.CTk):
         if self.current_page and self.current_page in self.pages:
             self.pages[self.current_page].grid_remove()
         
-        # 显示目标页面
-        if page_id in self.pages:
-            self.pages[page_id].grid(row=0, column=0, sticky="nsew")
-            self.pages[page_id].on_show()  # 触发页面显示事件
-            self.current_page = page_id
+        # 显示目标页面 (首次显示时创建)
+        with track_operation(f"page.show:{page_id}"):
+            page = self._get_page(page_id)
+            if page:
+                page.grid(row=0, column=0, sticky="nsew")
+                page.on_show()  # 触发页面显示事件
+                self.current_page = page_id
         
         # 更新导航按钮状态
         self._update_nav_buttons(page_id)
@@ -221,6 +250,52 @@ class AppWindow(ctk.CTk):
                 )
     
     def refresh_quote_page(self):
-        """刷新报价页面 (当设备配置或工单数据变化时调用)"""
+        """刷新报价页面 (当设备配置或工单数据变化时调用, 未创建则无需刷新)"""
         if "quote" in self.pages:
             self.pages["quote"].refresh_data()
+    
+    # ============================================================
+    # SQL查询统计浮层 (调试)
+    # ============================================================
+    
+    def _create_query_overlay(self):
+        """在内容区右下角创建查询统计浮层"""
+        self.query_overlay = ctk.CTkLabel(
+            self.content_frame,
+            text="",
+            font=FONTS["mono"],
+            text_color=COLORS["text_secondary"],
+            fg_color=COLORS["bg_card"],
+            corner_radius=6,
+            justify="left",
+            padx=10,
+            pady=6
+        )
+        self.query_overlay.place(relx=1.0, rely=1.0, x=-10, y=-10, anchor="se")
+        self._refresh_query_overlay()
+    
+    def _refresh_query_overlay(self):
+        """定时刷新浮层: 最近一次操作 + 累计查询最多的几个操作"""
+        lines = []
+        last = get_last_operation()
+        if last:
+            name, queries, elapsed_ms = last
+            lines.append(f"最近: {name}  {queries}条 {elapsed_ms:.1f}ms")
+        
+        stats = sorted(
+            get_query_stats().items(),
+            key=lambda item: item[1]['queries'],
+            reverse=True
+        )
+        for name, item in stats[:5]:
+            per_call = item['queries_per_call']
+            per_call_text = f"{per_call:.1f}条/次" if per_call is not None else "-"
+            lines.append(
+                f"{name:<20} {item['queries']:>6}条 {per_call_text:>9} "
+                f"最慢 {item['slowest_ms']:.1f}ms"
+            )
+        
+        self.query_overlay.configure(text="\n".join(lines) or "SQL: 暂无查询")
+        # 页面按需创建, 保持浮层在最上层
+        self.query_overlay.lift()
+        self.after(self.QUERY_OVERLAY_REFRESH_MS, self._refresh_query_overlay)
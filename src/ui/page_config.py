@@ -7,9 +7,10 @@ SLM智能报价系统 - 设备配置页
 """
 
 import customtkinter as ctk
-from ..config import COLORS, FONTS, MACHINES, DEPRECIATION_YEARS_OPTIONS
+from ..config import COLORS, FONTS, DEPRECIATION_YEARS_OPTIONS
 from ..services import CostCalculator
-from ..database import get_active_machine_config, save_machine_config
+from ..database import get_active_machine_config, get_all_machines, save_machine_config
+from ..query_stats import track_operation
 
 
 class ConfigPage(ctk.CTkFrame):
@@ -29,8 +30,11 @@ class ConfigPage(ctk.CTkFrame):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1)
         
+        # 设备表: {设备型号: 设备总价}
+        self.machines = {m.name: m.total_price for m in get_all_machines()}
+        
         # 当前选择
-        self.selected_machine = ctk.StringVar(value="DW-HP120")
+        self.selected_machine = ctk.StringVar(value=next(iter(self.machines), ""))
         self.selected_years = ctk.IntVar(value=3)
         
         # 构建界面
@@ -89,7 +93,7 @@ class ConfigPage(ctk.CTkFrame):
         machine_title.pack(anchor="w", padx=25, pady=(25, 15))
         
         # 设备选项
-        for machine_name, price in MACHINES.items():
+        for machine_name, price in self.machines.items():
             machine_btn = ctk.CTkRadioButton(
                 machine_card,
                 text=f"{machine_name}",
@@ -236,7 +240,7 @@ class ConfigPage(ctk.CTkFrame):
         cost_table = CostCalculator.get_machine_cost_table()
         
         # 表头
-        headers = ["设备型号", "1年折旧", "2年折旧", "3年折旧"]
+        headers = ["设备型号"] + [f"{years}年折旧" for years in DEPRECIATION_YEARS_OPTIONS]
         for col, header in enumerate(headers):
             label = ctk.CTkLabel(
                 table_frame,
@@ -258,7 +262,7 @@ class ConfigPage(ctk.CTkFrame):
             name_label.grid(row=row, column=0, padx=20, pady=8, sticky="w")
             
             # 各年限成本
-            for col, years in enumerate([1, 2, 3], start=1):
+            for col, years in enumerate(DEPRECIATION_YEARS_OPTIONS, start=1):
                 cost = costs[years]
                 cost_label = ctk.CTkLabel(
                     table_frame,
@@ -300,7 +304,7 @@ class ConfigPage(ctk.CTkFrame):
         """更新成本显示"""
         machine = self.selected_machine.get()
         years = self.selected_years.get()
-        price = MACHINES.get(machine, 1_500_000)
+        price = self.machines.get(machine, 0)
         
         # 计算每分钟成本
         cost_per_min = CostCalculator.calculate_cost_per_minute(price, years)
@@ -311,6 +315,7 @@ class ConfigPage(ctk.CTkFrame):
         )
         self.cost_value_label.configure(text=f"¥{cost_per_min:.2f}")
     
+    @track_operation("config.save")
     def _save_config(self):
         """保存配置"""
         machine = self.selected_machine.get()
@@ -7,12 +7,14 @@ SLM智能报价系统 - 数据进化页
 
 import customtkinter as ctk
 from datetime import datetime
-from ..config import COLORS, FONTS
+from ..config import COLORS, FONTS, ORDER_LIST_PAGE_SIZE
 from ..database import (
-    get_all_materials, add_work_order, 
-    get_recent_work_orders, delete_work_order
+    get_all_materials, get_all_machines, get_active_machine_config, add_work_order, 
+    get_work_orders_page, delete_work_order
 )
-from ..services import EfficiencyService
+from ..services import EfficiencyService, StatisticsService
+from ..query_stats import track_operation
+from .virtual_list import VirtualOrderList
 
 
 class DataPage(ctk.CTkFrame):
@@ -22,10 +24,14 @@ class DataPage(ctk.CTkFrame):
     功能:
     - 录入实际打印工单
     - 标记晶格结构 (不参与效率计算)
-    - 展示最近录入的工单列表
+    - 展示工单列表 (虚拟化列表, 滚动时按页懒加载全部历史工单),
+      标出效率异常、被自动排除在效率统计之外的工单
     - 显示当前材料效率统计
     """
     
+    # 设备选项中表示未记录设备的选项
+    NO_MACHINE = "未记录"
+    
     def __init__(self, parent, app):
         super().__init__(parent, fg_color="transparent")
         
@@ -35,12 +41,19 @@ class DataPage(ctk.CTkFrame):
         
         # 输入变量
         self.selected_material = ctk.StringVar(value="316L不锈钢")
+        self.selected_machine = ctk.StringVar(value=self.NO_MACHINE)
         self.weight_var = ctk.StringVar(value="")
         self.time_hours_var = ctk.StringVar(value="")
         self.time_mins_var = ctk.StringVar(value="")
         self.is_lattice_var = ctk.BooleanVar(value=False)
         self.note_var = ctk.StringVar(value="")
         
+        # 工单列表下一页的分页游标
+        self._next_cursor = None
+        
+        # 各材料的正常效率范围 (刷新效率统计时更新), 用于标出异常工单
+        self._outlier_bounds = {}
+        
         # 构建界面
         self._create_header()
         self._create_content()
@@ -120,6 +133,35 @@ class DataPage(ctk.CTkFrame):
         )
         self.material_menu.pack(anchor="w", padx=25, pady=(0, 15))
         
+        # --- 打印设备 (默认当前配置的设备) ---
+        machine_label = ctk.CTkLabel(
+            form_card,
+            text="🖨️ 打印设备",
+            font=FONTS["body"],
+            text_color=COLORS["text_primary"]
+        )
+        machine_label.pack(anchor="w", padx=25, pady=(10, 5))
+        
+        config = get_active_machine_config()
+        if config:
+            self.selected_machine.set(config.machine_name)
+        
+        self.machine_menu = ctk.CTkOptionMenu(
+            form_card,
+            variable=self.selected_machine,
+            values=[m.name for m in get_all_machines()] + [self.NO_MACHINE],
+            font=FONTS["body"],
+            dropdown_font=FONTS["body"],
+            width=250,
+            height=40,
+            corner_radius=8,
+            fg_color=COLORS["bg_dark"],
+            button_color=COLORS["accent"],
+            button_hover_color=COLORS["accent_hover"],
+            dropdown_fg_color=COLORS["bg_card"]
+        )
+        self.machine_menu.pack(anchor="w", padx=25, pady=(0, 15))
+        
         # --- 实际重量 ---
         weight_label = ctk.CTkLabel(
             form_card,
@@ -299,13 +341,13 @@ class DataPage(ctk.CTkFrame):
         list_header = ctk.CTkFrame(list_card, fg_color="transparent")
         list_header.pack(fill="x", padx=25, pady=(20, 10))
         
-        list_title = ctk.CTkLabel(
+        self.list_title = ctk.CTkLabel(
             list_header,
-            text="📋 最近录入 (最新20条)",
+            text="📋 最近录入",
             font=FONTS["subtitle"],
             text_color=COLORS["accent"]
         )
-        list_title.pack(side="left")
+        self.list_title.pack(side="left")
         
         refresh_btn = ctk.CTkButton(
             list_header,
@@ -320,19 +362,25 @@ class DataPage(ctk.CTkFrame):
         )
         refresh_btn.pack(side="right")
         
-        # 工单列表滚动区域
-        self.list_scroll = ctk.CTkScrollableFrame(
+        # 工单列表 (固定数量的行控件, 滚动时重新绑定数据)
+        self.order_list = VirtualOrderList(
             list_card,
-            fg_color="transparent",
-            corner_radius=0
+            format_row=self._format_order_row,
+            on_delete=self._delete_order,
+            empty_text="暂无工单记录\n开始录入您的第一条工单吧!",
+            on_need_more=self._load_more_orders
         )
-        self.list_scroll.pack(fill="both", expand=True, padx=10, pady=(0, 15))
+        self.order_list.pack(fill="both", expand=True, padx=10, pady=(0, 15))
     
+    @track_operation("data.submit")
     def _submit_order(self):
         """提交工单"""
         try:
             # 获取输入
             material = self.selected_material.get()
+            machine = self.selected_machine.get()
+            if machine == self.NO_MACHINE:
+                machine = None
             weight_str = self.weight_var.get().strip()
             hours_str = self.time_hours_var.get().strip()
             mins_str = self.time_mins_var.get().strip()
@@ -359,12 +407,13 @@ class DataPage(ctk.CTkFrame):
                 return
             
             # 添加工单
-            add_work_order(
+            order = add_work_order(
                 material_name=material,
                 weight_g=weight,
                 time_min=total_mins,
                 is_lattice=is_lattice,
-                note=note
+                note=note,
+                machine_name=machine
             )
             
             # 清空表单
@@ -374,20 +423,31 @@ class DataPage(ctk.CTkFrame):
             self.is_lattice_var.set(False)
             self.note_var.set("")
             
-            # 刷新显示
+            # 刷新显示 (列表只插入新的一行)
             self._refresh_stats()
-            self._refresh_list()
+            self.order_list.insert_row(0, (
+                order.id, material, weight, total_mins, is_lattice, note,
+                machine, order.created_at
+            ))
+            self._update_list_title()
             
             # 刷新报价页
             self.app.refresh_quote_page()
             
             # 显示成功提示
             efficiency = weight / total_mins
-            self._show_status(
-                f"✅ 录入成功! 效率: {efficiency:.4f} g/min",
-                "success"
-            )
-            
+            if not is_lattice and self._is_outlier(material, weight, total_mins):
+                self._show_status(
+                    f"⚠️ 已录入, 但效率 {efficiency:.4f} g/min 明显偏离该材料的正常范围, "
+                    f"未计入效率统计 (请检查时长是否填错)",
+                    "error"
+                )
+            else:
+                self._show_status(
+                    f"✅ 录入成功! 效率: {efficiency:.4f} g/min",
+                    "success"
+                )
+        
         except ValueError as e:
             self._show_status(f"❌ 输入格式错误: {e}", "error")
         except Exception as e:
@@ -409,6 +469,7 @@ class DataPage(ctk.CTkFrame):
         
         # 获取效率统计
         stats = EfficiencyService.get_all_materials_efficiency()
+        self._outlier_bounds = EfficiencyService.get_outlier_bounds()
         
         for material_name, (efficiency, source, count) in stats.items():
             row_frame = ctk.CTkFrame(self.stats_content, fg_color="transparent")
@@ -431,82 +492,65 @@ class DataPage(ctk.CTkFrame):
             value_label.pack(anchor="w")
     
     def _refresh_list(self):
-        """刷新工单列表"""
-        # 清除旧内容
-        for widget in self.list_scroll.winfo_children():
-            widget.destroy()
-        
-        # 获取最近工单
-        orders = get_recent_work_orders(20)
-        
-        if not orders:
-            empty_label = ctk.CTkLabel(
-                self.list_scroll,
-                text="暂无工单记录\n开始录入您的第一条工单吧!",
-                font=FONTS["body"],
-                text_color=COLORS["text_secondary"]
-            )
-            empty_label.pack(pady=30)
+        """重新加载工单列表 (第一页)"""
+        page = get_work_orders_page(limit=ORDER_LIST_PAGE_SIZE)
+        self._next_cursor = page.next_cursor
+        self.order_list.set_rows(page.rows)
+        self._update_list_title()
+    
+    @track_operation("data.load_more")
+    def _load_more_orders(self):
+        """滚动接近末尾时加载下一页"""
+        if self._next_cursor is None:
             return
-        
-        # 显示工单列表
-        for order in orders:
-            self._create_order_row(order)
+        page = get_work_orders_page(self._next_cursor, limit=ORDER_LIST_PAGE_SIZE)
+        self._next_cursor = page.next_cursor
+        self.order_list.append_rows(page.rows)
     
-    def _create_order_row(self, order):
-        """创建工单行"""
-        row_frame = ctk.CTkFrame(
-            self.list_scroll,
-            fg_color=COLORS["bg_dark"],
-            corner_radius=8
-        )
-        row_frame.pack(fill="x", pady=3, padx=5)
+    def _update_list_title(self):
+        """更新列表标题中的工单总数 (读取效率聚合表)"""
+        total = StatisticsService.get_overview_stats()['total_orders']
+        self.list_title.configure(text=f"📋 工单记录 (共{total}条)")
+    
+    def _is_outlier(self, material_name, weight_g, time_min) -> bool:
+        """工单效率是否超出该材料的正常范围 (不计入效率统计)"""
+        bounds = self._outlier_bounds.get(material_name)
+        return EfficiencyService.is_outlier(bounds, weight_g, time_min)
+    
+    def _format_order_row(self, row):
+        """
+        格式化工单行的两行文字
         
-        # 左侧信息
-        info_frame = ctk.CTkFrame(row_frame, fg_color="transparent")
-        info_frame.pack(side="left", fill="x", expand=True, padx=10, pady=8)
+        Args:
+            row: (工单ID, 材料名, 重量, 时长, 是否晶格, 备注, 设备型号, 创建时间)
+        """
+        _, material_name, weight_g, time_min, is_lattice, note, machine = row[:7]
         
-        # 第一行: 材质和重量
-        line1 = ctk.CTkLabel(
-            info_frame,
-            text=f"🧪 {order.material.name}  |  ⚖️ {order.weight_g}g  |  ⏱️ {order.time_min:.0f}min",
-            font=FONTS["small"],
-            text_color=COLORS["text_primary"]
-        )
-        line1.pack(anchor="w")
+        # 第一行: 材质、重量和设备
+        line1 = f"🧪 {material_name}  |  ⚖️ {weight_g}g  |  ⏱️ {time_min:.0f}min"
+        if machine:
+            line1 += f"  |  🖨️ {machine}"
         
         # 第二行: 效率和时间
-        efficiency = order.weight_g / order.time_min if order.time_min > 0 else 0
-        lattice_tag = " 🔷晶格" if order.is_lattice else ""
-        note_text = f" | {order.note}" if order.note else ""
-        
-        line2 = ctk.CTkLabel(
-            info_frame,
-            text=f"效率: {efficiency:.4f} g/min{lattice_tag}{note_text}",
-            font=FONTS["small"],
-            text_color=COLORS["text_secondary"]
-        )
-        line2.pack(anchor="w")
-        
-        # 删除按钮
-        del_btn = ctk.CTkButton(
-            row_frame,
-            text="🗑️",
-            font=FONTS["small"],
-            width=30,
-            height=30,
-            corner_radius=5,
-            fg_color="transparent",
-            hover_color=COLORS["warning"],
-            command=lambda oid=order.id: self._delete_order(oid)
-        )
-        del_btn.pack(side="right", padx=10)
+        efficiency = weight_g / time_min if time_min > 0 else 0
+        if is_lattice:
+            tag = " 🔷晶格"
+        elif self._is_outlier(material_name, weight_g, time_min):
+            tag = " ⚠️异常 (未计入效率)"
+        else:
+            tag = ""
+        note_text = f" | {note}" if note else ""
+        line2 = f"效率: {efficiency:.4f} g/min{tag}{note_text}"
+        
+        return line1, line2
     
+    @track_operation("data.delete")
     def _delete_order(self, order_id):
         """删除工单"""
         if delete_work_order(order_id):
             self._refresh_stats()
-            self._refresh_list()
+            self.order_list.remove_row(order_id)
+            self._update_list_title()
             self.app.refresh_quote_page()
             self._show_status("✅ 已删除", "success")
     
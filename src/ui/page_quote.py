@@ -2,19 +2,25 @@
 """
 SLM智能报价系统 - 快速报价页 (v2.2)
 =====================================
-输入材质、重量、难度系数、风险系数、后处理参数
+输入材质、重量 (或导入 STL 模型按密度换算)、难度系数、风险系数、后处理参数
 实时计算并显示分项报价和总报价
 """
 
+import os
+from tkinter import filedialog
+
 import customtkinter as ctk
 from ..config import (
     COLORS, FONTS, 
     DIFFICULTY_OPTIONS, DIFFICULTY_DEFAULT,
     RISK_OPTIONS, RISK_DEFAULT,
-    POST_PROCESS_RATE_DEFAULT, POST_PROCESS_HOURS_DEFAULT
+    POST_PROCESS_RATE_DEFAULT, POST_PROCESS_HOURS_DEFAULT,
+    QUOTE_DEBOUNCE_MS, EFFICIENCY_CONFIDENCE
 )
-from ..services import QuoteService, CostCalculator, EfficiencyService
-from ..database import get_all_materials, get_active_machine_config
+from ..services import QuoteService, PricingCache
+from ..database import get_all_materials
+from ..query_stats import track_operation
+from .recalc_scheduler import RecalcScheduler
 
 
 class QuotePage(ctk.CTkFrame):
@@ -23,11 +29,11 @@ class QuotePage(ctk.CTkFrame):
     
     功能:
     - 选择打印材质
-    - 输入预估重量
+    - 输入预估重量, 或导入 STL 模型按材质密度换算重量
     - 选择难度系数 (1-正常/2-偏难/3-很难)
     - 选择风险系数 (0/0.5/1/1.5/2)
     - 输入后处理时长和单价
-    - 实时显示分项报价和总报价
+    - 实时显示分项报价和总报价 (防抖后在后台线程计算)
     """
     
     def __init__(self, parent, app):
@@ -45,22 +51,36 @@ class QuotePage(ctk.CTkFrame):
         self.post_hours_var = ctk.StringVar(value=str(POST_PROCESS_HOURS_DEFAULT))
         self.post_rate_var = ctk.StringVar(value=str(POST_PROCESS_RATE_DEFAULT))
         
+        # 已导入的 STL 模型 (文件名, mesh.MeshProperties); 手动修改重量后清除
+        self.mesh = None
+        self._filling_weight = False
+        
         # 标记是否已完成初始化
         self._initialized = False
         
+        # 报价在后台线程计算, 主线程只负责读取输入和刷新显示
+        self.scheduler = RecalcScheduler(
+            self,
+            compute=self._compute_quote,
+            on_result=self._apply_quote,
+            on_error=lambda e: self._show_empty_result(),
+            delay_ms=QUOTE_DEBOUNCE_MS
+        )
+        
         # 构建界面
         self._create_header()
         self._create_content()
         
         # 绑定变量变化事件
         self.weight_var.trace_add("write", self._on_input_change)
+        self.weight_var.trace_add("write", self._on_weight_edit)
         self.post_hours_var.trace_add("write", self._on_input_change)
         self.post_rate_var.trace_add("write", self._on_input_change)
         
         self._initialized = True
         
         # 初始计算
-        self._calculate_quote()
+        self._calculate_quote(immediate=True)
     
     def _create_header(self):
         """创建页面标题区"""
@@ -143,8 +163,11 @@ class QuotePage(ctk.CTkFrame):
         # --- 重量输入 ---
         self._create_section_label(input_scroll, "⚖️ 预估重量 (克)")
         
+        weight_row = ctk.CTkFrame(input_scroll, fg_color="transparent")
+        weight_row.pack(anchor="w", padx=20, pady=(0, 4))
+        
         self.weight_entry = ctk.CTkEntry(
-            input_scroll,
+            weight_row,
             textvariable=self.weight_var,
             font=FONTS["body"],
             width=220,
@@ -154,7 +177,30 @@ class QuotePage(ctk.CTkFrame):
             border_color=COLORS["border"],
             placeholder_text="输入零件重量"
         )
-        self.weight_entry.pack(anchor="w", padx=20, pady=(0, 12))
+        self.weight_entry.pack(side="left")
+        
+        stl_btn = ctk.CTkButton(
+            weight_row,
+            text="📂 导入STL",
+            font=FONTS["body"],
+            width=100,
+            height=36,
+            corner_radius=8,
+            fg_color=COLORS["bg_dark"],
+            hover_color=COLORS["accent_hover"],
+            command=self._load_stl
+        )
+        stl_btn.pack(side="left", padx=(8, 0))
+        
+        # 模型信息 (导入 STL 后显示体积、包围盒)
+        self.mesh_info_label = ctk.CTkLabel(
+            input_scroll,
+            text="",
+            font=FONTS["small"],
+            text_color=COLORS["text_secondary"],
+            justify="left"
+        )
+        self.mesh_info_label.pack(anchor="w", padx=20, pady=(0, 8))
         
         # --- 难度系数 ---
         self._create_section_label(input_scroll, "🎯 难度系数")
@@ -433,17 +479,85 @@ class QuotePage(ctk.CTkFrame):
         label.pack(anchor="w", padx=20, pady=(8, 4))
     
     def _on_material_change(self, value):
-        """材质变化时的回调"""
-        self._calculate_quote()
+        """材质变化时的回调 (已导入模型时后台按新材质密度重新换算重量)"""
+        self._calculate_quote(immediate=True)
+    
+    def _on_weight_edit(self, *args):
+        """手动修改重量后不再与已导入的模型关联"""
+        if not self._filling_weight and self.mesh:
+            self.mesh = None
+            self.mesh_info_label.configure(text="")
+    
+    def _load_stl(self):
+        """
+        选择 STL 文件并计算体积, 重量由后台报价按当前材质密度换算后填入
+        
+        在主线程读取: 二进制 STL 为内存映射上的向量化计算,
+        数百万个三角面也在1秒内完成; 不访问数据库
+        """
+        path = filedialog.askopenfilename(
+            title="选择 STL 模型",
+            filetypes=[("STL 模型", "*.stl"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        
+        from ..mesh import load_mesh
+        
+        try:
+            with track_operation("quote.load_stl"):
+                mesh = load_mesh(path)
+        except (OSError, ValueError) as e:
+            self.mesh_info_label.configure(
+                text=f"❌ 无法读取模型: {e}", text_color=COLORS["warning"]
+            )
+            return
+        
+        self.mesh = (os.path.basename(path), mesh)
+        self._calculate_quote(immediate=True)
+    
+    def _fill_mesh_weight(self, mesh_weight):
+        """
+        将后台换算的模型重量填入重量输入框 (主线程)
+        
+        Args:
+            mesh_weight: (重量克, 密度 g/cm³), 无法换算时为错误信息
+        """
+        file_name, mesh = self.mesh
+        if isinstance(mesh_weight, str):
+            self.mesh_info_label.configure(
+                text=f"📐 {file_name}\n⚠️ {mesh_weight}", text_color=COLORS["warning"]
+            )
+            return
+        
+        weight_g, density = mesh_weight
+        weight_text = f"{weight_g:.2f}"
+        if self.weight_var.get() != weight_text:
+            # 报价已按该重量算出, 填入时不再触发重算
+            self._filling_weight = True
+            try:
+                self.weight_var.set(weight_text)
+            finally:
+                self._filling_weight = False
+        
+        size = [high - low for low, high in zip(mesh.bbox_min, mesh.bbox_max)]
+        self.mesh_info_label.configure(
+            text=(
+                f"📐 {file_name} ({mesh.triangle_count:,} 面)\n"
+                f"体积 {mesh.volume_mm3 / 1000:,.2f} cm³ × 密度 {density} g/cm³\n"
+                f"包围盒 {size[0]:.1f} × {size[1]:.1f} × {size[2]:.1f} mm"
+            ),
+            text_color=COLORS["text_secondary"]
+        )
     
     def _on_dropdown_change(self, value):
         """下拉框变化时的回调"""
         if self._initialized:
-            self._calculate_quote()
+            self._calculate_quote(immediate=True)
     
     def _on_input_change(self, *args):
-        """输入变化时的回调"""
-        if self._initialized:
+        """输入变化时的回调 (逐字输入, 防抖后再计算)"""
+        if self._initialized and not self._filling_weight:
             self._calculate_quote()
     
     def _parse_difficulty(self) -> int:
@@ -470,37 +584,75 @@ class QuotePage(ctk.CTkFrame):
         except:
             return default
     
-    def _calculate_quote(self):
-        """计算报价"""
-        try:
-            # 获取输入参数
-            material_name = self.selected_material.get()
-            weight = self._parse_float(self.weight_var, 0)
-            difficulty = self._parse_difficulty()
-            risk = self._parse_risk()
-            post_hours = self._parse_float(self.post_hours_var, 0)
-            post_rate = self._parse_float(self.post_rate_var, 50)
-            
-            # 验证重量输入
-            if weight <= 0:
-                self._show_empty_result()
-                return
-            
-            # 调用报价服务
-            result = QuoteService.calculate_quote(
-                material_name=material_name,
-                weight_g=weight,
-                difficulty=difficulty,
-                risk=risk,
-                post_process_hours=post_hours,
-                post_process_rate=post_rate
+    def _calculate_quote(self, immediate=False):
+        """
+        请求重新计算报价
+        
+        在主线程读取输入, 交给调度器在后台线程计算
+        
+        Args:
+            immediate: 是否跳过防抖 (下拉框等离散选择)
+        """
+        params = {
+            'material_name': self.selected_material.get(),
+            'weight_g': self._parse_float(self.weight_var, 0),
+            'difficulty': self._parse_difficulty(),
+            'risk': self._parse_risk(),
+            'post_process_hours': self._parse_float(self.post_hours_var, 0),
+            'post_process_rate': self._parse_float(self.post_rate_var, 50),
+            'mesh': self.mesh[1] if self.mesh else None,
+        }
+        self.scheduler.schedule(params, delay_ms=0 if immediate else None)
+    
+    @staticmethod
+    def _compute_quote(params):
+        """
+        计算报价 (在工作线程执行, 不访问任何控件)
+        
+        已导入模型时, 按快照中的材料密度将模型体积换算为重量后报价
+        
+        Returns:
+            tuple: (报价明细字典或None, 设备信息或None,
+                    模型重量 (重量克, 密度) / 错误信息, 未导入模型时为None)
+        """
+        params = dict(params)
+        mesh = params.pop('mesh')
+        
+        # 设备信息和报价取自同一个快照, 保证两者一致
+        with track_operation("quote.recalc"):
+            snapshot = PricingCache.get_snapshot()
+        machine = None
+        if snapshot.machine_name:
+            machine = (
+                snapshot.machine_name,
+                snapshot.depreciation_years,
+                snapshot.cost_per_min
             )
-            
-            # 更新显示
-            self._update_result_display(result)
-            
-        except Exception as e:
+        
+        mesh_weight = None
+        if mesh is not None:
+            try:
+                mesh_weight = snapshot.mesh_weight(mesh, params['material_name'])
+                params['weight_g'] = mesh_weight[0]
+            except ValueError as e:
+                mesh_weight = str(e)
+        
+        # 验证重量输入
+        if params['weight_g'] <= 0:
+            return None, machine, mesh_weight
+        
+        return snapshot.quote(**params), machine, mesh_weight
+    
+    def _apply_quote(self, payload):
+        """将后台计算结果刷新到界面 (主线程)"""
+        result, machine, mesh_weight = payload
+        if self.mesh and mesh_weight is not None:
+            self._fill_mesh_weight(mesh_weight)
+        if result is None:
             self._show_empty_result()
+        else:
+            self._update_result_display(result)
+        self._update_machine_info(machine)
     
     def _update_result_display(self, result):
         """更新报价结果显示"""
@@ -527,8 +679,18 @@ class QuotePage(ctk.CTkFrame):
         # 预估时长
         self.time_label.configure(text=result['time_formatted'])
         
+        # 报价区间 (由效率置信区间计算, 工单不足时不显示)
+        low, high = result['total_quote_low'], result['total_quote_high']
+        if low is not None and high is not None:
+            range_text = (f"报价区间: {QuoteService.format_quote(low)} ~ "
+                          f"{QuoteService.format_quote(high)} "
+                          f"({EFFICIENCY_CONFIDENCE:.0%}置信)\n")
+        else:
+            range_text = ""
+        
         # 计算明细
         detail_text = (
+            range_text +
             f"材料效率: {result['efficiency']:.4f} g/min ({result['efficiency_source']})\n"
             f"开机成本: ¥{result['cost_per_min']:.4f}/min\n"
             f"预估时长: {result['time_min']:.1f} 分钟\n"
@@ -547,9 +709,6 @@ class QuotePage(ctk.CTkFrame):
             self.efficiency_label.configure(
                 text="📈 使用预设效率值"
             )
-        
-        # 更新设备信息
-        self._update_machine_info()
     
     def _show_empty_result(self):
         """显示空结果"""
@@ -560,16 +719,18 @@ class QuotePage(ctk.CTkFrame):
         self.time_label.configure(text="--")
         self.detail_label.configure(text="请输入有效的重量值")
     
-    def _update_machine_info(self):
-        """更新设备配置信息"""
-        config = get_active_machine_config()
-        if config:
-            cost_per_min = CostCalculator.calculate_cost_per_minute(
-                config.total_price, config.depreciation_years
-            )
+    def _update_machine_info(self, machine):
+        """
+        更新设备配置信息
+        
+        Args:
+            machine: (设备型号, 折旧年限, 每分钟成本), 未配置时为None
+        """
+        if machine:
+            machine_name, depreciation_years, cost_per_min = machine
             info_text = (
-                f"🖨️ 设备: {config.machine_name} | "
-                f"折旧: {config.depreciation_years}年 | "
+                f"🖨️ 设备: {machine_name} | "
+                f"折旧: {depreciation_years}年 | "
                 f"费率: ¥{cost_per_min:.2f}/min"
             )
         else:
@@ -578,10 +739,14 @@ class QuotePage(ctk.CTkFrame):
         self.machine_info_label.configure(text=info_text)
     
     def refresh_data(self):
-        """刷新数据 (外部调用)"""
-        self._calculate_quote()
-        self._update_machine_info()
+        """刷新数据 (外部调用, 报价和设备信息一并在后台重算)"""
+        self._calculate_quote(immediate=True)
     
     def on_show(self):
         """页面显示时的回调"""
         self.refresh_data()
+    
+    def destroy(self):
+        """销毁页面时停止后台计算"""
+        self.scheduler.shutdown()
+        super().destroy()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 后台重算调度器
+================================
+对频繁的输入变化做防抖, 在工作线程中执行计算,
+通过 after() 轮询把最新一次的结果交回 Tk 主线程
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecalcScheduler:
+    """
+    防抖的后台重算调度器
+    
+    - schedule(): 每次输入变化调用, 在静默 delay_ms 后才提交计算
+    - 计算在单个工作线程中执行, Tk 主线程从不等待数据库
+    - 每次 schedule/cancel 都会递增输入代号, 代号过期的结果直接丢弃
+    - Tk 不允许跨线程操作控件, 因此由主线程用 after() 轮询结果
+    """
+    
+    def __init__(self, widget, compute, on_result, on_error=None,
+                 delay_ms=150, poll_ms=15):
+        """
+        Args:
+            widget: 用于 after() 调度的 Tk 控件
+            compute: 在工作线程执行的计算函数 compute(params) -> result
+            on_result: 在主线程执行的结果回调 on_result(result)
+            on_error: 在主线程执行的异常回调 on_error(exc), 可选
+            delay_ms: 防抖延迟 (毫秒)
+            poll_ms: 结果轮询间隔 (毫秒)
+        """
+        self.widget = widget
+        self.delay_ms = delay_ms
+        self.poll_ms = poll_ms
+        self._compute = compute
+        self._on_result = on_result
+        self._on_error = on_error
+        
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="recalc"
+        )
+        self._generation = 0
+        self._after_id = None
+        self._poll_id = None
+        self._running = []  # [(代号, Future)]
+    
+    def schedule(self, params, delay_ms=None):
+        """
+        请求一次重算 (防抖)
+        
+        Args:
+            params: 传给 compute 的参数 (需在主线程读取好控件的值)
+            delay_ms: 本次的防抖延迟, 默认使用 self.delay_ms
+        """
+        self._generation += 1
+        generation = self._generation
+        
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        
+        delay = self.delay_ms if delay_ms is None else delay_ms
+        self._after_id = self.widget.after(
+            delay, lambda: self._submit(generation, params)
+        )
+    
+    def cancel(self):
+        """放弃所有尚未交付的计算结果"""
+        self._generation += 1
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+    
+    def shutdown(self):
+        """停止调度并关闭工作线程"""
+        self.cancel()
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _submit(self, generation, params):
+        """防抖到期, 提交到工作线程"""
+        self._after_id = None
+        if generation != self._generation:
+            return
+        
+        # 尚未开始执行的旧任务已无意义
+        for _, future in self._running:
+            future.cancel()
+        
+        future = self._executor.submit(self._compute, params)
+        self._running.append((generation, future))
+        
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+    
+    def _poll(self):
+        """主线程轮询已完成的计算, 只交付最新代号的结果"""
+        self._poll_id = None
+        
+        still_running = []
+        for generation, future in self._running:
+            if not future.done():
+                still_running.append((generation, future))
+                continue
+            if future.cancelled() or generation != self._generation:
+                continue
+            
+            error = future.exception()
+            if error is None:
+                self._on_result(future.result())
+            elif self._on_error:
+                self._on_error(error)
+        self._running = still_running
+        
+        if self._running:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
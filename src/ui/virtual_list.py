@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+SLM智能报价系统 - 虚拟化工单列表
+================================
+固定数量的行控件池 + 滚动时重新绑定数据
+控件数量只与可见高度有关, 与工单总数无关
+"""
+
+import sys
+import customtkinter as ctk
+from ..config import COLORS, FONTS
+
+
+class VirtualOrderList(ctk.CTkFrame):
+    """
+    虚拟化工单列表
+    
+    - 数据保存为轻量元组列表, 只为可见区域创建行控件
+    - 滚动时仅重新绑定行控件的文字和删除命令
+    - insert_row / remove_row 以增量方式更新, 不重建控件
+    """
+    
+    # 每行的固定高度和行间距 (像素)
+    ROW_HEIGHT = 54
+    ROW_SPACING = 6
+    
+    def __init__(self, parent, format_row, on_delete, empty_text="",
+                 on_need_more=None):
+        """
+        Args:
+            parent: 父控件
+            format_row: 行格式化函数 format_row(row) -> (第一行文字, 第二行文字)
+            on_delete: 删除回调 on_delete(工单ID)
+            empty_text: 无数据时显示的提示
+            on_need_more: 滚动接近末尾时的回调 (用于分页懒加载), 可选
+        """
+        super().__init__(parent, fg_color="transparent")
+        
+        self._format_row = format_row
+        self._on_delete = on_delete
+        self._on_need_more = on_need_more
+        self._need_more_pending = False
+        
+        self._rows = []       # 数据: [(工单ID, ...)]
+        self._offset = 0      # 第一条可见数据的下标
+        self._pool = []       # 行控件池: [(frame, line1, line2, button)]
+        self._bound_ids = []  # 行控件当前绑定的工单ID
+        self._page_size = 1   # 可完整显示的行数
+        
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.body.grid_columnconfigure(0, weight=1)
+        
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        
+        self.empty_label = ctk.CTkLabel(
+            self.body,
+            text=empty_text,
+            font=FONTS["body"],
+            text_color=COLORS["text_secondary"]
+        )
+        
+        self.body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self.body)
+    
+    # ============================================================
+    # 数据操作
+    # ============================================================
+    
+    def set_rows(self, rows):
+        """替换全部数据"""
+        self._rows = list(rows)
+        self._offset = 0
+        self._render()
+    
+    def append_rows(self, rows):
+        """在末尾追加数据 (用于分页懒加载)"""
+        if rows:
+            self._rows.extend(rows)
+            self._render()
+    
+    def insert_row(self, index, row):
+        """在指定位置插入一条数据"""
+        self._rows.insert(index, row)
+        self._render()
+    
+    def remove_row(self, order_id):
+        """
+        删除指定工单对应的数据
+        
+        Returns:
+            bool: 是否找到并删除
+        """
+        for index, row in enumerate(self._rows):
+            if row[0] == order_id:
+                del self._rows[index]
+                self._render()
+                return True
+        return False
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    @property
+    def visible_end(self) -> int:
+        """最后一条完整可见数据之后的下标"""
+        return min(self._offset + self._page_size, len(self._rows))
+    
+    # ============================================================
+    # 行控件池
+    # ============================================================
+    
+    def _on_resize(self, event=None):
+        """高度变化时调整行控件池大小"""
+        height = self.body.winfo_height()
+        step = self.ROW_HEIGHT + self.ROW_SPACING
+        self._page_size = max(1, height // step)
+        capacity = max(1, -(-height // step))  # 含底部露出一半的行
+        while len(self._pool) < capacity:
+            self._pool.append(self._create_row_widgets(len(self._pool)))
+            self._bound_ids.append(None)
+        while len(self._pool) > capacity:
+            self._pool.pop()[0].destroy()
+            self._bound_ids.pop()
+        self._render()
+    
+    def _create_row_widgets(self, slot):
+        """创建一组行控件 (只在池扩容时调用)"""
+        frame = ctk.CTkFrame(
+            self.body,
+            height=self.ROW_HEIGHT,
+            fg_color=COLORS["bg_dark"],
+            corner_radius=8
+        )
+        frame.grid(row=slot, column=0, sticky="ew",
+                   padx=5, pady=(0, self.ROW_SPACING))
+        frame.grid_remove()  # 绑定数据后才显示
+        frame.pack_propagate(False)
+        
+        # 删除按钮
+        button = ctk.CTkButton(
+            frame,
+            text="🗑️",
+            font=FONTS["small"],
+            width=30,
+            height=30,
+            corner_radius=5,
+            fg_color="transparent",
+            hover_color=COLORS["warning"],
+            command=lambda s=slot: self._delete_slot(s)
+        )
+        button.pack(side="right", padx=10)
+        
+        info_frame = ctk.CTkFrame(frame, fg_color="transparent")
+        info_frame.pack(side="left", fill="x", expand=True, padx=10, pady=6)
+        
+        line1 = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=FONTS["small"],
+            text_color=COLORS["text_primary"],
+            height=20
+        )
+        line1.pack(anchor="w")
+        
+        line2 = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=FONTS["small"],
+            text_color=COLORS["text_secondary"],
+            height=20
+        )
+        line2.pack(anchor="w")
+        
+        for widget in (frame, info_frame, line1, line2):
+            self._bind_wheel(widget)
+        
+        return frame, line1, line2, button
+    
+    def _render(self):
+        """将当前偏移处的数据绑定到行控件池"""
+        max_offset = max(0, len(self._rows) - self._page_size)
+        self._offset = max(0, min(self._offset, max_offset))
+        
+        for slot, (frame, line1, line2, _) in enumerate(self._pool):
+            index = self._offset + slot
+            if index >= len(self._rows):
+                if self._bound_ids[slot] is not None:
+                    frame.grid_remove()
+                    self._bound_ids[slot] = None
+                continue
+            
+            row = self._rows[index]
+            if self._bound_ids[slot] is None:
+                frame.grid()
+            text1, text2 = self._format_row(row)
+            line1.configure(text=text1)
+            line2.configure(text=text2)
+            self._bound_ids[slot] = row[0]
+        
+        if self._rows:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(relx=0.5, rely=0.3, anchor="center")
+        
+        self._update_scrollbar()
+        self._check_need_more()
+    
+    def _check_need_more(self):
+        """剩余未显示的数据不足一屏时请求加载下一页"""
+        if (self._on_need_more is None or self._need_more_pending
+                or self.visible_end + self._page_size < len(self._rows)):
+            return
+        self._need_more_pending = True
+        self.after_idle(self._request_more)
+    
+    def _request_more(self):
+        self._need_more_pending = False
+        self._on_need_more()
+    
+    def _delete_slot(self, slot):
+        """行控件上的删除按钮"""
+        order_id = self._bound_ids[slot]
+        if order_id is not None:
+            self._on_delete(order_id)
+    
+    # ============================================================
+    # 滚动
+    # ============================================================
+    
+    def scroll_to(self, offset):
+        """滚动到指定数据下标"""
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+    
+    def _update_scrollbar(self):
+        total = len(self._rows)
+        if total <= self._page_size:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._offset / total, self.visible_end / total)
+    
+    def _on_scrollbar(self, action, value, unit=None):
+        """滚动条回调: ('moveto', 比例) 或 ('scroll', 步数, 'units'/'pages')"""
+        if action == "moveto":
+            self.scroll_to(int(float(value) * len(self._rows)))
+        elif action == "scroll":
+            step = self._page_size if unit == "pages" else 1
+            self.scroll_to(self._offset + int(value) * step)
+    
+    def _on_mousewheel(self, event):
+        if sys.platform.startswith("win"):
+            delta = -int(event.delta / 40)
+        elif sys.platform == "darwin":
+            delta = -event.delta
+        else:
+            delta = -1 if event.num == 4 else 1
+        self.scroll_to(self._offset + delta)
+    
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_mousewheel)
+        widget.bind("<Button-4>", self._on_mousewheel)
+        widget.bind("<Button-5>", self._on_mousewheel)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+测试公共夹具
+
+在仓库根目录运行: python -m pytest
+"""
+
+import pytest
+
+from src.database import init_db, close_db
+from src.services import PricingCache
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """在临时目录中初始化一个全新的数据库 (含冷启动数据), 测试结束后关闭"""
+    init_db(path=str(tmp_path / "test.db"))
+    PricingCache.invalidate()
+    yield
+    PricingCache.invalidate()
+    close_db()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+各逻辑操作的SQL查询数上限 (见 query_stats.assert_max_queries)
+
+页面操作需要 Tk 显示环境, 这里按各页面方法的顺序直接调用它们的数据库访问;
+修改页面的数据访问时需同步修改对应的用例。
+"""
+
+from src.database import (
+    add_work_order, get_all_materials, get_all_machines,
+    get_active_machine_config, get_work_orders_page
+)
+from src.services import CostCalculator, EfficiencyService, StatisticsService
+from src.config import ORDER_LIST_PAGE_SIZE
+from src.query_stats import assert_max_queries
+from src.ui.page_quote import QuotePage
+
+
+# 报价快照冷构建 (PricingSnapshot.from_db) 的查询数上限
+COLD_RECALC_MAX_QUERIES = 7
+
+
+def _recalc_params(weight_g=100):
+    return {
+        'material_name': '316L不锈钢',
+        'weight_g': weight_g,
+        'difficulty': 1,
+        'risk': 0,
+        'post_process_hours': 0,
+        'post_process_rate': 50,
+        'mesh': None,
+    }
+
+
+def _refresh_data_page():
+    """DataPage.on_show 的数据库访问: 效率统计、工单列表首页、工单总数"""
+    EfficiencyService.get_all_materials_efficiency()
+    EfficiencyService.get_outlier_bounds()
+    get_work_orders_page(limit=ORDER_LIST_PAGE_SIZE)
+    StatisticsService.get_overview_stats()
+
+
+def _add_order():
+    add_work_order('316L不锈钢', 100, 2000, machine_name='DW-HP120')
+
+
+def test_quote_recalc_cold_then_warm(temp_db):
+    """写入后第一次重算构建快照, 之后的重算不查询数据库"""
+    with assert_max_queries(COLD_RECALC_MAX_QUERIES):
+        QuotePage._compute_quote(_recalc_params())
+    
+    for weight_g in (50, 100, 200):
+        with assert_max_queries(0):
+            QuotePage._compute_quote(_recalc_params(weight_g))
+
+
+def test_quote_recalc_after_write(temp_db):
+    """工单写入使快照过期, 重建的查询数不随工单数增长"""
+    QuotePage._compute_quote(_recalc_params())
+    for _ in range(20):
+        _add_order()
+    
+    with assert_max_queries(COLD_RECALC_MAX_QUERIES):
+        QuotePage._compute_quote(_recalc_params())
+    with assert_max_queries(0):
+        QuotePage._compute_quote(_recalc_params())
+
+
+def test_data_submit(temp_db):
+    """DataPage._submit_order: 写入工单, 刷新效率统计和工单总数"""
+    for _ in range(20):
+        _add_order()
+    
+    with assert_max_queries(11, "data.submit"):
+        _add_order()
+        EfficiencyService.get_all_materials_efficiency()
+        EfficiencyService.get_outlier_bounds()
+        StatisticsService.get_overview_stats()
+
+
+def test_page_show_data(temp_db):
+    """数据录入页: 首次显示创建页面, 再次显示只刷新统计和列表"""
+    for _ in range(20):
+        _add_order()
+    
+    with assert_max_queries(8, "page.show:data"):
+        get_all_materials()
+        get_active_machine_config()
+        get_all_machines()
+        _refresh_data_page()
+    
+    with assert_max_queries(5, "page.show:data"):
+        _refresh_data_page()
+
+
+def test_page_show_config(temp_db):
+    """设备配置页: 首次显示读取设备表和成本表, 再次显示只读取当前配置"""
+    with assert_max_queries(3, "page.show:config"):
+        get_all_machines()
+        CostCalculator.get_machine_cost_table()
+        get_active_machine_config()
+    
+    with assert_max_queries(1, "page.show:config"):
+        get_active_machine_config()
+
+
+def test_page_show_quote(temp_db):
+    """报价页: 主线程只提交重算, 快照有效时后台重算也不查询数据库"""
+    QuotePage._compute_quote(_recalc_params())
+    
+    with assert_max_queries(0, "page.show:quote"):
+        QuotePage._compute_quote(_recalc_params())
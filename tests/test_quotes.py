@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+批量报价与逐个报价的一致性 (PricingSnapshot.quotes / quote)
+"""
+
+import random
+
+import pytest
+
+from src.database import add_work_orders, get_all_machines
+from src.services import PricingCache, PricingSnapshot
+
+
+def _add_history(seed=1):
+    """为预设材料各录入一批工单, 使 bucket / linear 模型有数据可用"""
+    rng = random.Random(seed)
+    machines = [machine.name for machine in get_all_machines()] + [None]
+    orders = []
+    for material_name, efficiency in (('316L不锈钢', 0.05), ('TC4钛合金', 0.045)):
+        for _ in range(60):
+            weight_g = rng.uniform(5, 800)
+            orders.append({
+                'material_name': material_name,
+                'weight_g': weight_g,
+                'time_min': weight_g / (efficiency * rng.uniform(0.8, 1.2)) + rng.uniform(0, 60),
+                'machine_name': rng.choice(machines),
+            })
+    add_work_orders(orders)
+
+
+def _random_items(count, seed=2):
+    """整数与小数参数混合的随机零件 (含未知材料和缺省参数)"""
+    rng = random.Random(seed)
+    items = []
+    for _ in range(count):
+        item = {
+            'material_name': rng.choice(['316L不锈钢', 'TC4钛合金', '未知材料']),
+            'weight_g': rng.choice([rng.randint(1, 2000), round(rng.uniform(0.1, 2000), 2)]),
+        }
+        if rng.random() < 0.8:
+            item['difficulty'] = rng.choice([1, 2, 3, 1.5, 2.0])
+        if rng.random() < 0.8:
+            item['risk'] = rng.choice([0, 0.1, 0.25, 1])
+        if rng.random() < 0.5:
+            item['post_process_hours'] = rng.choice([0, 1, 2.5, 8])
+        if rng.random() < 0.5:
+            item['post_process_rate'] = rng.choice([50, 80, 65.5])
+        items.append(item)
+    return items
+
+
+@pytest.mark.parametrize('model', PricingSnapshot.MODELS)
+def test_quotes_match_quote(temp_db, model):
+    """批量结果逐行与 quote() 相同, 包括回显参数的类型 (int / float)"""
+    _add_history()
+    snapshot = PricingCache.get_snapshot()
+    items = _random_items(3000)
+    
+    for item, batch in zip(items, snapshot.quotes(items, model=model)):
+        single = snapshot.quote(**item, model=model)
+        assert batch == single, item
+        for key, value in single.items():
+            assert type(batch[key]) is type(value), (key, item)
+
+
+def test_quotes_match_quote_per_machine(temp_db):
+    """指定其他设备配置时批量结果同样与 quote() 相同"""
+    _add_history()
+    snapshot = PricingCache.get_snapshot()
+    items = _random_items(300, seed=3)
+    
+    for machine in get_all_machines():
+        batch = snapshot.quotes(items, machine_name=machine.name, depreciation_years=2)
+        single = [
+            snapshot.quote(**item, machine_name=machine.name, depreciation_years=2)
+            for item in items
+        ]
+        assert batch == single
+
+
+def test_quotes_rejects_invalid_items(temp_db):
+    """缺失或非有限的数值逐项报错, 不会产生 NaN 报价"""
+    snapshot = PricingCache.get_snapshot()
+    with pytest.raises(ValueError, match="第2项缺少字段 'weight_g'"):
+        snapshot.quotes([{'material_name': '316L不锈钢', 'weight_g': 10},
+                         {'material_name': '316L不锈钢'}])
+    with pytest.raises(ValueError, match="不是有效数值"):
+        snapshot.quotes([{'material_name': '316L不锈钢', 'weight_g': float('nan')}])